@@ -3,17 +3,8 @@ from flask import Flask, send_from_directory
 import os
 from dotenv import load_dotenv
 
-from app.extension import db, migrate, login_manager, cache, socketio
+from app.extension import db, login_manager, cache, socketio
 from app.configs import Config, DevConf, ProdConf
-from app.routes.auth_bp import auth_bp
-from app.routes.main_bp import main_bp
-from app.routes.posts_bp import posts_bp
-from app.routes.profiles_bp import profiles_bp
-from app.routes.notifications_bp import notifications_bp
-from app.routes.stories_bp import stories_bp
-from app.routes.messages_bp import messages_bp
-from app.routes.auth_api import auth_api
-from app.routes.users_api import users_api
 
 load_dotenv()
 
@@ -28,12 +19,37 @@ def create_app():
     else:
         app.config.from_object(ProdConf)
 
+    # Engine options for the database backend: pool sizing, timeouts, SQLite pragmas (DB_ENGINE_PROFILE)
+    from app.lib import database
+    database.configure(app)
+    
     # Initialize extensions
     db.init_app(app)
-    migrate.init_app(app, db)
+    database.init_app(app)
+    # Flask-Migrate (Alembic) only backs the `flask db` commands; web workers skip importing it
+    if os.getenv("FLASK_RUN_FROM_CLI") == "true":
+        from flask_migrate import Migrate
+        Migrate(app, db)
     login_manager.init_app(app)
     cache.init_app(app)
-    socketio.init_app(app)
+    # A message queue lets processes other than this one (`flask worker`) emit to its clients
+    socketio.init_app(app, message_queue=app.config.get('SOCKETIO_MESSAGE_QUEUE'))
+    
+    # orjson/MessagePack responses and gzip/brotli compression
+    from app.lib import responses
+    responses.init_app(app)
+    
+    # Per-request query counts / N+1 warnings (QUERY_COUNTER_ENABLED)
+    from app.middleware import query_counter
+    query_counter.init_app(app)
+    
+    # Request, DB, cache, upload and Socket.IO metrics for GET /metrics (METRICS_ENABLED)
+    from app.middleware import metrics
+    metrics.init_app(app)
+    
+    # Slow-request logging and sampled cProfile captures (PROFILING_ENABLED)
+    from app.middleware import profiler
+    profiler.init_app(app)
     
     # Import SocketIO handlers
     from app import socketio_handlers
@@ -51,23 +67,34 @@ def create_app():
         except (ValueError, TypeError):
             return None
     
-    # Ensure all tables are created on startup
-    with app.app_context():
-        # Import all models to register them
-        from app.models.posts import Post
-        from app.models.comments import Comment
-        from app.models.likes import Like
-        from app.models.bookmarks import Bookmark
-        from app.models.follows import Follow
-        from app.models.notifications import Notification
-        from app.models.conversations import Conversation
-        from app.models.messages import Message
-        from app.models.stories import Story
-        from app.models.story_views import StoryView
-        from app.models.blocked_users import BlockedUser
-        
-        # Create all tables
-        db.create_all()
+    # Register every table on db.metadata (create_all, Alembic autogenerate)
+    from app import models
+    
+    # Create missing tables on boot unless schema changes go through `flask db upgrade` / `flask init-db`
+    if app.config.get('SCHEMA_AUTO_CREATE'):
+        with app.app_context():
+            database.create_schema()
+    
+    # CLI maintenance commands, write-behind buffers and opt-in periodic background jobs
+    from app.cli import register_cli
+    from app.lib.scheduler import start_periodic_task
+    from app.lib.notifications import compact_notifications
+    from app.lib.stories import sweep_expired_stories, story_view_buffer
+    register_cli(app)
+    from app.lib.likes import like_count_buffer
+    story_view_buffer.init_app(app)
+    like_count_buffer.init_app(app)
+    start_periodic_task(app, 'notifications.compact', app.config.get('NOTIFICATION_COMPACT_INTERVAL'), compact_notifications)
+    start_periodic_task(app, 'stories.sweep', app.config.get('STORY_SWEEP_INTERVAL'), sweep_expired_stories)
+    
+    # Background jobs (emails, notifications): embedded worker per JOBS_MODE, periodic purge of finished jobs
+    from app.lib.jobs import job_queue, purge_jobs
+    job_queue.init_app(app)
+    start_periodic_task(app, 'jobs.purge', app.config.get('JOBS_PURGE_INTERVAL'), purge_jobs)
+    
+    # Safe requests read from a healthy replica when DB_REPLICA_URIS is set (health checks run periodically)
+    from app.lib.replicas import replica_set
+    replica_set.init_app(app)
     
     # Route to serve service worker
     @app.route('/service-worker.js')
@@ -105,6 +132,15 @@ def create_app():
         return send_from_directory(uploads, filename)
 
     # Register Blueprints
+    from app.routes.auth_bp import auth_bp
+    from app.routes.main_bp import main_bp
+    from app.routes.posts_bp import posts_bp
+    from app.routes.profiles_bp import profiles_bp
+    from app.routes.notifications_bp import notifications_bp
+    from app.routes.stories_bp import stories_bp
+    from app.routes.messages_bp import messages_bp
+    from app.routes.auth_api import auth_api
+    from app.routes.users_api import users_api
     app.register_blueprint(auth_bp)
     app.register_blueprint(main_bp)
     app.register_blueprint(posts_bp)
@@ -117,6 +153,14 @@ def create_app():
     app.register_blueprint(auth_api)
     app.register_blueprint(users_api)
     
+    if app.config.get('METRICS_ENABLED'):
+        from app.routes.metrics_bp import metrics_bp
+        app.register_blueprint(metrics_bp)
+    
+    if app.config.get('PROFILING_ENABLED'):
+        from app.routes.admin_bp import admin_bp
+        app.register_blueprint(admin_bp)
+    
     # Make CSRF token available in templates
     @app.context_processor
     def inject_csrf_token():
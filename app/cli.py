@@ -0,0 +1,147 @@
+"""
+Flask CLI maintenance commands, e.g. `flask --app wsgi notifications compact`
+"""
+import click
+from flask.cli import AppGroup, with_appcontext
+
+notifications_cli = AppGroup('notifications', help='Notification maintenance commands.')
+
+@notifications_cli.command('compact')
+@click.option('--retention-days', type=int, default=None, help='Keep read notifications newer than this (default: NOTIFICATION_RETENTION_DAYS).')
+@click.option('--batch-size', type=int, default=None, help='Rows per transaction (default: NOTIFICATION_COMPACT_BATCH_SIZE).')
+@click.option('--max-batches', type=int, default=None, help='Stop after this many batches (default: until done).')
+@click.option('--delete', 'delete_only', is_flag=True, help='Delete instead of copying into notification_archive.')
+def compact_notifications_command(retention_days, batch_size, max_batches, delete_only):
+    """Archive or delete old read notifications in bounded batches"""
+    from app.lib.notifications import compact_notifications
+    
+    removed = compact_notifications(
+        retention_days=retention_days,
+        batch_size=batch_size,
+        max_batches=max_batches,
+        archive=False if delete_only else None
+    )
+    click.echo(f"✓ Compacted {removed} notification(s)")
+
+stories_cli = AppGroup('stories', help='Story maintenance commands.')
+
+@stories_cli.command('sweep')
+@click.option('--batch-size', type=int, default=None, help='Stories per transaction (default: STORY_SWEEP_BATCH_SIZE).')
+@click.option('--max-batches', type=int, default=None, help='Stop after this many batches (default: until done).')
+def sweep_stories_command(batch_size, max_batches):
+    """Delete expired non-highlight stories, their views and media files"""
+    from app.lib.stories import sweep_expired_stories
+    
+    removed = sweep_expired_stories(batch_size=batch_size, max_batches=max_batches)
+    click.echo(f"✓ Swept {removed} expired story(ies)")
+
+data_cli = AppGroup('data', help='Synthetic data commands.')
+
+@data_cli.command('seed')
+@click.option('--users', type=int, default=1000, help='Users to create (10000 gives roughly a million rows).')
+@click.option('--seed', 'seed_value', type=int, default=0, help='Random seed; the same seed gives the same dataset.')
+@click.option('--now', type=click.DateTime(), default=None, help='Reference time (UTC) for timestamps (default: now).')
+@click.option('--prefix', default='synth', help='Username prefix, e.g. synth0, synth1...')
+@click.option('--follows', type=float, default=30, help='Mean accounts followed per user.')
+@click.option('--posts', type=float, default=5, help='Mean posts per user.')
+@click.option('--likes', type=float, default=10, help='Mean likes per post (scaled by author popularity).')
+@click.option('--comments', type=float, default=2, help='Mean comments per post.')
+@click.option('--messages', type=float, default=20, help='Mean messages per conversation.')
+@click.option('--batch-size', type=int, default=5000, help='Rows per bulk insert.')
+def seed_command(users, seed_value, now, prefix, follows, posts, likes, comments, messages, batch_size):
+    """Bulk-insert a deterministic synthetic dataset for load testing"""
+    from app.lib.seed import SEED_PASSWORD, seed_dataset
+    
+    counts = seed_dataset(
+        users=users, seed=seed_value, now=now, prefix=prefix, follows=follows, posts=posts, likes=likes,
+        comments=comments, messages=messages, batch_size=batch_size, echo=click.echo
+    )
+    for table, rows in counts.items():
+        click.echo(f"  {table:<26} {rows:>10,}")
+    click.echo(f"✓ Seeded {sum(counts.values()):,} rows (password for {prefix}N accounts: {SEED_PASSWORD})")
+
+replicas_cli = AppGroup('replicas', help='Read replica commands.')
+
+@replicas_cli.command('status')
+def replica_status_command():
+    """Health-check the read replicas (DB_REPLICA_URIS) and show their lag"""
+    from app.lib.replicas import replica_set
+    
+    if not replica_set.keys:
+        click.echo("No read replicas configured (set DB_REPLICA_URIS)")
+        return
+    replica_set.check()
+    for replica in replica_set.status():
+        lag = f"{replica['lag_seconds']:.1f}s behind" if replica['lag_seconds'] is not None else "unreachable"
+        click.echo(f"  {'✓' if replica['healthy'] else '✗'} {replica['key']:<12} {replica['url']}  {lag}")
+
+jobs_cli = AppGroup('jobs', help='Background job commands.')
+
+@jobs_cli.command('stats')
+def job_stats_command():
+    """Show job counts by name and status"""
+    from app.lib.jobs import job_stats
+    
+    rows = job_stats()
+    if not rows:
+        click.echo("No jobs")
+        return
+    for name, status, count, oldest in rows:
+        click.echo(f"  {name:<28} {status:<8} {count:>8,}  oldest run_at {oldest:%Y-%m-%d %H:%M:%S}")
+
+@jobs_cli.command('retry')
+@click.argument('job_ids', nargs=-1, type=int)
+def retry_jobs_command(job_ids):
+    """Queue failed jobs again (all of them, or the given ids)"""
+    from app.lib.jobs import retry_failed
+    
+    click.echo(f"✓ Queued {retry_failed(job_ids)} failed job(s) again")
+
+@jobs_cli.command('purge')
+@click.option('--retention-hours', type=int, default=None, help='Keep done jobs newer than this (default: JOBS_RETENTION_HOURS).')
+@click.option('--failed-retention-days', type=int, default=None, help='Keep failed jobs newer than this (default: JOBS_FAILED_RETENTION_DAYS).')
+def purge_jobs_command(retention_hours, failed_retention_days):
+    """Delete finished jobs past their retention"""
+    from app.lib.jobs import purge_jobs
+    
+    removed = purge_jobs(retention_hours=retention_hours, failed_retention_days=failed_retention_days)
+    click.echo(f"✓ Purged {removed} job(s)")
+
+@click.command('worker')
+@click.option('--concurrency', type=int, default=1, help='Jobs run at once (threads).')
+@click.option('--job', 'names', multiple=True, help='Only run jobs with this name (repeatable).')
+@click.option('--burst', is_flag=True, help='Exit once no job is due instead of waiting for more.')
+@with_appcontext
+def worker_command(concurrency, names, burst):
+    """Run background jobs until interrupted (SIGINT/SIGTERM finish the running jobs first)"""
+    import signal
+    from flask import current_app
+    from app.lib.jobs import Worker, job_queue
+    
+    app = current_app._get_current_object()
+    job_queue.stop_embedded()
+    worker = Worker(app, concurrency=concurrency, names=names)
+    for signum in (signal.SIGINT, signal.SIGTERM):
+        signal.signal(signum, lambda *args: worker.stop())
+    click.echo(f"Worker {worker.id}: {concurrency} thread(s){', jobs ' + ', '.join(names) if names else ''}")
+    worker.work(burst=burst)
+    click.echo("✓ Worker stopped")
+
+@click.command('init-db')
+@with_appcontext
+def init_db_command():
+    """Create missing tables (for deployments with SCHEMA_AUTO_CREATE=false and no migrations)"""
+    from app.lib.database import create_schema
+    
+    create_schema()
+    click.echo("✓ Database tables created")
+
+def register_cli(app):
+    """Register CLI command groups on the app"""
+    app.cli.add_command(notifications_cli)
+    app.cli.add_command(stories_cli)
+    app.cli.add_command(data_cli)
+    app.cli.add_command(replicas_cli)
+    app.cli.add_command(jobs_cli)
+    app.cli.add_command(worker_command)
+    app.cli.add_command(init_db_command)
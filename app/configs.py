@@ -10,6 +10,28 @@ class Config():
     SECRET_KEY = os.getenv("SECRET_KEY") or os.urandom(32).hex()
     SQLALCHEMY_DATABASE_URI = os.getenv("DB_URI")
     SQLALCHEMY_TRACK_MODIFICATIONS = False
+    SCHEMA_AUTO_CREATE = os.getenv("SCHEMA_AUTO_CREATE", "true").lower() != "false"  # false = tables only via `flask db upgrade` / `flask init-db`
+    
+    # Engine profile (app/lib/database.py); anything set in SQLALCHEMY_ENGINE_OPTIONS overrides it
+    DB_ENGINE_PROFILE = os.getenv("DB_ENGINE_PROFILE", "tuned")  # tuned = options below for the DB_URI backend; default = SQLAlchemy's defaults
+    DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", 10))  # Connections kept open per process
+    DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", 20))  # Extra connections opened under load, closed when returned
+    DB_POOL_TIMEOUT = 30  # Seconds a request waits for a free connection before failing
+    DB_POOL_RECYCLE = 1800  # PostgreSQL: replace connections older than this (server/proxy idle timeouts)
+    DB_POOL_PRE_PING = True  # PostgreSQL: test connections on checkout (survives server restarts and failovers)
+    DB_STATEMENT_TIMEOUT_MS = int(os.getenv("DB_STATEMENT_TIMEOUT_MS", 30000))  # PostgreSQL: cancel longer statements; 0 = no limit
+    SQLITE_JOURNAL_MODE = "WAL"  # Readers and the writer don't block each other
+    SQLITE_SYNCHRONOUS = "NORMAL"  # fsync at checkpoints only; with WAL a power loss may drop the last commits, never corrupts
+    SQLITE_BUSY_TIMEOUT_MS = int(os.getenv("SQLITE_BUSY_TIMEOUT_MS", 5000))  # Wait this long for the write lock before "database is locked"
+    SQLITE_MMAP_SIZE = 256 * 1024 * 1024  # Bytes of the database file read through mmap
+    SQLITE_CACHE_SIZE = -16000  # Page cache per connection; negative = KiB (16MB)
+    
+    # Read replicas (app/lib/replicas.py): GET requests without writes read from one of these binds
+    DB_REPLICA_URIS = [uri.strip() for uri in os.getenv("DB_REPLICA_URIS", "").split(",") if uri.strip()]  # Empty = primary only
+    DB_REPLICA_STICKY_SECONDS = int(os.getenv("DB_REPLICA_STICKY_SECONDS", 5))  # After a write, that client reads from the primary this long
+    DB_REPLICA_CHECK_INTERVAL = 10  # Seconds between replica health checks; 0 = only errors take replicas out
+    DB_REPLICA_RETRY_SECONDS = 30  # A failing replica is skipped this long (or until a health check passes)
+    DB_REPLICA_MAX_LAG_SECONDS = 10  # PostgreSQL replicas further behind the primary are skipped
     
     # Upload configuration
     UPLOAD_FOLDER = os.path.join(basedir, 'uploads')
@@ -17,29 +39,103 @@ class Config():
     ALLOWED_EXTENSIONS = {'png', 'jpg', 'jpeg', 'gif', 'webp', 'mp4', 'mov', 'avi'}  # Added video formats
     ALLOWED_IMAGE_EXTENSIONS = {'png', 'jpg', 'jpeg', 'gif', 'webp'}
     ALLOWED_VIDEO_EXTENSIONS = {'mp4', 'mov', 'avi'}
-    
-    # Ensure upload directories exist
-    os.makedirs(UPLOAD_FOLDER, exist_ok=True)
-    os.makedirs(os.path.join(UPLOAD_FOLDER, 'posts'), exist_ok=True)
-    os.makedirs(os.path.join(UPLOAD_FOLDER, 'profiles'), exist_ok=True)
-    os.makedirs(os.path.join(UPLOAD_FOLDER, 'stories'), exist_ok=True)
-    os.makedirs(os.path.join(UPLOAD_FOLDER, 'messages'), exist_ok=True)
+    MAX_IMAGE_PIXELS = 64 * 1000 * 1000  # Reject uploads above 64MP before decoding (decompression bomb guard)
+    # Upload subfolders (posts, profiles, stories, messages) are created on first save
     
     # Security
     WTF_CSRF_ENABLED = True
     WTF_CSRF_TIME_LIMIT = 3600  # 1 hour
     
+    # Notification aggregation ("alice and 12 others liked your post")
+    NOTIFICATION_AGGREGATION_WINDOW = 24 * 3600  # Seconds an unread aggregate keeps absorbing new actors
+    NOTIFICATION_RECENT_ACTORS = 3  # Actors kept per aggregate for display
+    
+    # Notification retention: read notifications older than this are archived (or deleted)
+    NOTIFICATION_RETENTION_DAYS = int(os.getenv("NOTIFICATION_RETENTION_DAYS", 90))
+    NOTIFICATION_ARCHIVE = os.getenv("NOTIFICATION_ARCHIVE", "true").lower() != "false"  # False = delete
+    NOTIFICATION_COMPACT_BATCH_SIZE = 500  # Rows per compaction transaction
+    NOTIFICATION_COMPACT_INTERVAL = int(os.getenv("NOTIFICATION_COMPACT_INTERVAL", 0))  # Seconds; 0 = use cron/CLI only
+    
+    # Expired stories (except highlights) are deleted with their views and media files
+    STORY_SWEEP_BATCH_SIZE = 200  # Stories per sweep transaction
+    STORY_SWEEP_INTERVAL = int(os.getenv("STORY_SWEEP_INTERVAL", 0))  # Seconds; 0 = use cron/CLI only
+    STORY_TRAY_CACHE_TIMEOUT = 60  # Seconds a viewer's story tray stays cached (invalidated on new story/view)
+    
+    # Story views are buffered in memory and written in batches (INSERT ... ON CONFLICT DO NOTHING)
+    STORY_VIEW_BUFFER_ENABLED = os.getenv("STORY_VIEW_BUFFER_ENABLED", "true").lower() != "false"  # False = write each view immediately
+    STORY_VIEW_FLUSH_INTERVAL = 0.25  # Seconds between background flushes
+    STORY_VIEW_FLUSH_SIZE = 200  # Flush immediately once this many views are pending
+    
+    # Post like counters (posts.likes_count) are summed in memory and applied in batches
+    LIKE_COUNT_BUFFER_ENABLED = os.getenv("LIKE_COUNT_BUFFER_ENABLED", "true").lower() != "false"  # False = update on every like
+    LIKE_COUNT_FLUSH_INTERVAL = 0.5  # Seconds between background flushes
+    LIKE_COUNT_FLUSH_SIZE = 500  # Flush immediately once this many posts have pending deltas
+    
+    # Background jobs (app/lib/jobs.py): emails and notifications run after the request, with retries
+    JOBS_MODE = os.getenv("JOBS_MODE", "embedded")  # embedded = loop in each web process; worker = `flask worker` only; eager = run on commit (tests)
+    JOBS_MAX_ATTEMPTS = 5  # Runs before a job is kept as failed (tasks may set their own)
+    JOBS_BACKOFF_SECONDS = 10  # Retry delay after the first failure, doubled after each further one
+    JOBS_BACKOFF_MAX_SECONDS = 3600  # Longest retry delay
+    JOBS_LEASE_SECONDS = 300  # A running job whose worker died is claimed again after this
+    JOBS_POLL_INTERVAL = 1.0  # Seconds an idle worker waits before looking for due jobs again
+    JOBS_RETENTION_HOURS = 24  # Done jobs (and their idempotency keys) are deleted after this
+    JOBS_FAILED_RETENTION_DAYS = 7  # Failed jobs are kept this long for `flask jobs retry`
+    JOBS_PURGE_INTERVAL = int(os.getenv("JOBS_PURGE_INTERVAL", 3600))  # Seconds; 0 = use cron/CLI only
+    SOCKETIO_MESSAGE_QUEUE = os.getenv("SOCKETIO_MESSAGE_QUEUE")  # e.g. redis://...; lets `flask worker` and other processes emit to clients
+    
+    # Response compression (gzip, or brotli when installed) for text responses above COMPRESS_MIN_SIZE bytes
+    COMPRESS_ENABLED = os.getenv("COMPRESS_ENABLED", "true").lower() != "false"  # Disable when a proxy compresses
+    COMPRESS_MIN_SIZE = 1024  # Smaller bodies are sent as-is (framing overhead outweighs the savings)
+    COMPRESS_LEVEL = 6  # gzip level
+    COMPRESS_BR_QUALITY = 4  # brotli quality (higher levels cost far more CPU per request)
+    COMPRESS_MIMETYPES = {'application/json', 'application/msgpack', 'text/html', 'text/css', 'text/plain', 'application/javascript'}
+    
+    # Per-request query counting (Server-Timing header, debug log, N+1 warnings)
+    QUERY_COUNTER_ENABLED = os.getenv("QUERY_COUNTER_ENABLED", "false").lower() == "true"
+    QUERY_N_PLUS_ONE_THRESHOLD = 5  # Warn when one statement shape runs this many times in a request
+    QUERY_BUDGET = int(os.getenv("QUERY_BUDGET", 0))  # Max queries per request; 0 = no limit
+    QUERY_BUDGET_RAISE = False  # True (tests) = raise QueryBudgetExceeded instead of logging a warning
+    
+    # Outgoing email (delivered by the email.send background job)
+    MAIL_BACKEND = os.getenv("MAIL_BACKEND", "console")  # console (log only), smtp, memory (tests) or a dotted path to callable(message)
+    MAIL_DEFAULT_SENDER = os.getenv("MAIL_DEFAULT_SENDER", "no-reply@localhost")
+    MAIL_SERVER = os.getenv("MAIL_SERVER", "localhost")
+    MAIL_PORT = int(os.getenv("MAIL_PORT", 587))
+    MAIL_USERNAME = os.getenv("MAIL_USERNAME")
+    MAIL_PASSWORD = os.getenv("MAIL_PASSWORD")
+    MAIL_USE_TLS = os.getenv("MAIL_USE_TLS", "true").lower() != "false"  # STARTTLS after connecting
+    MAIL_TIMEOUT = 10  # Seconds before an SMTP connection attempt fails (and the job is retried)
+    
+    # Opt-in Prometheus text metrics at GET /metrics (set METRICS_TOKEN wherever it is reachable from outside)
+    METRICS_ENABLED = os.getenv("METRICS_ENABLED", "false").lower() == "true"
+    METRICS_TOKEN = os.getenv("METRICS_TOKEN")  # If set, scrapers must send "Authorization: Bearer <token>"
+    METRICS_MULTIPROC_DIR = os.getenv("METRICS_MULTIPROC_DIR") or os.getenv("PROMETHEUS_MULTIPROC_DIR")  # Shared by gunicorn workers
+    METRICS_SYNC_INTERVAL = 5  # Seconds between a worker's snapshot writes (multiprocess mode)
+    
+    # Opt-in request profiling: slow-request logs with their SQL, sampled cProfile captures (GET /admin/profiles)
+    PROFILING_ENABLED = os.getenv("PROFILING_ENABLED", "false").lower() == "true"
+    SLOW_REQUEST_THRESHOLD_MS = int(os.getenv("SLOW_REQUEST_THRESHOLD_MS", 500))  # Log and store requests at least this slow
+    SLOW_QUERY_THRESHOLD_MS = int(os.getenv("SLOW_QUERY_THRESHOLD_MS", 100))  # Log single statements at least this slow
+    PROFILE_SAMPLE_RATE = float(os.getenv("PROFILE_SAMPLE_RATE", 0.01))  # Fraction of requests run under cProfile (0.01 = 1%)
+    PROFILE_DIR = os.getenv("PROFILE_DIR")  # Default: <instance folder>/profiles
+    ADMIN_TOKEN = os.getenv("ADMIN_TOKEN")  # Bearer token for /admin/profiles; unset = the admin endpoints return 404
+    PROFILE_MAX_FILES = 200  # Newest captures kept; older ones are deleted
+    PROFILE_SLOW_STATEMENTS = 10  # Slowest SQL statements logged and stored per capture
+    
     # Cache configuration
-    CACHE_TYPE = "SimpleCache"  # Use SimpleCache for development (in-memory)
+    CACHE_TYPE = "app.lib.cache.LRUCache"  # Bounded, thread-safe in-process LRU cache (per worker)
     CACHE_DEFAULT_TIMEOUT = 300  # 5 minutes default timeout
+    CACHE_MAX_ENTRIES = 2048  # LRU entries per worker before eviction
+    CACHE_MAX_BYTES = 64 * 1024 * 1024  # Pickled bytes per worker before eviction
     # For production, set CACHE_TYPE to "RedisCache" or "MemcachedCache"
     # CACHE_REDIS_URL = os.getenv("REDIS_URL", "redis://localhost:6379/0")
 
 class DevConf(Config):
     SECRET_KEY = "SECRET"
-    # Use absolute path for database
+    QUERY_COUNTER_ENABLED = True
+    METRICS_ENABLED = os.getenv("METRICS_ENABLED", "true").lower() != "false"
+    # Use absolute path for database (the instance directory is created on first connect)
     instance_path = os.path.join(basedir, 'instance')
-    os.makedirs(instance_path, exist_ok=True)  # Ensure instance directory exists
     db_file = os.path.join(instance_path, 'site.db')
     # Use 4 slashes for absolute path in SQLite URI
     SQLALCHEMY_DATABASE_URI = f"sqlite:///{db_file}"
@@ -53,10 +149,14 @@ class ProdConf(Config):
     else:
         # Fallback to SQLite if DB_URI not set
         _instance_path = os.path.join(basedir, 'instance')
-        os.makedirs(_instance_path, exist_ok=True)
         _db_file = os.path.join(_instance_path, 'site.db')
         SQLALCHEMY_DATABASE_URI = f"sqlite:///{_db_file}"
-    # Production cache configuration - uncomment and configure based on your setup
-    # CACHE_TYPE = "RedisCache"
-    # CACHE_REDIS_URL = os.getenv("REDIS_URL")
+    # Production cache: per-worker L1 in front of shared Redis (L2), with pub/sub invalidation
+    if os.getenv("REDIS_URL"):
+        CACHE_TYPE = "app.lib.cache.TieredCache"
+        CACHE_L2_TYPE = "RedisCache"
+        CACHE_REDIS_URL = os.getenv("REDIS_URL")
+        CACHE_L1_MAX_ENTRIES = 512  # Per-worker L1 entries
+        CACHE_L1_MAX_BYTES = 16 * 1024 * 1024  # Per-worker L1 pickled bytes
+        CACHE_L1_TIMEOUT = 5  # Max seconds an L1 copy lives (bounds staleness if a message is lost)
     # CACHE_DEFAULT_TIMEOUT = 600  # 10 minutes for production
\ No newline at end of file
@@ -0,0 +1,123 @@
+"""
+Write-behind buffers: collect high-frequency writes (views, likes) in memory
+and flush them to the database in batched statements
+"""
+import atexit
+import os
+import threading
+import time
+from sqlalchemy.dialects import postgresql, sqlite
+
+from app.extension import db, socketio
+from app.lib.scheduler import start_when_serving
+
+def insert_ignore(dialect_name, model):
+    """INSERT for model that skips rows violating a unique constraint (ON CONFLICT DO NOTHING)"""
+    dialect = postgresql if dialect_name == 'postgresql' else sqlite
+    return dialect.insert(model).on_conflict_do_nothing()
+
+class WriteBehindBuffer:
+    """Thread-safe buffer of pending writes keyed for in-memory dedupe.
+    
+    Subclasses implement write(conn, items), which receives {key: value} and runs
+    inside a single transaction. Items are flushed every `interval` seconds by a
+    background task of the serving process, as soon as `max_items` are pending,
+    and at interpreter exit. When disabled, every add() is written immediately.
+    """
+    
+    def __init__(self, name, config_prefix):
+        self.name = name
+        self.config_prefix = config_prefix
+        self.app = None
+        self.enabled = True
+        self.interval = 0.25
+        self.max_items = 200
+        self._pending = {}
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._exit_hook = False
+        self._loop_pid = None
+    
+    def init_app(self, app):
+        """Read <PREFIX>_BUFFER_ENABLED / _FLUSH_INTERVAL / _FLUSH_SIZE; flushing starts with the first request"""
+        self.app = app
+        self.enabled = app.config.get(f'{self.config_prefix}_BUFFER_ENABLED', True)
+        self.interval = app.config.get(f'{self.config_prefix}_FLUSH_INTERVAL', self.interval)
+        self.max_items = app.config.get(f'{self.config_prefix}_FLUSH_SIZE', self.max_items)
+        if self.enabled:
+            if not self._exit_hook:
+                self._exit_hook = True
+                atexit.register(self.flush)
+            start_when_serving(app, self._run)
+    
+    def _run(self):
+        # One loop per process, however many apps were initialised
+        with self._lock:
+            if self._loop_pid == os.getpid():
+                return
+            self._loop_pid = os.getpid()
+        while True:
+            socketio.sleep(self.interval)
+            self.flush()
+    
+    def merge(self, existing, value):
+        """Combine a new value with one already pending under the same key (default: keep first)"""
+        return existing
+    
+    def add(self, key, value=None):
+        """Queue a write; returns True if the key was not already pending"""
+        with self._lock:
+            is_new = key not in self._pending
+            self._pending[key] = value if is_new else self.merge(self._pending[key], value)
+            size = len(self._pending)
+        if not self.enabled or size >= self.max_items:
+            self.flush()
+        return is_new
+    
+    def pending(self):
+        """Snapshot of items not yet written"""
+        with self._lock:
+            return dict(self._pending)
+    
+    def pending_value(self, key, default=None):
+        """Value pending under key, or default if nothing is queued for it"""
+        with self._lock:
+            return self._pending.get(key, default)
+    
+    def write(self, conn, items):
+        raise NotImplementedError
+    
+    def after_write(self, result):
+        """Hook run after the flush transaction commits (e.g. cache invalidation)"""
+    
+    def flush(self):
+        """Write all pending items in one transaction; returns number of items flushed.
+        On failure the items are put back and retried on the next flush.
+        """
+        if self.app is None:
+            return 0
+        with self._flush_lock:
+            with self._lock:
+                items, self._pending = self._pending, {}
+            if not items:
+                return 0
+            
+            started = time.perf_counter()
+            with self.app.app_context():
+                try:
+                    with db.engine.begin() as conn:
+                        result = self.write(conn, items)
+                except Exception:
+                    self.app.logger.warning(f"{self.name} buffer flush failed; retrying later", exc_info=True)
+                    with self._lock:
+                        for key, value in items.items():
+                            self._pending[key] = self.merge(value, self._pending[key]) if key in self._pending else value
+                    return 0
+                
+                try:
+                    self.after_write(result)
+                except Exception:
+                    self.app.logger.warning(f"{self.name} buffer after_write failed", exc_info=True)
+            
+            self.app.logger.debug(f"{self.name} buffer flushed {len(items)} item(s) in {(time.perf_counter() - started) * 1000:.1f}ms")
+            return len(items)
@@ -0,0 +1,433 @@
+"""
+Cache backends and helpers.
+
+- LRUCache: bounded, thread-safe in-process LRU/TTL cache. Used as the cache
+  fallback when Flask-Caching is not installed and as a Flask-Caching backend
+  (CACHE_TYPE = "app.lib.cache.LRUCache").
+- TieredCache: small per-process LRUCache (L1) in front of a shared backend
+  (L2, e.g. Redis), with writes broadcast over Redis pub/sub so every worker
+  drops its L1 copy (CACHE_TYPE = "app.lib.cache.TieredCache").
+- get_or_compute: single-flight read-through helper (stampede protection).
+"""
+import datetime
+import json
+import logging
+import pickle
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from werkzeug.utils import import_string
+
+try:
+    from flask_caching.backends.base import BaseCache
+except ImportError:
+    BaseCache = object
+
+logger = logging.getLogger(__name__)
+
+# Run a full expired-key sweep every this many writes
+SWEEP_EVERY = 256
+
+class LRUCache(BaseCache):
+    """LRU cache bounded by entry count and (pickled) size, with per-key timeouts.
+    
+    Values are pickled on write, so readers get their own copy and the byte
+    bound is exact. A timeout of 0 never expires. Expired keys are dropped when
+    read and by a periodic sweep, so they never accumulate.
+    """
+    
+    def __init__(self, default_timeout=300, max_entries=2048, max_bytes=64 * 1024 * 1024,
+                 ignore_delete_many_errors=True):
+        self.default_timeout = self._seconds(default_timeout)
+        self.ignore_delete_many_errors = ignore_delete_many_errors
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()  # key -> (expires_at or None, pickled value)
+        self._bytes = 0
+        self._writes = 0
+        self._lock = threading.RLock()
+        self._stats = {'hits': 0, 'misses': 0, 'sets': 0, 'deletes': 0, 'evictions': 0, 'expirations': 0}
+    
+    @classmethod
+    def factory(cls, app, config, args, kwargs):
+        """Flask-Caching backend factory (reads CACHE_MAX_ENTRIES / CACHE_MAX_BYTES)"""
+        kwargs.update(
+            max_entries=config.get('CACHE_MAX_ENTRIES', 2048),
+            max_bytes=config.get('CACHE_MAX_BYTES', 64 * 1024 * 1024)
+        )
+        return cls(*args, **kwargs)
+    
+    def init_app(self, app):
+        """Configure from app config when used directly as the cache fallback"""
+        self.default_timeout = self._seconds(app.config.get('CACHE_DEFAULT_TIMEOUT', self.default_timeout))
+        self.max_entries = app.config.get('CACHE_MAX_ENTRIES', self.max_entries)
+        self.max_bytes = app.config.get('CACHE_MAX_BYTES', self.max_bytes)
+    
+    @staticmethod
+    def _seconds(timeout):
+        if isinstance(timeout, datetime.timedelta):
+            return int(timeout.total_seconds())
+        return int(timeout)
+    
+    def _expires_at(self, timeout):
+        timeout = self.default_timeout if timeout is None else self._seconds(timeout)
+        return time.monotonic() + timeout if timeout > 0 else None
+    
+    def _remove(self, key):
+        _, data = self._entries.pop(key)
+        self._bytes -= len(data)
+    
+    def _lookup(self, key):
+        """Pickled value for key or None (caller holds the lock)"""
+        entry = self._entries.get(key)
+        if entry is None:
+            self._stats['misses'] += 1
+            return None
+        expires_at, data = entry
+        if expires_at is not None and expires_at <= time.monotonic():
+            self._remove(key)
+            self._stats['expirations'] += 1
+            self._stats['misses'] += 1
+            return None
+        self._entries.move_to_end(key)
+        self._stats['hits'] += 1
+        return data
+    
+    def _sweep_expired(self):
+        now = time.monotonic()
+        expired = [key for key, (expires_at, _) in self._entries.items()
+                   if expires_at is not None and expires_at <= now]
+        for key in expired:
+            self._remove(key)
+        self._stats['expirations'] += len(expired)
+    
+    def _store(self, key, value, timeout):
+        """Insert or replace key and evict least recently used entries over the bounds"""
+        data = pickle.dumps(value, pickle.HIGHEST_PROTOCOL)
+        if key in self._entries:
+            self._remove(key)
+        if len(data) > self.max_bytes:
+            return False
+        self._entries[key] = (self._expires_at(timeout), data)
+        self._bytes += len(data)
+        self._stats['sets'] += 1
+        
+        self._writes += 1
+        if self._writes % SWEEP_EVERY == 0:
+            self._sweep_expired()
+        while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+            self._remove(next(iter(self._entries)))
+            self._stats['evictions'] += 1
+        return True
+    
+    def get(self, key):
+        with self._lock:
+            data = self._lookup(key)
+        return None if data is None else pickle.loads(data)
+    
+    def get_many(self, *keys):
+        with self._lock:
+            found = [self._lookup(key) for key in keys]
+        return [None if data is None else pickle.loads(data) for data in found]
+    
+    def get_dict(self, *keys):
+        return dict(zip(keys, self.get_many(*keys)))
+    
+    def has(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            return entry is not None and (entry[0] is None or entry[0] > time.monotonic())
+    
+    def set(self, key, value, timeout=None):
+        with self._lock:
+            return self._store(key, value, timeout)
+    
+    def set_many(self, mapping, timeout=None):
+        """Set several keys; returns the keys that were stored"""
+        with self._lock:
+            return [key for key, value in mapping.items() if self._store(key, value, timeout)]
+    
+    def add(self, key, value, timeout=None):
+        """Set key only if it is not already cached"""
+        with self._lock:
+            if self.has(key):
+                return False
+            return self._store(key, value, timeout)
+    
+    def delete(self, key):
+        with self._lock:
+            if key not in self._entries:
+                return False
+            self._remove(key)
+            self._stats['deletes'] += 1
+            return True
+    
+    def delete_many(self, *keys):
+        """Delete several keys; returns the keys that are gone (absent keys count as deleted)"""
+        with self._lock:
+            for key in keys:
+                self.delete(key)
+        return list(keys)
+    
+    def inc(self, key, delta=1):
+        with self._lock:
+            value = (self.get(key) or 0) + delta
+            return value if self.set(key, value) else None
+    
+    def dec(self, key, delta=1):
+        return self.inc(key, -delta)
+    
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+        return True
+    
+    def stats(self):
+        """Counters and current size, e.g. for metrics"""
+        with self._lock:
+            lookups = self._stats['hits'] + self._stats['misses']
+            return {
+                **self._stats,
+                'hit_ratio': self._stats['hits'] / lookups if lookups else 0.0,
+                'entries': len(self._entries),
+                'bytes': self._bytes,
+                'max_entries': self.max_entries,
+                'max_bytes': self.max_bytes
+            }
+
+class RedisInvalidationBus:
+    """Broadcasts invalidated cache keys to every worker over a Redis pub/sub channel"""
+    
+    def __init__(self, url, channel):
+        import redis  # Optional dependency, only needed for multi-worker invalidation
+        self.client = redis.Redis.from_url(url)
+        self.channel = channel
+        self.origin = uuid.uuid4().hex  # Lets a worker ignore its own messages
+        self.sent = 0
+        self.received = 0
+    
+    def publish(self, keys):
+        """Tell other workers to drop keys (None = everything) from their L1"""
+        try:
+            self.client.publish(self.channel, json.dumps({'origin': self.origin, 'keys': keys}))
+            self.sent += 1
+        except Exception:
+            # Other workers' L1 copies still expire after CACHE_L1_TIMEOUT
+            logger.warning("Cache invalidation publish failed", exc_info=True)
+    
+    def subscribe(self, callback):
+        """Call callback(keys) for every message from other workers, on a daemon thread"""
+        def listen():
+            while True:
+                try:
+                    pubsub = self.client.pubsub(ignore_subscribe_messages=True)
+                    pubsub.subscribe(self.channel)
+                    for message in pubsub.listen():
+                        payload = json.loads(message['data'])
+                        if payload.get('origin') != self.origin:
+                            self.received += 1
+                            callback(payload.get('keys'))
+                except Exception:
+                    logger.warning("Cache invalidation subscriber disconnected; retrying", exc_info=True)
+                    time.sleep(1)
+        
+        threading.Thread(target=listen, name='cache-invalidation', daemon=True).start()
+
+class TieredCache(BaseCache):
+    """Per-process L1 (LRUCache) in front of a shared L2 backend.
+    
+    Reads try L1, then L2 (filling L1). Writes and deletes go to L2 and L1 and
+    are broadcast so other workers drop the key from their L1. L1 entries live
+    at most l1_timeout seconds, which bounds staleness if a message is lost.
+    """
+    
+    def __init__(self, l1, l2, bus=None, l1_timeout=5, default_timeout=300, ignore_delete_many_errors=True):
+        self.default_timeout = default_timeout
+        self.ignore_delete_many_errors = ignore_delete_many_errors
+        self.l1 = l1
+        self.l2 = l2
+        self.bus = bus
+        self.l1_timeout = l1_timeout
+        if bus:
+            bus.subscribe(self._drop_local)
+    
+    @classmethod
+    def factory(cls, app, config, args, kwargs):
+        """Flask-Caching backend factory.
+        
+        CACHE_L2_TYPE: Flask-Caching backend for the shared tier (e.g. "RedisCache"; its own settings
+        such as CACHE_REDIS_URL apply). CACHE_L1_MAX_ENTRIES / CACHE_L1_MAX_BYTES / CACHE_L1_TIMEOUT size
+        the per-process tier. CACHE_INVALIDATION_URL (default CACHE_REDIS_URL) enables pub/sub invalidation.
+        """
+        l2_type = config.get('CACHE_L2_TYPE', 'app.lib.cache.LRUCache')
+        l2_factory = import_string(l2_type if '.' in l2_type else f'flask_caching.backends.{l2_type}')
+        l2 = l2_factory.factory(app, config, list(args), dict(kwargs))
+        
+        l1 = LRUCache(
+            default_timeout=kwargs.get('default_timeout', 300),
+            max_entries=config.get('CACHE_L1_MAX_ENTRIES', 512),
+            max_bytes=config.get('CACHE_L1_MAX_BYTES', 16 * 1024 * 1024)
+        )
+        
+        bus = None
+        invalidation_url = config.get('CACHE_INVALIDATION_URL') or config.get('CACHE_REDIS_URL')
+        if invalidation_url:
+            bus = RedisInvalidationBus(invalidation_url, config.get('CACHE_INVALIDATION_CHANNEL', 'cache-invalidation'))
+        
+        return cls(l1, l2, bus, l1_timeout=config.get('CACHE_L1_TIMEOUT', 5), **kwargs)
+    
+    def _l1_timeout(self, timeout):
+        timeout = self.default_timeout if timeout is None else LRUCache._seconds(timeout)
+        return min(timeout, self.l1_timeout) if timeout > 0 else self.l1_timeout
+    
+    def _drop_local(self, keys):
+        if keys is None:
+            self.l1.clear()
+        else:
+            self.l1.delete_many(*keys)
+    
+    def _broadcast(self, keys):
+        if self.bus:
+            self.bus.publish(keys)
+    
+    def get(self, key):
+        value = self.l1.get(key)
+        if value is None:
+            value = self.l2.get(key)
+            if value is not None:
+                self.l1.set(key, value, timeout=self.l1_timeout)
+        return value
+    
+    def get_many(self, *keys):
+        values = self.l1.get_many(*keys)
+        missing = [key for key, value in zip(keys, values) if value is None]
+        if missing:
+            found = dict(zip(missing, self.l2.get_many(*missing)))
+            self.l1.set_many({key: value for key, value in found.items() if value is not None}, timeout=self.l1_timeout)
+            values = [found.get(key) if value is None else value for key, value in zip(keys, values)]
+        return values
+    
+    def get_dict(self, *keys):
+        return dict(zip(keys, self.get_many(*keys)))
+    
+    def has(self, key):
+        return self.l1.has(key) or self.l2.has(key)
+    
+    def set(self, key, value, timeout=None):
+        stored = self.l2.set(key, value, timeout=timeout)
+        self.l1.set(key, value, timeout=self._l1_timeout(timeout))
+        self._broadcast([key])
+        return stored
+    
+    def set_many(self, mapping, timeout=None):
+        stored = self.l2.set_many(mapping, timeout=timeout)
+        self.l1.set_many(mapping, timeout=self._l1_timeout(timeout))
+        self._broadcast(list(mapping))
+        return stored
+    
+    def add(self, key, value, timeout=None):
+        """Set key only if absent from the shared tier (usable as a cross-worker lock)"""
+        added = self.l2.add(key, value, timeout=timeout)
+        if added:
+            self.l1.set(key, value, timeout=self._l1_timeout(timeout))
+            self._broadcast([key])
+        return added
+    
+    def delete(self, key):
+        self.l1.delete(key)
+        deleted = self.l2.delete(key)
+        self._broadcast([key])
+        return deleted
+    
+    def delete_many(self, *keys):
+        self.l1.delete_many(*keys)
+        deleted = self.l2.delete_many(*keys)
+        self._broadcast(list(keys))
+        return deleted
+    
+    def inc(self, key, delta=1):
+        self.l1.delete(key)
+        value = self.l2.inc(key, delta)
+        self._broadcast([key])
+        return value
+    
+    def dec(self, key, delta=1):
+        return self.inc(key, -delta)
+    
+    def clear(self):
+        self.l1.clear()
+        cleared = self.l2.clear()
+        self._broadcast(None)
+        return cleared
+    
+    def stats(self):
+        """L1 counters, L2 counters (if it keeps any) and pub/sub message counts"""
+        l2_stats = getattr(self.l2, 'stats', None)
+        return {
+            'l1': self.l1.stats(),
+            'l2': l2_stats() if callable(l2_stats) else None,
+            'invalidations_sent': self.bus.sent if self.bus else 0,
+            'invalidations_received': self.bus.received if self.bus else 0
+        }
+
+# Per-process single-flight locks: {key: [lock, waiters]}
+_flights = {}
+_flights_guard = threading.Lock()
+
+def get_or_compute(key, compute, timeout=None, lock_timeout=10):
+    """Read-through cache with stampede protection.
+    
+    On a miss only one thread per process, and (through an add()-based lock in the
+    shared tier) one worker overall, runs compute(); the others wait up to
+    lock_timeout seconds for its result. None results are not cached. A compute()
+    whose result gets cached reads from the primary: the entry can outlive any
+    replica lag, so it must not be filled from a stale replica.
+    """
+    from app.extension import cache
+    from app.lib.replicas import primary_reads
+    
+    value = cache.get(key)
+    if value is not None:
+        return value
+    
+    with _flights_guard:
+        flight = _flights.setdefault(key, [threading.Lock(), 0])
+        flight[1] += 1
+    try:
+        with flight[0]:
+            value = cache.get(key)
+            if value is not None:
+                return value
+            
+            lock_key = f"{key}:lock"
+            if cache.add(lock_key, 1, timeout=lock_timeout):
+                try:
+                    with primary_reads():
+                        value = compute()
+                    if value is not None:
+                        cache.set(key, value, timeout=timeout)
+                    return value
+                finally:
+                    cache.delete(lock_key)
+            
+            # Another worker is computing it: wait for the result, then give up and compute
+            deadline = time.monotonic() + lock_timeout
+            while time.monotonic() < deadline:
+                time.sleep(0.05)
+                value = cache.get(key)
+                if value is not None:
+                    return value
+            return compute()
+    finally:
+        with _flights_guard:
+            flight[1] -= 1
+            if not flight[1]:
+                _flights.pop(key, None)
+
+def cache_stats(cache):
+    """Stats of the cache backend behind a Flask-Caching Cache (or the fallback), if it keeps any"""
+    backend = getattr(cache, 'cache', cache)
+    stats = getattr(backend, 'stats', None)
+    return stats() if callable(stats) else None
@@ -0,0 +1,129 @@
+"""
+Database engine profiles (DB_ENGINE_PROFILE)
+
+"tuned" derives SQLALCHEMY_ENGINE_OPTIONS from the database URL:
+- SQLite: a sized connection pool, and on every new connection the WAL journal,
+  synchronous=NORMAL, busy_timeout, mmap_size and cache_size pragmas, so readers
+  don't block the writer and concurrent writers wait instead of failing with
+  "database is locked".
+- PostgreSQL: pool size/overflow/timeout, recycling, pre-ping and a server-side
+  statement_timeout.
+"default" leaves SQLAlchemy's defaults. Options set explicitly in
+SQLALCHEMY_ENGINE_OPTIONS always win over the profile. Read replicas
+(DB_REPLICA_URIS, see app/lib/replicas.py) get the same options for their URL.
+"""
+import os
+from sqlalchemy import event
+from sqlalchemy.engine import make_url
+
+from app.extension import db
+from app.lib.replicas import replica_binds
+
+PROFILES = ('tuned', 'default')
+
+def _backend(url):
+    return make_url(url).get_backend_name()
+
+def _is_sqlite_memory(url):
+    url = make_url(url)
+    return url.database in (None, '', ':memory:') or url.query.get('mode') == 'memory'
+
+def _profile(config):
+    profile = (config.get('DB_ENGINE_PROFILE') or 'tuned').lower()
+    if profile not in PROFILES:
+        raise ValueError(f"DB_ENGINE_PROFILE must be one of {', '.join(PROFILES)}, not {profile!r}")
+    return profile
+
+def engine_options(config, url):
+    """Engine options of the configured profile for a database URL"""
+    if not url or _profile(config) == 'default':
+        return {}
+    
+    backend = _backend(url)
+    if backend == 'sqlite':
+        if _is_sqlite_memory(url):
+            return {}  # Single-connection pools; nothing to size
+        return {
+            'pool_size': config.get('DB_POOL_SIZE', 10),
+            'max_overflow': config.get('DB_MAX_OVERFLOW', 20),
+            'pool_timeout': config.get('DB_POOL_TIMEOUT', 30),
+        }
+    if backend == 'postgresql':
+        options = {
+            'pool_size': config.get('DB_POOL_SIZE', 10),
+            'max_overflow': config.get('DB_MAX_OVERFLOW', 20),
+            'pool_timeout': config.get('DB_POOL_TIMEOUT', 30),
+            'pool_recycle': config.get('DB_POOL_RECYCLE', 1800),
+            'pool_pre_ping': config.get('DB_POOL_PRE_PING', True),
+        }
+        statement_timeout = config.get('DB_STATEMENT_TIMEOUT_MS')
+        if statement_timeout:
+            # libpq startup option, understood by psycopg2 and psycopg 3
+            options['connect_args'] = {'options': f'-c statement_timeout={int(statement_timeout)}'}
+        return options
+    return {}
+
+def sqlite_pragmas(config):
+    """PRAGMA statements run on each new SQLite connection (busy_timeout first, so switching to WAL waits for locks)"""
+    pragmas = [f"PRAGMA busy_timeout = {int(config.get('SQLITE_BUSY_TIMEOUT_MS', 5000))}"]
+    if config.get('SQLITE_JOURNAL_MODE'):
+        pragmas.append(f"PRAGMA journal_mode = {config['SQLITE_JOURNAL_MODE']}")
+    if config.get('SQLITE_SYNCHRONOUS'):
+        pragmas.append(f"PRAGMA synchronous = {config['SQLITE_SYNCHRONOUS']}")
+    if config.get('SQLITE_MMAP_SIZE') is not None:
+        pragmas.append(f"PRAGMA mmap_size = {int(config['SQLITE_MMAP_SIZE'])}")
+    if config.get('SQLITE_CACHE_SIZE') is not None:
+        pragmas.append(f"PRAGMA cache_size = {int(config['SQLITE_CACHE_SIZE'])}")
+    return pragmas
+
+def configure(app):
+    """Merge the profile's options under SQLALCHEMY_ENGINE_OPTIONS and add the replica
+    binds (before db.init_app creates the engines)
+    """
+    options = engine_options(app.config, app.config.get('SQLALCHEMY_DATABASE_URI'))
+    options.update(app.config.get('SQLALCHEMY_ENGINE_OPTIONS') or {})
+    app.config['SQLALCHEMY_ENGINE_OPTIONS'] = options
+    
+    binds = dict(app.config.get('SQLALCHEMY_BINDS') or {})
+    for key, uri in replica_binds(app.config).items():
+        binds.setdefault(key, {'url': uri, **engine_options(app.config, uri)})
+    app.config['SQLALCHEMY_BINDS'] = binds
+
+def tune_engine(config, engine):
+    """Run the SQLite pragmas on every new connection of a file-backed SQLite engine"""
+    if _profile(config) == 'default' or engine.dialect.name != 'sqlite' or _is_sqlite_memory(engine.url):
+        return
+    pragmas = sqlite_pragmas(config)
+    
+    @event.listens_for(engine, 'connect')
+    def _set_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        try:
+            for pragma in pragmas:
+                cursor.execute(pragma)
+        finally:
+            cursor.close()
+
+def create_schema():
+    """Create missing tables on the primary (replica binds hold no models and may be down)"""
+    db.create_all(bind_key=None)
+
+def create_sqlite_directory(engine):
+    """Create a file database's directory on its first connection (not at import time)"""
+    if engine.dialect.name != 'sqlite' or _is_sqlite_memory(engine.url):
+        return
+    directory = os.path.dirname(os.path.abspath(engine.url.database))
+    
+    @event.listens_for(engine, 'do_connect')
+    def _create_directory(dialect, connection_record, cargs, cparams):
+        os.makedirs(directory, exist_ok=True)
+
+def init_app(app):
+    """Install the connection hooks on the engines created by db.init_app"""
+    with app.app_context():
+        engines = dict(db.engines)
+    for key, engine in engines.items():
+        tune_engine(app.config, engine)
+    # Only the primary: a missing replica file should fail its health check, not be created empty
+    if None in engines:
+        create_sqlite_directory(engines[None])
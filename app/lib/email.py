@@ -1,15 +1,70 @@
 """
 Email utility functions for sending emails
+
+The send_* helpers run in the request: they set the user's token and queue an
+'email.send' background job (app/lib/jobs.py) that delivers the message after the
+request commits. They do not commit.
+
+The job hands an EmailMessage to the MAIL_BACKEND: "console" (default, logs it),
+"smtp" (MAIL_SERVER / MAIL_PORT / MAIL_USERNAME / MAIL_PASSWORD / MAIL_USE_TLS),
+"memory" (appends it to `outbox`, for tests and scripts) or the dotted path of
+any callable(message).
 """
-import os
+from email.message import EmailMessage
 from flask import url_for, current_app
 from datetime import datetime, timedelta
+from werkzeug.utils import import_string
+
+from app.lib.jobs import enqueue, task
+
+# Messages delivered by the "memory" backend
+outbox = []
+
+def console_backend(message):
+    """Log the message instead of sending it (development)"""
+    current_app.logger.info(f"Email to {message['To']}: {message['Subject']}\n{message.get_body(('plain',)).get_content()}")
+
+def smtp_backend(message):
+    """Send the message through MAIL_SERVER"""
+    import smtplib
+    
+    config = current_app.config
+    with smtplib.SMTP(config.get('MAIL_SERVER', 'localhost'), config.get('MAIL_PORT', 587),
+                      timeout=config.get('MAIL_TIMEOUT', 10)) as smtp:
+        if config.get('MAIL_USE_TLS', True):
+            smtp.starttls()
+        if config.get('MAIL_USERNAME'):
+            smtp.login(config['MAIL_USERNAME'], config.get('MAIL_PASSWORD') or '')
+        smtp.send_message(message)
+
+def memory_backend(message):
+    """Keep the message in `outbox` (tests, scripts)"""
+    outbox.append(message)
+
+MAIL_BACKENDS = {'console': console_backend, 'smtp': smtp_backend, 'memory': memory_backend}
+
+def mail_backend():
+    """The configured MAIL_BACKEND: a name from MAIL_BACKENDS or the dotted path of a callable(message)"""
+    name = current_app.config.get('MAIL_BACKEND') or 'console'
+    backend = MAIL_BACKENDS.get(name)
+    return backend if backend is not None else import_string(name)
+
+# Keep within the mail provider's connection limit
+@task('email.send', max_attempts=8, concurrency=4)
+def deliver_email(to, subject, body, html=None):
+    """Deliver one email through MAIL_BACKEND (background job; failures are retried)"""
+    message = EmailMessage()
+    message['From'] = current_app.config.get('MAIL_DEFAULT_SENDER', 'no-reply@localhost')
+    message['To'] = to
+    message['Subject'] = subject
+    message.set_content(body)
+    if html:
+        message.add_alternative(html, subtype='html')
+    mail_backend()(message)
 
 def send_verification_email(user):
     """
-    Send email verification email to user.
-    In production, integrate with an email service like SendGrid, Mailgun, or AWS SES.
-    For now, this is a placeholder that logs the verification link.
+    Queue the email verification email for user (does not commit).
     """
     if not user.email:
         return False
@@ -19,64 +74,41 @@ def send_verification_email(user):
         from app.lib.auth import generate_verification_token
         token = generate_verification_token()
         user.email_verification_token = token
-        from app.extension import db
-        db.session.commit()
     
-    # In production, use actual email sending service
-    # For development, print to console
     verification_url = url_for('auth_api.verify_email', token=token, _external=True)
     
-    print(f"\n{'='*60}")
-    print(f"EMAIL VERIFICATION (Development Mode)")
-    print(f"To: {user.email}")
-    print(f"Subject: Verify your email address")
-    print(f"\nClick here to verify your email: {verification_url}")
-    print(f"{'='*60}\n")
-    
-    # TODO: Replace with actual email sending
-    # from flask_mail import Message
-    # msg = Message(
-    #     subject='Verify your email address',
-    #     recipients=[user.email],
-    #     html=f'<a href="{verification_url}">Click here to verify</a>'
-    # )
-    # mail.send(msg)
+    enqueue(
+        'email.send',
+        to=user.email,
+        subject='Verify your email address',
+        body=f"Click here to verify your email: {verification_url}",
+        html=f'<a href="{verification_url}">Click here to verify</a>'
+    )
     
     return True
 
 def send_password_reset_email(user):
     """
-    Send password reset email to user.
+    Set a new password reset token and queue the reset email (does not commit).
     """
     if not user.email:
         return False
     
     from app.lib.auth import generate_reset_token
-    from app.extension import db
     
     token = generate_reset_token()
     user.password_reset_token = token
     user.password_reset_expires = datetime.utcnow() + timedelta(hours=1)
-    db.session.commit()
     
     reset_url = url_for('auth_api.reset_password', token=token, _external=True)
     
-    print(f"\n{'='*60}")
-    print(f"PASSWORD RESET EMAIL (Development Mode)")
-    print(f"To: {user.email}")
-    print(f"Subject: Reset your password")
-    print(f"\nClick here to reset your password: {reset_url}")
-    print(f"This link expires in 1 hour.")
-    print(f"{'='*60}\n")
-    
-    # TODO: Replace with actual email sending
-    # from flask_mail import Message
-    # msg = Message(
-    #     subject='Reset your password',
-    #     recipients=[user.email],
-    #     html=f'<a href="{reset_url}">Click here to reset your password</a>'
-    # )
-    # mail.send(msg)
+    enqueue(
+        'email.send',
+        to=user.email,
+        subject='Reset your password',
+        body=f"Click here to reset your password: {reset_url}\nThis link expires in 1 hour.",
+        html=f'<a href="{reset_url}">Click here to reset your password</a>'
+    )
     
     return True
 
@@ -0,0 +1,100 @@
+"""
+Domain event bus: model writes become typed events (post.created, follow.changed, ...)
+that are dispatched to subscribers only after the transaction commits.
+
+Subscribers (cache invalidation, counters, Socket.IO pushers) register with
+@subscribe('story.created', 'story.deleted') and receive (name, payload).
+ORM inserts/updates/deletes of the models below are captured by mapper events;
+code that writes with Core statements (bulk INSERT/DELETE) calls queue_model_event().
+"""
+import logging
+from collections import defaultdict
+from sqlalchemy import event
+from sqlalchemy.orm import object_session
+
+from app.extension import db
+from app.models.blocked_users import BlockedUser
+from app.models.comments import Comment
+from app.models.follows import Follow
+from app.models.likes import Like
+from app.models.notifications import Notification
+from app.models.posts import Post
+from app.models.stories import Story
+
+logger = logging.getLogger(__name__)
+
+# session.info key holding events of the open transaction
+PENDING_EVENTS_KEY = 'domain_events'
+
+_subscribers = defaultdict(list)
+
+def subscribe(*names):
+    """Decorator registering handler(name, payload) for event names ('*' = every event)"""
+    def decorator(handler):
+        for name in names:
+            _subscribers[name].append(handler)
+        return handler
+    return decorator
+
+def publish(name, **payload):
+    """Dispatch an event to its subscribers now (for writes made outside the ORM session)"""
+    for handler in _subscribers.get(name, []) + _subscribers.get('*', []):
+        try:
+            handler(name, payload)
+        except Exception:
+            logger.exception(f"Event handler {handler.__name__} failed for {name}")
+
+def queue_event(name, session=None, **payload):
+    """Publish an event once the current transaction commits (dropped on rollback)"""
+    session = session or db.session
+    session.info.setdefault(PENDING_EVENTS_KEY, []).append((name, payload))
+
+def queue_model_event(prefix, action, session=None, **payload):
+    """Queue <prefix>.<action> and <prefix>.changed, as ORM writes of tracked models do"""
+    queue_event(f"{prefix}.{action}", session=session, **payload)
+    queue_event(f"{prefix}.changed", session=session, action=action, **payload)
+
+# Model -> (event prefix, payload builder). Each ORM write queues <prefix>.created,
+# <prefix>.updated or <prefix>.deleted, plus <prefix>.changed with an 'action' key
+TRACKED_MODELS = {
+    Post: ('post', lambda post: {'post_id': post.id, 'user_id': post.user_id}),
+    Like: ('like', lambda like: {'post_id': like.post_id, 'user_id': like.user_id}),
+    Comment: ('comment', lambda comment: {
+        'comment_id': comment.id, 'post_id': comment.post_id, 'user_id': comment.user_id
+    }),
+    Follow: ('follow', lambda follow: {
+        'follower_id': follow.follower_id, 'followed_id': follow.followed_id, 'status': follow.status
+    }),
+    BlockedUser: ('block', lambda block: {'blocker_id': block.blocker_id, 'blocked_id': block.blocked_id}),
+    Story: ('story', lambda story: {
+        'story_id': story.id, 'user_id': story.user_id, 'is_highlight': bool(story.is_highlight)
+    }),
+    Notification: ('notification', lambda notif: {
+        'notification_id': notif.id, 'user_id': notif.user_id, 'type': notif.notification_type
+    }),
+}
+
+def _listen(model, prefix, build_payload):
+    def queue(target, action):
+        session = object_session(target)
+        if session is None:
+            return
+        queue_model_event(prefix, action, session=session, **build_payload(target))
+    
+    event.listen(model, 'after_insert', lambda mapper, connection, target: queue(target, 'created'))
+    event.listen(model, 'after_update', lambda mapper, connection, target: queue(target, 'updated'))
+    event.listen(model, 'after_delete', lambda mapper, connection, target: queue(target, 'deleted'))
+
+for _model, (_prefix, _build_payload) in TRACKED_MODELS.items():
+    _listen(_model, _prefix, _build_payload)
+
+@event.listens_for(db.session, 'after_commit')
+def _dispatch_events(session):
+    """Deliver the committed transaction's events to subscribers"""
+    events = session.info.pop(PENDING_EVENTS_KEY, None)
+    for name, payload in events or []:
+        publish(name, **payload)
+
+@event.listens_for(db.session, 'after_rollback')
+def _discard_events(session):
+    session.info.pop(PENDING_EVENTS_KEY, None)
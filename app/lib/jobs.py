@@ -0,0 +1,369 @@
+"""
+Background jobs: deferred side effects (emails, notifications) kept in the jobs table
+
+A route calls enqueue('email.send', to=...) inside its transaction and returns; the
+job exists only if the request commits. Workers claim due jobs with a single UPDATE,
+run the task registered under the job's name in a fresh app context and commit the
+task's writes together with the job's 'done' status. Delivery is at least once (a
+worker can die after a side effect outside the database), so tasks must be safe to repeat.
+
+- Retries: a failing job runs again after JOBS_BACKOFF_SECONDS * 2^(attempt - 1)
+  (at most JOBS_BACKOFF_MAX_SECONDS) until its max_attempts, then stays 'failed'.
+- Idempotency: enqueue(..., key=...) does nothing while a job with that key exists.
+- Concurrency: @task(..., concurrency=N) caps running jobs of that task across all
+  workers; `flask worker --concurrency N` runs N jobs at once.
+- Leases: a claimed job is locked for JOBS_LEASE_SECONDS; if its worker dies, the
+  job is claimed again once the lease expires.
+
+JOBS_MODE decides where jobs run:
+- "embedded" (default): a background loop in each web process (started by its first
+  request), woken on commit (and any `flask worker` processes)
+- "worker": only `flask worker` processes
+- "eager": synchronously once the enqueuing transaction commits (tests, scripts)
+"""
+import json
+import os
+import socket
+import threading
+import time
+import traceback
+from datetime import datetime, timedelta
+from flask import current_app
+from sqlalchemy import and_, delete, event, exc, func, or_, select, update
+from sqlalchemy.orm import aliased
+
+from app.extension import db, socketio
+from app.lib.buffers import insert_ignore
+from app.lib.scheduler import start_when_serving
+from app.middleware.metrics import JOB_SECONDS, JOBS_RUN
+from app.models.jobs import Job
+
+QUEUED, RUNNING, DONE, FAILED = 'queued', 'running', 'done', 'failed'
+MODES = ('embedded', 'worker', 'eager')
+MAX_ERROR_WAIT_SECONDS = 60  # Longest pause between polls while claiming keeps failing (e.g. no jobs table yet)
+
+# session.info keys holding ids of jobs enqueued in the open / just committed transaction
+PENDING_JOBS_KEY = 'jobs_enqueued'
+COMMITTED_JOBS_KEY = 'jobs_committed'
+
+class Task:
+    """A function registered as a job name"""
+    
+    def __init__(self, name, func, max_attempts=None, concurrency=None):
+        self.name = name
+        self.func = func
+        self.max_attempts = max_attempts
+        self.concurrency = concurrency
+
+_tasks = {}
+
+def task(name, max_attempts=None, concurrency=None):
+    """Decorator registering func(**payload) as the job `name`.
+    max_attempts defaults to JOBS_MAX_ATTEMPTS; concurrency caps its running jobs across all workers.
+    """
+    def decorator(func):
+        _tasks[name] = Task(name, func, max_attempts=max_attempts, concurrency=concurrency)
+        return func
+    return decorator
+
+def enqueue(name, key=None, delay=0, **payload):
+    """Queue job `name` in the current transaction (does not commit); payload must be JSON-serialisable.
+    Returns False when a job with the idempotency key `key` already exists.
+    """
+    registered = _tasks.get(name)
+    if registered is None:
+        raise LookupError(f"No job registered as {name!r}")
+    now = datetime.utcnow()
+    job_id = db.session.execute(
+        insert_ignore(db.engine.dialect.name, Job).values(
+            name=name,
+            payload=json.dumps(payload),
+            status=QUEUED,
+            idempotency_key=key,
+            attempts=0,
+            max_attempts=registered.max_attempts or current_app.config.get('JOBS_MAX_ATTEMPTS', 5),
+            run_at=now + timedelta(seconds=delay),
+            created_at=now,
+        ).returning(Job.id)
+    ).scalar()
+    if job_id is None:
+        return False
+    db.session.info.setdefault(PENDING_JOBS_KEY, []).append(job_id)
+    return True
+
+def backoff_seconds(attempts, config):
+    """Delay before retrying a job that failed its `attempts`-th run"""
+    delay = config.get('JOBS_BACKOFF_SECONDS', 10) * 2 ** max(attempts - 1, 0)
+    return min(delay, config.get('JOBS_BACKOFF_MAX_SECONDS', 3600))
+
+def _due(job, now):
+    # Queued and due, or running under an expired lease (its worker died)
+    return or_(
+        and_(job.status == QUEUED, job.run_at <= now),
+        and_(job.status == RUNNING, job.locked_until < now),
+    )
+
+def _missing_jobs_table(error):
+    """True for "no such table: jobs" (SQLite) and 'relation "jobs" does not exist' (PostgreSQL)"""
+    message = str(getattr(error, 'orig', error)).lower()
+    return (isinstance(error, exc.DBAPIError) and Job.__tablename__ in message
+            and ('no such table' in message or 'does not exist' in message))
+
+def _running_count(name, now):
+    running = aliased(Job)
+    return select(func.count(running.id)).where(
+        running.name == name, running.status == RUNNING, running.locked_until >= now
+    ).scalar_subquery()
+
+class Worker:
+    """Claims due jobs and runs them on up to `concurrency` threads"""
+    
+    def __init__(self, app, concurrency=1, names=None):
+        self.app = app
+        self.concurrency = concurrency
+        self.names = set(names or ())
+        self.pid = os.getpid()
+        self.id = f"{socket.gethostname()}:{self.pid}:{id(self):x}"
+        self.lease_seconds = app.config.get('JOBS_LEASE_SECONDS', 300)
+        self.poll_interval = app.config.get('JOBS_POLL_INTERVAL', 1.0)
+        self._wake = threading.Event()
+        self._stopping = False
+        self._table_missing = False
+    
+    def claim(self, job_ids=None):
+        """Lease the next due job (optionally among job_ids); returns its row or None"""
+        now = datetime.utcnow()
+        candidate = aliased(Job)
+        query = select(candidate.id).where(_due(candidate, now))
+        if job_ids is not None:
+            query = query.where(candidate.id.in_(job_ids))
+        if self.names:
+            query = query.where(candidate.name.in_(self.names))
+        limited = {name: entry.concurrency for name, entry in _tasks.items() if entry.concurrency}
+        for name, limit in limited.items():
+            query = query.where(or_(candidate.name != name, _running_count(name, now) < limit))
+        # SKIP LOCKED lets PostgreSQL workers pass over each other's candidates (ignored by SQLite)
+        query = query.order_by(candidate.run_at, candidate.id).limit(1).with_for_update(skip_locked=True)
+        
+        with db.engine.begin() as conn:
+            job = conn.execute(
+                update(Job)
+                .where(Job.id == query.scalar_subquery(), _due(Job, now))
+                .values(status=RUNNING, attempts=Job.attempts + 1, locked_by=self.id,
+                        locked_until=now + timedelta(seconds=self.lease_seconds))
+                .returning(Job.id, Job.name, Job.payload, Job.attempts, Job.max_attempts)
+            ).first()
+        if job is None or job.name not in limited:
+            return job
+        
+        # Two PostgreSQL workers can claim the last free slot at once; the loser hands its job back
+        with db.engine.begin() as conn:
+            if conn.execute(select(_running_count(job.name, now))).scalar() <= limited[job.name]:
+                return job
+            conn.execute(
+                update(Job).where(Job.id == job.id, Job.locked_by == self.id)
+                .values(status=QUEUED, attempts=Job.attempts - 1, locked_by=None, locked_until=None)
+            )
+        return None
+    
+    def run(self, job):
+        """Run a claimed job; returns its outcome: 'done', 'retry', 'failed' or 'lost' (lease expired)"""
+        started = time.perf_counter()
+        with self.app.app_context():
+            try:
+                registered = _tasks.get(job.name)
+                if registered is None:
+                    raise LookupError(f"No job registered as {job.name!r}")
+                registered.func(**json.loads(job.payload))
+                # The task's writes and the job's completion commit together
+                finished = db.session.execute(
+                    update(Job).where(Job.id == job.id, Job.locked_by == self.id)
+                    .values(status=DONE, finished_at=datetime.utcnow(), locked_until=None, last_error=None)
+                )
+                if finished.rowcount:
+                    db.session.commit()
+                    outcome = DONE
+                else:
+                    db.session.rollback()
+                    self.app.logger.warning(f"Job {job.id} ({job.name}) outlived its lease; discarded its writes")
+                    outcome = 'lost'
+            except Exception:
+                db.session.rollback()
+                outcome = self._fail(job, traceback.format_exc())
+            finally:
+                db.session.remove()
+        
+        JOBS_RUN.inc(job=job.name, outcome=outcome)
+        JOB_SECONDS.observe(time.perf_counter() - started, job=job.name)
+        return outcome
+    
+    def _fail(self, job, error):
+        now = datetime.utcnow()
+        if job.attempts >= job.max_attempts:
+            outcome, values, next_step = FAILED, {'status': FAILED, 'finished_at': now}, 'giving up'
+        else:
+            delay = backoff_seconds(job.attempts, self.app.config)
+            outcome, values = 'retry', {'status': QUEUED, 'run_at': now + timedelta(seconds=delay)}
+            next_step = f'retrying in {delay}s'
+        with db.engine.begin() as conn:
+            conn.execute(
+                update(Job).where(Job.id == job.id, Job.locked_by == self.id)
+                .values(locked_until=None, last_error=error[-4000:], **values)
+            )
+        self.app.logger.warning(
+            f"Job {job.id} ({job.name}) failed attempt {job.attempts}/{job.max_attempts}, {next_step}: "
+            f"{error.strip().splitlines()[-1]}"
+        )
+        return outcome
+    
+    def work_once(self, job_ids=None):
+        """Claim and run one due job; returns its outcome, or None when none is due"""
+        with self.app.app_context():
+            job = self.claim(job_ids)
+        return self.run(job) if job is not None else None
+    
+    def wake(self):
+        self._wake.set()
+    
+    def stop(self):
+        """Let the running jobs finish, then return from work()"""
+        self._stopping = True
+        self._wake.set()
+    
+    def _loop(self, burst):
+        wait = self.poll_interval
+        while not self._stopping:
+            try:
+                outcome = self.work_once()
+            except Exception as e:
+                outcome = None
+                if _missing_jobs_table(e):
+                    if not self._table_missing:
+                        self._table_missing = True
+                        self.app.logger.warning(
+                            "Job worker paused: the jobs table does not exist "
+                            "(run `flask --app wsgi init-db` or `flask db upgrade`)"
+                        )
+                else:
+                    self.app.logger.exception("Job worker failed to claim a job")
+                # Back off while the database keeps failing (a commit that enqueues a job still wakes us)
+                wait = min(wait * 2, MAX_ERROR_WAIT_SECONDS)
+            else:
+                if self._table_missing:
+                    self._table_missing = False
+                    self.app.logger.warning("Job worker resumed: the jobs table exists now")
+                wait = self.poll_interval
+            if outcome is None:
+                if burst:
+                    return
+                self._wake.wait(wait)
+                self._wake.clear()
+    
+    def work(self, burst=False):
+        """Run jobs until stop() is called (with burst: until none is due)"""
+        threads = [threading.Thread(target=self._loop, args=(burst,), name=f'job-worker-{number}', daemon=True)
+                   for number in range(1, self.concurrency)]
+        for thread in threads:
+            thread.start()
+        self._loop(burst)
+        for thread in threads:
+            thread.join()
+
+class JobQueue:
+    """Per-app job settings and the embedded worker"""
+    
+    def __init__(self):
+        self.app = None
+        self.mode = 'embedded'
+        self.embedded = None
+        self._lock = threading.Lock()
+    
+    def init_app(self, app):
+        """Read JOBS_MODE; in embedded mode the worker starts with the app's first request"""
+        self.app = app
+        self.mode = (app.config.get('JOBS_MODE') or 'embedded').lower()
+        if self.mode not in MODES:
+            raise ValueError(f"JOBS_MODE must be one of {', '.join(MODES)}, not {self.mode!r}")
+        if self.mode == 'embedded':
+            start_when_serving(app, self._run_embedded, app)
+    
+    def _run_embedded(self, app):
+        # One embedded worker per process, however many apps were initialised
+        with self._lock:
+            if self.embedded is not None and self.embedded.pid == os.getpid():
+                return
+            self.embedded = worker = Worker(app)
+        worker.work()
+    
+    def committed(self, job_ids):
+        """Jobs were committed: wake the embedded worker or, in eager mode, run them now"""
+        if self.mode == 'eager' and self.app is not None:
+            worker = Worker(self.app)
+            while worker.work_once(job_ids) is not None:
+                pass
+        elif self.embedded is not None:
+            self.embedded.wake()
+    
+    def stop_embedded(self):
+        """Stop this process's embedded worker (e.g. in `flask worker`, which runs its own)"""
+        if self.embedded is not None:
+            self.embedded.stop()
+            self.embedded = None
+
+job_queue = JobQueue()
+
+def purge_jobs(retention_hours=None, failed_retention_days=None):
+    """Delete done jobs older than JOBS_RETENTION_HOURS and failed ones older than
+    JOBS_FAILED_RETENTION_DAYS; returns the number of rows deleted
+    """
+    config = current_app.config
+    if retention_hours is None:
+        retention_hours = config.get('JOBS_RETENTION_HOURS', 24)
+    if failed_retention_days is None:
+        failed_retention_days = config.get('JOBS_FAILED_RETENTION_DAYS', 7)
+    now = datetime.utcnow()
+    with db.engine.begin() as conn:
+        done = conn.execute(
+            delete(Job).where(Job.status == DONE, Job.finished_at < now - timedelta(hours=retention_hours))
+        ).rowcount
+        failed = conn.execute(
+            delete(Job).where(Job.status == FAILED, Job.finished_at < now - timedelta(days=failed_retention_days))
+        ).rowcount
+    return done + failed
+
+def retry_failed(job_ids=None):
+    """Queue failed jobs (all, or job_ids) again with a fresh attempt budget; returns how many"""
+    query = update(Job).where(Job.status == FAILED)
+    if job_ids:
+        query = query.where(Job.id.in_(job_ids))
+    with db.engine.begin() as conn:
+        return conn.execute(
+            query.values(status=QUEUED, attempts=0, run_at=datetime.utcnow(), finished_at=None, locked_by=None)
+        ).rowcount
+
+def job_stats():
+    """[(name, status, count, oldest run_at)] of the jobs table"""
+    with db.engine.connect() as conn:
+        return conn.execute(
+            select(Job.name, Job.status, func.count(Job.id), func.min(Job.run_at))
+            .group_by(Job.name, Job.status).order_by(Job.name, Job.status)
+        ).all()
+
+@event.listens_for(db.session, 'after_commit')
+def _mark_jobs_committed(session):
+    job_ids = session.info.pop(PENDING_JOBS_KEY, None)
+    if job_ids:
+        session.info.setdefault(COMMITTED_JOBS_KEY, []).extend(job_ids)
+
+@event.listens_for(db.session, 'after_transaction_end')
+def _start_committed_jobs(session, transaction):
+    """Hand committed jobs to the queue once the connection is back in the pool"""
+    if transaction.parent is not None:
+        return
+    job_ids = session.info.pop(COMMITTED_JOBS_KEY, None)
+    if job_ids:
+        job_queue.committed(job_ids)
+
+@event.listens_for(db.session, 'after_rollback')
+def _discard_enqueued_jobs(session):
+    session.info.pop(PENDING_JOBS_KEY, None)
@@ -0,0 +1,70 @@
+"""
+Idempotent like/unlike with write-behind like counters (posts.likes_count)
+"""
+from datetime import datetime
+from sqlalchemy import case, delete, update
+
+from app.extension import db
+from app.lib.buffers import WriteBehindBuffer, insert_ignore
+from app.lib.events import queue_model_event, subscribe
+from app.models.likes import Like
+from app.models.posts import Post
+
+class LikeCountBuffer(WriteBehindBuffer):
+    """Sums like/unlike deltas per post in memory and applies them as one
+    UPDATE posts SET likes_count = likes_count + delta per post on flush.
+    """
+    
+    def __init__(self):
+        super().__init__('like_counts', 'LIKE_COUNT')
+    
+    def merge(self, existing, value):
+        return existing + value
+    
+    def write(self, conn, items):
+        for post_id, delta in items.items():
+            if not delta:
+                continue
+            new_count = Post.likes_count + delta
+            conn.execute(
+                update(Post)
+                .where(Post.id == post_id)
+                .values(likes_count=case((new_count < 0, 0), else_=new_count))
+            )
+    
+    def current_count(self, post):
+        """post.likes_count plus deltas not flushed yet"""
+        return max((post.likes_count or 0) + self.pending_value(post.id, 0), 0)
+
+like_count_buffer = LikeCountBuffer()
+
+def like_post(user_id, post_id):
+    """Like a post with a single INSERT ... ON CONFLICT DO NOTHING.
+    Returns True if a like was created, False if it already existed (does not commit).
+    """
+    like_id = db.session.execute(
+        insert_ignore(db.engine.dialect.name, Like)
+        .values(user_id=user_id, post_id=post_id, created_at=datetime.utcnow())
+        .returning(Like.id)
+    ).scalar()
+    if like_id is None:
+        return False
+    queue_model_event('like', 'created', post_id=post_id, user_id=user_id)
+    return True
+
+def unlike_post(user_id, post_id):
+    """Remove a like with a single DELETE ... RETURNING.
+    Returns True if a like was removed, False if there was none (does not commit).
+    """
+    like_id = db.session.execute(
+        delete(Like).where(Like.user_id == user_id, Like.post_id == post_id).returning(Like.id)
+    ).scalar()
+    if like_id is None:
+        return False
+    queue_model_event('like', 'deleted', post_id=post_id, user_id=user_id)
+    return True
+
+@subscribe('like.created', 'like.deleted')
+def _buffer_like_delta(name, payload):
+    """Hand committed likes/unlikes to the counter buffer"""
+    like_count_buffer.add(payload['post_id'], 1 if name == 'like.created' else -1)
@@ -0,0 +1,273 @@
+"""
+Prometheus-style metrics without external dependencies: counters, gauges and
+histograms rendered in the text exposition format by GET /metrics.
+
+Multiple gunicorn workers: set METRICS_MULTIPROC_DIR (or PROMETHEUS_MULTIPROC_DIR)
+to a directory shared by the workers and emptied on deploy. Each worker writes a
+snapshot of its metrics there every METRICS_SYNC_INTERVAL seconds (and at exit);
+/metrics merges all snapshots, summing counters and histograms across every
+worker and gauges across live workers.
+"""
+import atexit
+import glob
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from functools import wraps
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+class Metric:
+    """Base metric: values keyed by a tuple of label values"""
+    type = None
+    
+    def __init__(self, name, documentation, labelnames=(), registry=None):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+        (REGISTRY if registry is None else registry).register(self)
+    
+    def _key(self, labels):
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"{self.name} expects labels {self.labelnames}, got {tuple(labels)}")
+        return tuple(str(labels[name]) for name in self.labelnames)
+    
+    def snapshot(self):
+        """{'type', 'help', 'labelnames', 'values': [[label values, value], ...]}"""
+        with self._lock:
+            values = [[list(key), value] for key, value in self._values.items()]
+        return {'type': self.type, 'help': self.documentation, 'labelnames': list(self.labelnames), 'values': values}
+
+class Counter(Metric):
+    type = 'counter'
+    
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+class Gauge(Metric):
+    type = 'gauge'
+    
+    def set(self, value, **labels):
+        with self._lock:
+            self._values[self._key(labels)] = value
+    
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+    
+    def dec(self, amount=1, **labels):
+        self.inc(-amount, **labels)
+
+class Histogram(Metric):
+    """Observations counted into cumulative buckets, with their sum and count"""
+    type = 'histogram'
+    
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS, registry=None):
+        self.buckets = tuple(sorted(buckets))
+        super().__init__(name, documentation, labelnames, registry)
+    
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            # [per-bucket counts..., +Inf count, sum]
+            state = self._values.setdefault(key, [0] * (len(self.buckets) + 1) + [0.0])
+            for index, bound in enumerate(self.buckets):
+                if value <= bound:
+                    state[index] += 1
+                    break
+            else:
+                state[len(self.buckets)] += 1
+            state[-1] += value
+    
+    @contextmanager
+    def time(self, **labels):
+        """Observe the duration of a with-block in seconds"""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, **labels)
+    
+    def timed(self, **labels):
+        """Decorator observing each call's duration"""
+        def decorator(func):
+            @wraps(func)
+            def wrapper(*args, **kwargs):
+                with self.time(**labels):
+                    return func(*args, **kwargs)
+            return wrapper
+        return decorator
+    
+    def snapshot(self):
+        data = super().snapshot()
+        data['buckets'] = list(self.buckets)
+        return data
+
+class CallbackMetric(Metric):
+    """Counter or gauge whose values are read from func() -> {label values tuple: value} at collection time"""
+    
+    def __init__(self, name, documentation, labelnames=(), type='gauge', func=None, registry=None):
+        self.type = type
+        self.func = func
+        super().__init__(name, documentation, labelnames, registry)
+    
+    def snapshot(self):
+        try:
+            values = self.func() if self.func else {}
+        except Exception:
+            values = {}
+        return {
+            'type': self.type, 'help': self.documentation, 'labelnames': list(self.labelnames),
+            'values': [[[str(v) for v in key], value] for key, value in values.items()]
+        }
+
+class Registry:
+    def __init__(self):
+        self._metrics = {}
+    
+    def register(self, metric):
+        if metric.name in self._metrics:
+            raise ValueError(f"Metric {metric.name} already registered")
+        self._metrics[metric.name] = metric
+    
+    def snapshot(self):
+        return {name: metric.snapshot() for name, metric in self._metrics.items()}
+
+REGISTRY = Registry()
+
+# Multiprocess snapshots
+
+def _snapshot_path(directory, pid):
+    return os.path.join(directory, f'metrics_{pid}.json')
+
+def write_snapshot(directory, registry=REGISTRY):
+    """Atomically write this worker's metrics to its snapshot file"""
+    path = _snapshot_path(directory, os.getpid())
+    tmp = f'{path}.tmp'
+    with open(tmp, 'w') as f:
+        json.dump({'pid': os.getpid(), 'metrics': registry.snapshot()}, f)
+    os.replace(tmp, path)
+
+def _is_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+def _merge(target, name, data, include_gauges):
+    if data['type'] == 'gauge' and not include_gauges:
+        return
+    merged = target.setdefault(name, {**data, 'values': {}})
+    for labels, value in data['values']:
+        key = tuple(labels)
+        if key not in merged['values']:
+            merged['values'][key] = list(value) if isinstance(value, list) else value
+        elif isinstance(value, list):
+            merged['values'][key] = [a + b for a, b in zip(merged['values'][key], value)]
+        else:
+            merged['values'][key] += value
+
+def collect(directory=None, registry=REGISTRY):
+    """Metrics of this worker, merged with the snapshots of the others when directory is set.
+    Returns {name: {type, help, labelnames, values: {label values: value}}}.
+    """
+    merged = {}
+    for name, data in registry.snapshot().items():
+        _merge(merged, name, data, include_gauges=True)
+    if not directory:
+        return merged
+    
+    own = _snapshot_path(directory, os.getpid())
+    for path in glob.glob(os.path.join(directory, 'metrics_*.json')):
+        if path == own:
+            continue
+        try:
+            with open(path) as f:
+                snapshot = json.load(f)
+        except (OSError, ValueError):
+            continue
+        # Counters of exited workers still count; their gauges do not
+        alive = _is_alive(snapshot['pid'])
+        for name, data in snapshot['metrics'].items():
+            _merge(merged, name, data, include_gauges=alive)
+    return merged
+
+# Text exposition format
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+def _labels(names, values, extra=None):
+    pairs = list(zip(names, values)) + ([extra] if extra else [])
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in pairs) + '}'
+
+def _number(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+def render(metrics):
+    """Render collected metrics in the Prometheus text exposition format (version 0.0.4)"""
+    lines = []
+    for name in sorted(metrics):
+        data = metrics[name]
+        names = data['labelnames']
+        lines.append(f"# HELP {name} {_escape(data['help'])}")
+        lines.append(f"# TYPE {name} {data['type']}")
+        for labels, value in sorted(data['values'].items()):
+            if data['type'] != 'histogram':
+                lines.append(f"{name}{_labels(names, labels)} {_number(value)}")
+                continue
+            cumulative = 0
+            for bound, count in zip(data['buckets'] + [float('inf')], value[:-1]):
+                cumulative += count
+                lines.append(f"{name}_bucket{_labels(names, labels, ('le', _number(float(bound))))} {cumulative}")
+            lines.append(f"{name}_sum{_labels(names, labels)} {_number(value[-1])}")
+            lines.append(f"{name}_count{_labels(names, labels)} {cumulative}")
+    return '\n'.join(lines) + '\n'
+
+def add_ratio(metrics, name, documentation, numerator, denominator_parts):
+    """Add a gauge numerator / sum(denominator_parts) computed from merged counters (per label set)"""
+    if numerator not in metrics:
+        return
+    values = {}
+    for labels, hits in metrics[numerator]['values'].items():
+        total = sum(metrics.get(part, {'values': {}})['values'].get(labels, 0) for part in denominator_parts)
+        values[labels] = hits / total if total else 0.0
+    metrics[name] = {
+        'type': 'gauge', 'help': documentation,
+        'labelnames': metrics[numerator]['labelnames'], 'values': values
+    }
+
+def start_sync(app, directory, interval):
+    """Write this worker's snapshot every `interval` seconds and at exit, from its first request on"""
+    from app.extension import socketio
+    from app.lib.scheduler import start_when_serving
+    
+    os.makedirs(directory, exist_ok=True)
+    
+    def sync():
+        try:
+            write_snapshot(directory)
+        except OSError:
+            app.logger.warning("Could not write metrics snapshot", exc_info=True)
+    
+    def run():
+        atexit.register(sync)
+        while True:
+            socketio.sleep(interval)
+            sync()
+    
+    start_when_serving(app, run)
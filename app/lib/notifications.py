@@ -0,0 +1,303 @@
+"""
+Notification creation with aggregation ("alice and 12 others liked your post"),
+cursor pagination and retention/compaction
+"""
+import base64
+import json
+from datetime import datetime, timedelta
+from flask import current_app
+from sqlalchemy import and_, case, delete, event, insert, literal, or_, select, update
+from sqlalchemy.orm import joinedload
+
+from app.extension import db, socketio
+from app.lib.buffers import insert_ignore
+from app.lib.events import queue_model_event
+from app.lib.jobs import enqueue, task
+from app.models.notifications import Notification, NotificationActor
+from app.models.notification_archive import NotificationArchive
+from app.models.users import User
+
+# session.info key holding user ids whose unread count changed in the open transaction
+PENDING_COUNT_PUSH_KEY = 'notification_count_push'
+COMMITTED_COUNT_PUSH_KEY = 'notification_count_push_committed'
+
+# Types that coalesce per (recipient, type, post); messages stay one row per event
+AGGREGATED_TYPES = {'like', 'comment', 'follow'}
+
+def notify(user_id, from_user_id, notification_type, post_id=None, comment_id=None,
+           conversation_id=None, message_id=None):
+    """Create a notification or fold the actor into a recent unread one for the same target.
+    Returns the notification, or None for self-notifications (does not commit).
+    """
+    if user_id == from_user_id:
+        return None
+    
+    max_recent = current_app.config.get('NOTIFICATION_RECENT_ACTORS', 3)
+    
+    if notification_type in AGGREGATED_TYPES:
+        return _aggregate(user_id, from_user_id, notification_type, post_id, comment_id, max_recent)
+    
+    notification = Notification(
+        user_id=user_id,
+        from_user_id=from_user_id,
+        notification_type=notification_type,
+        post_id=post_id,
+        comment_id=comment_id,
+        conversation_id=conversation_id,
+        message_id=message_id,
+        actor_count=1,
+        recent_actor_ids=json.dumps([from_user_id])
+    )
+    db.session.add(notification)
+    adjust_unread_count(user_id, 1)
+    return notification
+
+def aggregation_key(notification_type, post_id=None):
+    """Key shared by a recipient's notifications that fold into one aggregate"""
+    return f"{notification_type}:{post_id or ''}"
+
+def _aggregate(user_id, from_user_id, notification_type, post_id, comment_id, max_recent):
+    """Fold the actor into the recipient's open aggregate for the target, creating it if needed.
+    
+    A unique index allows one unread row per (user_id, aggregation_key), so two concurrent
+    first events cannot both create one: the loser's INSERT ... ON CONFLICT DO NOTHING
+    inserts nothing and it folds into the winner's row instead.
+    """
+    key = aggregation_key(notification_type, post_id)
+    window = current_app.config.get('NOTIFICATION_AGGREGATION_WINDOW', 24 * 3600)
+    for _ in range(3):
+        now = datetime.utcnow()
+        # An aggregate idle for longer than the window stays as it is; new actors start another
+        db.session.execute(
+            update(Notification)
+            .where(Notification.user_id == user_id, Notification.aggregation_key == key,
+                   Notification.read == False, Notification.activity_at < now - timedelta(seconds=window))
+            .values(aggregation_key=None)
+            .execution_options(synchronize_session=False)
+        )
+        notification_id = db.session.execute(
+            insert_ignore(db.engine.dialect.name, Notification).values(
+                user_id=user_id,
+                from_user_id=from_user_id,
+                notification_type=notification_type,
+                post_id=post_id,
+                comment_id=comment_id,
+                read=False,
+                actor_count=1,
+                recent_actor_ids=json.dumps([from_user_id]),
+                aggregation_key=key,
+                created_at=now,
+                updated_at=now
+            ).returning(Notification.id)
+        ).scalar()
+        if notification_id is not None:
+            db.session.execute(insert(NotificationActor).values(notification_id=notification_id, user_id=from_user_id))
+            queue_model_event('notification', 'created', notification_id=notification_id, user_id=user_id,
+                              type=notification_type)
+            adjust_unread_count(user_id, 1)
+            return db.session.get(Notification, notification_id)
+        
+        existing = Notification.query.filter_by(user_id=user_id, aggregation_key=key, read=False)\
+                               .with_for_update().populate_existing().first()
+        if existing is None:
+            # Read between the two statements: start over
+            continue
+        
+        # Re-likes, re-follows and retried jobs fold in an actor that is already counted
+        added = db.session.execute(
+            insert_ignore(db.engine.dialect.name, NotificationActor)
+            .values(notification_id=existing.id, user_id=from_user_id)
+            .returning(NotificationActor.user_id)
+        ).scalar()
+        existing.add_actor(from_user_id, max_recent=max_recent, comment_id=comment_id,
+                           counted=added is None)
+        return existing
+    raise RuntimeError(f"Could not create or find the {key} notification of user {user_id}")
+
+@task('notifications.notify')
+def _notify_job(**kwargs):
+    notify(**kwargs)
+
+def notify_later(user_id, from_user_id, notification_type, key=None, **targets):
+    """Queue notify(...) as a background job, so the request skips the aggregation query and
+    the recipient's counter update (does not commit). key: idempotency key, e.g. per comment.
+    """
+    if user_id == from_user_id:
+        return False
+    return enqueue('notifications.notify', key=key, user_id=user_id, from_user_id=from_user_id,
+                   notification_type=notification_type, **targets)
+
+def adjust_unread_count(user_id, delta):
+    """Atomically add delta (never below zero) to a user's unread counter (does not commit)"""
+    new_count = User.unread_notifications_count + delta
+    db.session.execute(
+        update(User)
+        .where(User.id == user_id)
+        .values(unread_notifications_count=case((new_count < 0, 0), else_=new_count))
+    )
+    _queue_count_push(user_id)
+
+def reset_unread_count(user_id, count=0):
+    """Set a user's unread counter, e.g. after mark-all-read (does not commit)"""
+    db.session.execute(
+        update(User)
+        .where(User.id == user_id)
+        .values(unread_notifications_count=count)
+    )
+    _queue_count_push(user_id)
+
+def recount_unread(user_id):
+    """Recompute a user's unread counter from the notifications table (does not commit)"""
+    count = Notification.query.filter_by(user_id=user_id, read=False).count()
+    reset_unread_count(user_id, count)
+    return count
+
+def _queue_count_push(user_id):
+    db.session.info.setdefault(PENDING_COUNT_PUSH_KEY, set()).add(user_id)
+
+@event.listens_for(db.session, 'after_commit')
+def _mark_unread_counts_committed(session):
+    user_ids = session.info.pop(PENDING_COUNT_PUSH_KEY, None)
+    if user_ids:
+        session.info.setdefault(COMMITTED_COUNT_PUSH_KEY, set()).update(user_ids)
+
+@event.listens_for(db.session, 'after_transaction_end')
+def _push_unread_counts(session, transaction):
+    """Push committed unread counts to each user's Socket.IO room"""
+    if transaction.parent is not None:
+        return
+    user_ids = session.info.pop(COMMITTED_COUNT_PUSH_KEY, None)
+    if not user_ids:
+        return
+    
+    # Runs after the transaction has returned its connection to the pool: reading from
+    # after_commit needed a second connection while the first was still checked out,
+    # which deadlocks once every pooled connection belongs to a committing request
+    with db.engine.connect() as conn:
+        rows = conn.execute(
+            select(User.id, User.unread_notifications_count).where(User.id.in_(user_ids))
+        ).all()
+    
+    for user_id, count in rows:
+        socketio.emit('notification.count', {'count': count or 0}, room=f"user_{user_id}")
+
+@event.listens_for(db.session, 'after_rollback')
+def _discard_unread_count_push(session):
+    session.info.pop(PENDING_COUNT_PUSH_KEY, None)
+
+def load_recent_actors(notifications):
+    """Load the recent actors of a page of notifications in one query.
+    Returns {notification_id: [User, ...]} in newest-first order.
+    """
+    actor_ids = set()
+    for notif in notifications:
+        actor_ids.update(notif.get_recent_actor_ids())
+    
+    users_by_id = {}
+    if actor_ids:
+        users_by_id = {u.id: u for u in User.query.filter(User.id.in_(actor_ids)).all()}
+    
+    return {
+        notif.id: [users_by_id[uid] for uid in notif.get_recent_actor_ids() if uid in users_by_id]
+        for notif in notifications
+    }
+
+def encode_cursor(notification):
+    """Opaque cursor pointing just past a notification in newest-first order"""
+    raw = f"{notification.activity_at.isoformat()}|{notification.id}"
+    return base64.urlsafe_b64encode(raw.encode()).decode()
+
+def decode_cursor(cursor):
+    """Decode a cursor into (activity_at, id); raises ValueError if malformed"""
+    try:
+        raw = base64.urlsafe_b64decode(cursor.encode()).decode()
+        timestamp, notification_id = raw.split('|')
+        return datetime.fromisoformat(timestamp), int(notification_id)
+    except Exception:
+        raise ValueError("Invalid cursor")
+
+def get_notifications_page(user_id, cursor=None, limit=50, options=None):
+    """Get one newest-first page of a user's notifications.
+    Returns (notifications, next_cursor); next_cursor is None on the last page.
+    options replaces the default eager loads (actor, post, comment, conversation).
+    Raises ValueError for a malformed cursor.
+    """
+    if options is None:
+        options = [
+            joinedload(Notification.from_user),
+            joinedload(Notification.post),
+            joinedload(Notification.comment),
+            joinedload(Notification.conversation)
+        ]
+    query = Notification.query.filter_by(user_id=user_id).options(*options)
+    
+    if cursor:
+        activity_at, notification_id = decode_cursor(cursor)
+        query = query.filter(or_(
+            Notification.activity_at < activity_at,
+            and_(Notification.activity_at == activity_at, Notification.id < notification_id)
+        ))
+    
+    # Fetch one extra row to know whether another page exists
+    notifications = query.order_by(Notification.activity_at.desc(), Notification.id.desc())\
+                         .limit(limit + 1).all()
+    
+    next_cursor = None
+    if len(notifications) > limit:
+        notifications = notifications[:limit]
+        next_cursor = encode_cursor(notifications[-1])
+    
+    return notifications, next_cursor
+
+def compact_notifications(retention_days=None, batch_size=None, max_batches=None, archive=None):
+    """Archive (or delete) read notifications untouched for retention_days.
+    
+    Works in bounded batches, each in its own short transaction, so the
+    notifications table is never locked for long. Returns number of rows removed.
+    """
+    config = current_app.config
+    if retention_days is None:
+        retention_days = config.get('NOTIFICATION_RETENTION_DAYS', 90)
+    batch_size = batch_size or config.get('NOTIFICATION_COMPACT_BATCH_SIZE', 500)
+    if archive is None:
+        archive = config.get('NOTIFICATION_ARCHIVE', True)
+    cutoff = datetime.utcnow() - timedelta(days=retention_days)
+    
+    removed = 0
+    batches = 0
+    while max_batches is None or batches < max_batches:
+        ids = db.session.execute(
+            select(Notification.id)
+            .where(Notification.read == True, Notification.activity_at < cutoff)
+            .order_by(Notification.id)
+            .limit(batch_size)
+        ).scalars().all()
+        if not ids:
+            break
+        
+        try:
+            if archive:
+                db.session.execute(insert(NotificationArchive).from_select(
+                    ['id', 'user_id', 'from_user_id', 'notification_type', 'post_id',
+                     'actor_count', 'created_at', 'updated_at', 'archived_at'],
+                    select(
+                        Notification.id, Notification.user_id, Notification.from_user_id,
+                        Notification.notification_type, Notification.post_id,
+                        Notification.actor_count, Notification.created_at, Notification.updated_at,
+                        literal(datetime.utcnow())
+                    ).where(Notification.id.in_(ids))
+                ))
+            db.session.execute(delete(NotificationActor).where(NotificationActor.notification_id.in_(ids)))
+            db.session.execute(delete(Notification).where(Notification.id.in_(ids)))
+            db.session.commit()
+        except Exception:
+            # Usually another worker compacting the same rows; stop this run and
+            # leave what is left to the next one rather than retrying in a loop
+            db.session.rollback()
+            current_app.logger.warning("Notification compaction batch failed", exc_info=True)
+            break
+        
+        removed += len(ids)
+        batches += 1
+    
+    return removed
@@ -0,0 +1,219 @@
+"""
+Read-replica routing (DB_REPLICA_URIS)
+
+Replicas are extra SQLALCHEMY_BINDS entries named replica_<n> (any bind whose key
+starts with "replica" counts). A GET/HEAD/OPTIONS request picks one healthy replica,
+round-robin, and RoutingSession sends its SELECTs there. The first statement that may
+write (a flush, INSERT/UPDATE/DELETE, SELECT ... FOR UPDATE, raw SQL) moves the rest
+of the request to the primary.
+
+Read-your-writes: after a write request, the user's reads use the primary until
+DB_REPLICA_STICKY_SECONDS have passed. The deadline is a cache entry keyed on the user
+id (JWT bearer token or login session), so API clients without a cookie get it too;
+anonymous clients keep it in their signed session.
+
+Health: a replica whose connection fails is skipped for DB_REPLICA_RETRY_SECONDS, and
+every DB_REPLICA_CHECK_INTERVAL seconds each replica is pinged (PostgreSQL replicas
+further behind than DB_REPLICA_MAX_LAG_SECONDS are skipped too). With no healthy
+replica, reads go to the primary.
+"""
+import contextlib
+import functools
+import itertools
+import threading
+import time
+from flask import g, has_app_context, request, session
+from flask_sqlalchemy.session import Session
+from sqlalchemy import event, exc, text
+
+from app.lib.auth import verify_token
+
+REPLICA_BIND_PREFIX = 'replica'
+STICKY_SESSION_KEY = '_db_primary_until'
+STICKY_CACHE_KEY = 'sticky:{user_id}'
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+
+# Seconds a PostgreSQL standby is behind (0 when it has replayed everything it received or is not a standby)
+POSTGRES_LAG_SQL = (
+    "SELECT CASE WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0 "
+    "ELSE COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0) END"
+)
+
+def replica_binds(config):
+    """SQLALCHEMY_BINDS entries for DB_REPLICA_URIS: {'replica_1': uri, ...}"""
+    return {f'{REPLICA_BIND_PREFIX}_{number}': uri for number, uri in enumerate(config.get('DB_REPLICA_URIS') or (), 1)}
+
+def _request_user_id():
+    """Authenticated user id of the request without a query: JWT bearer token, then login session"""
+    user_id = getattr(request, 'current_user_id', None)
+    if user_id is None:
+        scheme, _, token = request.headers.get('Authorization', '').partition(' ')
+        if scheme == 'Bearer' and token:
+            payload = verify_token(token)
+            user_id = payload.get('user_id') if payload else None
+    if user_id is None:
+        user_id = session.get('_user_id')
+    return user_id
+
+def _is_read(clause):
+    return getattr(clause, 'is_select', False) and getattr(clause, '_for_update_arg', None) is None
+
+class RoutingSession(Session):
+    """db.session that reads from the request's replica (g.db_replica) until the request writes"""
+    
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if bind is None and has_app_context():
+            key = g.get('db_replica')
+            if key is not None:
+                if not self._flushing and _is_read(clause):
+                    return self._db.engines[key]
+                # Possibly a write: this request and the client's next reads stay on the primary
+                g.db_replica = None
+                g.db_wrote = True
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+def use_primary(f):
+    """Run a view's reads on the primary (for GET endpoints that must never be stale)"""
+    @functools.wraps(f)
+    def decorated(*args, **kwargs):
+        g.db_replica = None
+        return f(*args, **kwargs)
+    return decorated
+
+@contextlib.contextmanager
+def primary_reads():
+    """Run the block's reads on the primary, then go back to the request's replica unless
+    the block wrote (for results that outlive the request, e.g. cached data)
+    """
+    key = g.get('db_replica') if has_app_context() else None
+    if key is None:
+        yield
+        return
+    g.db_replica = None
+    try:
+        yield
+    finally:
+        if not g.get('db_wrote'):
+            g.db_replica = key
+
+class ReplicaSet:
+    """Round-robin choice among the replica binds that are currently healthy"""
+    
+    def __init__(self):
+        self.app = None
+        self.keys = []
+        self.engines = {}
+        self._down_until = {}
+        self._lag = {}
+        self._counter = itertools.count()
+        self._lock = threading.Lock()
+    
+    def init_app(self, app):
+        """Route safe requests to the replica binds, if any are configured"""
+        self.app = app
+        db = app.extensions['sqlalchemy']
+        with app.app_context():
+            engines = db.engines
+        self.keys = sorted(key for key in engines if key and key.startswith(REPLICA_BIND_PREFIX))
+        if not self.keys:
+            return
+        self.engines = {key: engines[key] for key in self.keys}
+        self.retry_seconds = app.config.get('DB_REPLICA_RETRY_SECONDS', 30)
+        self.max_lag = app.config.get('DB_REPLICA_MAX_LAG_SECONDS', 10)
+        sticky_seconds = app.config.get('DB_REPLICA_STICKY_SECONDS', 5)
+        from app.extension import cache
+        
+        def primary_until():
+            user_id = _request_user_id()
+            if user_id is None:
+                return session.get(STICKY_SESSION_KEY, 0)
+            return cache.get(STICKY_CACHE_KEY.format(user_id=user_id)) or 0
+        
+        for key, engine in self.engines.items():
+            event.listen(engine, 'handle_error', functools.partial(self._on_error, key))
+        
+        @app.before_request
+        def _choose_replica():
+            if request.method in SAFE_METHODS and primary_until() <= time.time():
+                g.db_replica = self.choose()
+        
+        @app.after_request
+        def _stick_to_primary(response):
+            if (request.method not in SAFE_METHODS or g.pop('db_wrote', False)) and sticky_seconds > 0:
+                deadline = round(time.time() + sticky_seconds, 3)
+                user_id = _request_user_id()
+                if user_id is None:
+                    session[STICKY_SESSION_KEY] = deadline
+                else:
+                    cache.set(STICKY_CACHE_KEY.format(user_id=user_id), deadline, timeout=sticky_seconds)
+            return response
+        
+        from app.lib.scheduler import start_periodic_task
+        start_periodic_task(app, 'db.replicas', app.config.get('DB_REPLICA_CHECK_INTERVAL'), self.check)
+    
+    def choose(self):
+        """Bind key of the next healthy replica, or None (use the primary)"""
+        if not self.keys:
+            return None
+        start = next(self._counter)
+        now = time.monotonic()
+        for offset in range(len(self.keys)):
+            key = self.keys[(start + offset) % len(self.keys)]
+            if self._down_until.get(key, 0) <= now:
+                return key
+        return None
+    
+    def mark_down(self, key, reason):
+        with self._lock:
+            was_up = self._down_until.get(key, 0) <= time.monotonic()
+            self._down_until[key] = time.monotonic() + self.retry_seconds
+        if was_up and self.app is not None:
+            self.app.logger.warning(f"Read replica {key} disabled for {self.retry_seconds}s: {reason}")
+    
+    def mark_up(self, key):
+        with self._lock:
+            was_down = self._down_until.pop(key, 0) > time.monotonic()
+        if was_down and self.app is not None:
+            self.app.logger.warning(f"Read replica {key} back in rotation")
+    
+    def _on_error(self, key, context):
+        # Connection and server failures (DatabaseError itself: e.g. a corrupt SQLite file), not bad queries
+        error = context.sqlalchemy_exception
+        if context.is_disconnect or isinstance(error, (exc.OperationalError, exc.InterfaceError)) or type(error) is exc.DatabaseError:
+            self.mark_down(key, context.original_exception)
+            # The failing request (and its error handler) continue on the primary
+            if has_app_context() and g.get('db_replica') == key:
+                g.db_replica = None
+    
+    def check(self):
+        """Ping every replica (and measure PostgreSQL replay lag); returns {key: status}"""
+        statuses = {}
+        for key, engine in self.engines.items():
+            try:
+                with engine.connect() as conn:
+                    conn.execute(text('SELECT 1'))
+                    lag = float(conn.execute(text(POSTGRES_LAG_SQL)).scalar() or 0) if engine.dialect.name == 'postgresql' else 0.0
+            except exc.DBAPIError as e:
+                self.mark_down(key, e.orig)
+                statuses[key] = 'down'
+                continue
+            self._lag[key] = lag
+            if self.max_lag and lag > self.max_lag:
+                self.mark_down(key, f"{lag:.1f}s behind the primary")
+                statuses[key] = f'lagging {lag:.1f}s'
+            else:
+                self.mark_up(key)
+                statuses[key] = 'ok'
+        return statuses
+    
+    def status(self):
+        """[{'key', 'url', 'healthy', 'lag_seconds'}] for each replica"""
+        now = time.monotonic()
+        return [{
+            'key': key,
+            'url': self.engines[key].url.render_as_string(hide_password=True),
+            'healthy': self._down_until.get(key, 0) <= now,
+            'lag_seconds': self._lag.get(key),
+        } for key in self.keys]
+
+replica_set = ReplicaSet()
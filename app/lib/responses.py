@@ -0,0 +1,113 @@
+"""
+Response layer: fast JSON encoding (orjson when installed), optional MessagePack
+via Accept, and gzip/brotli compression of large text responses
+"""
+import gzip
+from flask import request
+from flask.json.provider import DefaultJSONProvider
+
+try:
+    import orjson
+except ImportError:  # stdlib json fallback
+    orjson = None
+
+try:
+    import msgpack
+except ImportError:  # MessagePack representation disabled
+    msgpack = None
+
+try:
+    import brotli
+except ImportError:  # gzip only
+    brotli = None
+
+MSGPACK_MIMETYPE = 'application/msgpack'
+
+class FastJSONProvider(DefaultJSONProvider):
+    """JSON provider that encodes with orjson when available (same output shape as
+    the default provider) and answers jsonify() with MessagePack when the client
+    prefers application/msgpack in its Accept header.
+    """
+    
+    def dumps(self, obj, **kwargs):
+        if orjson is None or kwargs:
+            return super().dumps(obj, **kwargs)
+        # Datetimes and dataclasses go through the provider's default() so they
+        # serialize exactly like the stdlib path (e.g. HTTP dates)
+        option = orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_PASSTHROUGH_DATACLASS | orjson.OPT_NON_STR_KEYS
+        if self.sort_keys:
+            option |= orjson.OPT_SORT_KEYS
+        try:
+            return orjson.dumps(obj, default=self.default, option=option).decode()
+        except TypeError:
+            # e.g. integers beyond 64 bits
+            return super().dumps(obj)
+    
+    def loads(self, s, **kwargs):
+        if orjson is None or kwargs:
+            return super().loads(s, **kwargs)
+        return orjson.loads(s)
+    
+    def response(self, *args, **kwargs):
+        obj = self._prepare_response_obj(args, kwargs)
+        if msgpack is not None and wants_msgpack():
+            body = msgpack.packb(obj, default=self.default)
+            response = self._app.response_class(body, mimetype=MSGPACK_MIMETYPE)
+        elif orjson is not None and not (self.compact is False or (self.compact is None and self._app.debug)):
+            response = self._app.response_class(f"{self.dumps(obj)}\n", mimetype=self.mimetype)
+        else:
+            # Indented output (debug) or stdlib encoder
+            response = super().response(obj)
+        if msgpack is not None:
+            response.vary.add('Accept')
+        return response
+
+def wants_msgpack():
+    """True if the request's Accept header prefers MessagePack over JSON"""
+    best = request.accept_mimetypes.best_match(['application/json', MSGPACK_MIMETYPE, 'application/x-msgpack'])
+    return best in (MSGPACK_MIMETYPE, 'application/x-msgpack')
+
+def negotiate_encoding(accept_encodings):
+    """Best supported content coding for an Accept-Encoding header ('br', 'gzip' or None)"""
+    offered = ['br', 'gzip'] if brotli is not None else ['gzip']
+    return accept_encodings.best_match(offered)
+
+def compress(data, encoding, level):
+    if encoding == 'br':
+        return brotli.compress(data, quality=level)
+    return gzip.compress(data, compresslevel=level, mtime=0)
+
+def compress_response(response, config):
+    """Compress a buffered response in place if it is large enough and the client accepts it"""
+    if (response.direct_passthrough or response.is_streamed
+            or not 200 <= response.status_code < 300 or response.status_code == 204
+            or 'Content-Encoding' in response.headers
+            or response.mimetype not in config['COMPRESS_MIMETYPES']):
+        return response
+    
+    response.vary.add('Accept-Encoding')
+    data = response.get_data()
+    if len(data) < config['COMPRESS_MIN_SIZE']:
+        return response
+    encoding = negotiate_encoding(request.accept_encodings)
+    if encoding is None:
+        return response
+    
+    level = config['COMPRESS_BR_QUALITY'] if encoding == 'br' else config['COMPRESS_LEVEL']
+    response.set_data(compress(data, encoding, level))
+    response.headers['Content-Encoding'] = encoding
+    # The encoded body is no longer byte-identical to the uncompressed one
+    etag, weak = response.get_etag()
+    if etag and not weak:
+        response.set_etag(etag, weak=True)
+    return response
+
+def init_app(app):
+    """Install the fast JSON provider and response compression"""
+    app.json = FastJSONProvider(app)
+    
+    @app.after_request
+    def _compress(response):
+        if not app.config.get('COMPRESS_ENABLED', True):
+            return response
+        return compress_response(response, app.config)
@@ -0,0 +1,70 @@
+"""
+Lightweight in-process periodic tasks (runs on Socket.IO background tasks,
+so it works under both threading and eventlet workers)
+
+Background loops are only started by the process that serves requests, on its
+first request: `flask` commands other than `flask run`, benchmarks and extra
+create_app() calls never start them, and under `gunicorn --preload` every forked
+worker starts its own instead of inheriting threads that died in the fork.
+"""
+import os
+import threading
+
+import click
+
+from app.extension import db, socketio
+
+SERVING_TASKS_KEY = 'serving_tasks'
+
+def is_serving_process():
+    """False inside `flask` CLI commands other than `flask run` (db upgrade, init-db, data seed, worker)"""
+    if os.getenv('FLASK_RUN_FROM_CLI') != 'true':
+        return True
+    context = click.get_current_context(silent=True)
+    return context is not None and context.info_name == 'run'
+
+def start_when_serving(app, func, *args):
+    """Run func(*args) as a background task once the app serves its first request
+    in this process (again in each forked worker). Returns nothing; func must loop itself.
+    Does nothing when the app was created for a CLI command (see is_serving_process).
+    """
+    if not is_serving_process():
+        return
+    tasks = app.extensions.get(SERVING_TASKS_KEY)
+    if tasks is None:
+        tasks = app.extensions[SERVING_TASKS_KEY] = {'pending': [], 'pid': None, 'lock': threading.Lock()}
+        
+        @app.before_request
+        def _start_serving_tasks():
+            if tasks['pid'] == os.getpid():
+                return
+            with tasks['lock']:
+                if tasks['pid'] == os.getpid():
+                    return
+                tasks['pid'] = os.getpid()
+                for task, task_args in tasks['pending']:
+                    socketio.start_background_task(task, *task_args)
+    
+    tasks['pending'].append((func, args))
+
+def start_periodic_task(app, name, interval, func):
+    """Call func() inside an app context every `interval` seconds.
+    Disabled when interval is falsy. Each worker process runs its own loop
+    (see start_when_serving), so func must be idempotent and work in bounded batches.
+    """
+    if not interval:
+        return
+    
+    def loop():
+        while True:
+            socketio.sleep(interval)
+            with app.app_context():
+                try:
+                    result = func()
+                    app.logger.info(f"Periodic task {name} finished: {result}")
+                except Exception:
+                    app.logger.exception(f"Periodic task {name} failed")
+                finally:
+                    db.session.remove()
+    
+    start_when_serving(app, loop)
@@ -0,0 +1,466 @@
+"""
+Deterministic synthetic dataset for local load testing (`flask --app wsgi data seed`)
+
+Generates users with a power-law follow graph (a few accounts followed by many),
+posts with hashtags and mentions, likes, comments with nested replies, bookmarks,
+active stories with views, conversations with messages and reactions, and the
+aggregated notifications those events would have produced. The same seed, user
+count and `now` produce the same rows.
+
+Rows are written with bulk inserts in batches: executemany on SQLite, COPY on
+PostgreSQL (psycopg2 or psycopg 3). Ids are assigned here, above the current
+maximum of each table, so a dataset can be seeded next to existing data.
+"""
+import csv
+import io
+import json
+import random
+import time
+from bisect import bisect
+from datetime import datetime, timedelta
+from itertools import accumulate
+from sqlalchemy import bindparam, func, select, update
+from werkzeug.security import generate_password_hash
+
+from app.extension import db
+from app.lib.notifications import AGGREGATED_TYPES, aggregation_key
+from app.models.bookmarks import Bookmark
+from app.models.comments import Comment
+from app.models.conversations import Conversation, ConversationParticipant
+from app.models.follows import Follow
+from app.models.likes import Like
+from app.models.messages import Message, MessageReaction
+from app.models.notifications import Notification, NotificationActor
+from app.models.posts import Post
+from app.models.stories import Story
+from app.models.story_views import StoryView
+from app.models.users import User
+
+# Every seeded account logs in with this password
+SEED_PASSWORD = 'password123'
+
+WORDS = (
+    'sunset', 'coffee', 'morning', 'city', 'beach', 'weekend', 'friends', 'light', 'road', 'trip',
+    'dinner', 'mountains', 'rain', 'street', 'music', 'summer', 'garden', 'book', 'train', 'market',
+    'today', 'finally', 'love', 'this', 'view', 'with', 'the', 'best', 'new', 'little', 'after', 'long'
+)
+HASHTAGS = (
+    'travel', 'photography', 'food', 'nature', 'art', 'fitness', 'fashion', 'love', 'instagood', 'music',
+    'sunset', 'coffee', 'architecture', 'streetphotography', 'dog', 'cat', 'books', 'weekend', 'summer', 'design'
+)
+LOCATIONS = ('Lisbon', 'Berlin', 'Tokyo', 'New York', 'Nairobi', 'São Paulo', 'Seoul', 'Paris', 'Sydney', 'Toronto')
+EMOJIS = ('❤️', '😂', '🔥', '👍', '😮', '😢')
+PLACEHOLDER = 'data:image/jpeg;base64,' + 'A' * 120
+MESSAGE_LINES = (
+    'are we still on for tomorrow?', 'haha yes', 'send me the photos!', 'on my way', 'that place looks amazing',
+    'did you see this?', 'happy birthday 🎉', 'lol', 'miss you', 'call me later', 'sure, 8pm works', 'ok!'
+)
+
+class SyntheticDataset:
+    """Generator for one synthetic dataset; `run()` writes it and returns {table: rows}.
+    
+    Counts are means of heavy-tailed (Lomax) distributions: most users follow,
+    post and chat a little, a few a lot. Likes per post also scale with the
+    author's popularity.
+    """
+    
+    def __init__(self, users=1000, seed=0, now=None, prefix='synth', follows=30, posts=5, likes=10,
+                 comments=2, bookmarks=3, stories=0.3, story_views=10, conversations=2, messages=20,
+                 days=90, batch_size=5000, echo=None):
+        self.users = users
+        self.rng = random.Random(seed)
+        self.now = (now or datetime.utcnow()).replace(microsecond=0)
+        self.prefix = prefix
+        self.means = {
+            'follows': follows, 'posts': posts, 'likes': likes, 'comments': comments, 'bookmarks': bookmarks,
+            'story_views': story_views, 'conversations': conversations, 'messages': messages
+        }
+        self.story_share = stories
+        self.days = days
+        self.batch_size = batch_size
+        self.echo = echo or (lambda message: None)
+        self.counts = {}
+    
+    # Distributions
+    
+    def count(self, mean, cap):
+        """Heavy-tailed non-negative count with the given mean, at most cap"""
+        if mean <= 0 or cap <= 0:
+            return 0
+        value = mean * (self.rng.paretovariate(2) - 1) + self.rng.random()
+        return min(cap, int(value))
+    
+    def moment(self, after=None, before=None):
+        """Random datetime between after (default: `days` ago) and before (default: now)"""
+        after = after or self.now - timedelta(days=self.days)
+        before = before or self.now
+        span = max(0, int((before - after).total_seconds()))
+        return after + timedelta(seconds=self.rng.randint(0, span))
+    
+    def popular_user(self):
+        """Index of a user drawn with Zipf weights (rank 1 is ~N times as likely as rank N)"""
+        return bisect(self.popularity_cum, self.rng.random() * self.popularity_cum[-1])
+    
+    def sample_users(self, k, exclude=None):
+        """k distinct user indexes drawn uniformly, without `exclude`"""
+        picked = self.rng.sample(range(self.users), min(k + 1, self.users))
+        return [index for index in picked if index != exclude][:k]
+    
+    # Writing
+    
+    def open(self, conn):
+        self.conn = conn
+        self.copy = conn.dialect.name == 'postgresql'
+        self.buffers = {}
+        self.start = {}
+        for model in (User, Post, Comment, Follow, Like, Bookmark, Story, StoryView, Conversation,
+                      ConversationParticipant, Message, MessageReaction, Notification):
+            table = model.__table__
+            self.start[table.name] = (conn.execute(select(func.max(table.c.id))).scalar() or 0) + 1
+            self.counts[table.name] = 0
+        if conn.dialect.name == 'sqlite':
+            conn.exec_driver_sql('PRAGMA synchronous = OFF')
+    
+    def next_id(self, model):
+        name = model.__tablename__
+        value = self.start[name] + self.counts[name]
+        self.counts[name] += 1
+        return value
+    
+    def add(self, model, **row):
+        """Queue a row (with an id assigned unless given) and flush the table's batch when full"""
+        if 'id' not in row and 'id' in model.__table__.c:
+            row['id'] = self.next_id(model)
+        rows = self.buffers.setdefault(model.__table__, [])
+        rows.append(row)
+        if len(rows) >= self.batch_size:
+            self.flush(model.__table__)
+        return row.get('id')
+    
+    def flush(self, table=None):
+        for target in ([table] if table is not None else list(self.buffers)):
+            rows = self.buffers.pop(target, None)
+            if not rows:
+                continue
+            if self.copy:
+                self._copy(target, rows)
+            else:
+                self.conn.execute(target.insert(), rows)
+    
+    def _copy(self, table, rows):
+        """COPY rows into a PostgreSQL table through the raw DBAPI cursor"""
+        columns = list(rows[0])
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        for row in rows:
+            writer.writerow(['\\N' if row[column] is None else row[column] for column in columns])
+        sql = f"COPY {table.name} ({', '.join(columns)}) FROM STDIN WITH (FORMAT csv, NULL '\\N')"
+        cursor = self.conn.connection.dbapi_connection.cursor()
+        try:
+            if hasattr(cursor, 'copy_expert'):
+                buffer.seek(0)
+                cursor.copy_expert(sql, buffer)
+            else:
+                with cursor.copy(sql) as copy:
+                    copy.write(buffer.getvalue())
+        finally:
+            cursor.close()
+    
+    def stage(self, name, generate):
+        started = time.perf_counter()
+        generate()
+        self.flush()
+        self.echo(f"  {name:<14} {time.perf_counter() - started:6.1f}s")
+    
+    # Generation
+    
+    def run(self, conn):
+        self.open(conn)
+        self.stage('users', self.generate_users)
+        self.stage('follows', self.generate_follows)
+        self.stage('posts', self.generate_posts)
+        self.stage('comments', self.generate_comments)
+        self.stage('likes', self.generate_likes)
+        self.stage('bookmarks', self.generate_bookmarks)
+        self.stage('stories', self.generate_stories)
+        self.stage('messages', self.generate_conversations)
+        self.stage('notifications', self.generate_notifications)
+        self.finish()
+        return {name: count for name, count in self.counts.items() if count}
+    
+    def user_id(self, index):
+        return self.start['users'] + index
+    
+    def username(self, index):
+        return f'{self.prefix}{index}'
+    
+    def generate_users(self):
+        password = generate_password_hash(SEED_PASSWORD)
+        ranks = list(range(self.users))
+        self.rng.shuffle(ranks)
+        self.popularity = [1.0 / (rank + 1) for rank in ranks]
+        self.popularity_cum = list(accumulate(self.popularity))
+        self.mean_popularity = self.popularity_cum[-1] / self.users
+        self.private = set()
+        
+        for index in range(self.users):
+            username = self.username(index)
+            is_private = self.rng.random() < 0.05
+            if is_private:
+                self.private.add(index)
+            self.add(
+                User, username=username, email=f'{username}@example.com',
+                fullname=f'{self.rng.choice(WORDS).title()} {self.rng.choice(WORDS).title()}'[:32],
+                password=password, bio=' '.join(self.rng.choices(WORDS, k=self.rng.randint(0, 12))) or None,
+                profile_picture=f'{self.prefix}_profile_{index % 50}.jpg',
+                profile_picture_meta=json.dumps({'width': 320, 'height': 320, 'placeholder': PLACEHOLDER}),
+                created_at=self.moment(before=self.now - timedelta(days=1)),
+                email_verified=True, is_verified=self.popularity[index] > 0.01, is_private=is_private,
+                is_active=True, unread_notifications_count=0
+            )
+    
+    def generate_follows(self):
+        self.following = [[] for _ in range(self.users)]
+        self.followers = [[] for _ in range(self.users)]
+        for index in range(self.users):
+            wanted = self.count(self.means['follows'], self.users - 1)
+            targets = set()
+            for _ in range(wanted * 3):
+                if len(targets) >= wanted:
+                    break
+                target = self.popular_user()
+                if target != index:
+                    targets.add(target)
+            for target in sorted(targets):
+                pending = target in self.private and self.rng.random() < 0.3
+                followed_at = self.moment()
+                self.add(
+                    Follow, follower_id=self.user_id(index), followed_id=self.user_id(target),
+                    status='pending' if pending else 'accepted', created_at=followed_at
+                )
+                if not pending:
+                    self.following[index].append(target)
+                    self.followers[target].append((index, followed_at))
+    
+    def caption(self, author):
+        words = self.rng.choices(WORDS, k=self.rng.randint(3, 15))
+        words += ['#' + tag for tag in self.rng.choices(HASHTAGS, cum_weights=self.hashtag_cum, k=self.rng.randint(0, 3))]
+        mentioned = []
+        if self.following[author] and self.rng.random() < 0.2:
+            mentioned = self.rng.sample(self.following[author], min(2, len(self.following[author])))
+            words += ['@' + self.username(index) for index in mentioned]
+        return ' '.join(words), mentioned
+    
+    def generate_posts(self):
+        # (post id, author index, created_at) in id order
+        self.posts = []
+        self.mentions = []
+        self.hashtag_cum = list(accumulate(1.0 / (rank + 1) for rank in range(len(HASHTAGS))))
+        for index in range(self.users):
+            for _ in range(self.count(self.means['posts'], 500)):
+                created_at = self.moment(after=self.now - timedelta(days=self.days))
+                caption, mentioned = self.caption(index)
+                media = [
+                    {'url': f'{self.prefix}_post_{self.rng.randrange(200)}.jpg', 'type': 'image',
+                     'alt_text': '', 'width': 1080, 'height': self.rng.choice((1080, 1350, 566)), 'placeholder': PLACEHOLDER}
+                    for _ in range(self.rng.randint(2, 5) if self.rng.random() < 0.15 else 1)
+                ]
+                post_id = self.next_id(Post)
+                self.posts.append((post_id, index, created_at))
+                self.mentions.extend((target, index, post_id, created_at) for target in mentioned)
+                self.add(
+                    Post, id=post_id, user_id=self.user_id(index), media_urls=json.dumps(media),
+                    image_url=media[0]['url'], caption=caption,
+                    location=self.rng.choice(LOCATIONS) if self.rng.random() < 0.3 else None,
+                    created_at=created_at, likes_count=0
+                )
+    
+    def generate_comments(self):
+        # post id -> [(commenter index, comment id, created_at)]
+        self.comments = {}
+        for post_id, author, created_at in self.posts:
+            thread = []
+            for _ in range(self.count(self.means['comments'], 200)):
+                commenter = self.popular_user() if self.rng.random() < 0.5 else self.rng.randrange(self.users)
+                parent_id = None
+                after = created_at
+                if thread and self.rng.random() < 0.3:
+                    _, parent_id, after = self.rng.choice(thread)
+                comment_at = self.moment(after=after)
+                comment_id = self.add(
+                    Comment, user_id=self.user_id(commenter), post_id=post_id, parent_id=parent_id,
+                    content=' '.join(self.rng.choices(WORDS, k=self.rng.randint(1, 12))), created_at=comment_at
+                )
+                thread.append((commenter, comment_id, comment_at))
+            if thread:
+                self.comments[post_id] = thread
+    
+    def generate_likes(self):
+        # post id -> [(liker index, created_at)]
+        self.likes = {}
+        likes_counts = []
+        for post_id, author, created_at in self.posts:
+            mean = self.means['likes'] * self.popularity[author] / self.mean_popularity
+            likers = self.sample_users(self.count(mean, self.users - 1), exclude=author)
+            likes = sorted(((liker, self.moment(after=created_at)) for liker in likers), key=lambda like: like[1])
+            for liker, liked_at in likes:
+                self.add(Like, user_id=self.user_id(liker), post_id=post_id, created_at=liked_at)
+            if likes:
+                self.likes[post_id] = likes
+                likes_counts.append({'post': post_id, 'likes': len(likes)})
+        self.flush()
+        if likes_counts:
+            table = Post.__table__
+            self.conn.execute(
+                update(table).where(table.c.id == bindparam('post')).values(likes_count=bindparam('likes')),
+                likes_counts
+            )
+    
+    def generate_bookmarks(self):
+        if not self.posts:
+            return
+        for index in range(self.users):
+            picked = {self.rng.randrange(len(self.posts)) for _ in range(self.count(self.means['bookmarks'], 200))}
+            for position in sorted(picked):
+                post_id, _, created_at = self.posts[position]
+                self.add(Bookmark, user_id=self.user_id(index), post_id=post_id, created_at=self.moment(after=created_at))
+    
+    def generate_stories(self):
+        stories = []
+        for index in range(self.users):
+            if self.rng.random() >= self.story_share:
+                continue
+            for _ in range(self.rng.randint(1, 3)):
+                created_at = self.moment(after=self.now - timedelta(hours=23))
+                viewers = [follower for follower, _ in self.followers[index]]
+                seen = self.rng.sample(viewers, self.count(self.means['story_views'], len(viewers)))
+                story_id = self.add(
+                    Story, user_id=self.user_id(index), media_url=f'{self.prefix}_story_{self.rng.randrange(50)}.jpg',
+                    media_type='image', media_meta=json.dumps({'width': 1080, 'height': 1920, 'placeholder': PLACEHOLDER}),
+                    created_at=created_at, expires_at=created_at + timedelta(hours=24), is_highlight=False, views_count=len(seen)
+                )
+                stories.append((story_id, created_at, seen))
+        self.flush()
+        for story_id, created_at, seen in stories:
+            for viewer in seen:
+                self.add(StoryView, story_id=story_id, viewer_id=self.user_id(viewer), created_at=self.moment(after=created_at))
+    
+    def generate_conversations(self):
+        # Latest unread message per conversation: (recipient index, sender index, conversation id, message id, at)
+        self.unread_messages = []
+        pairs = set()
+        for index in range(self.users):
+            for _ in range(self.count(self.means['conversations'] / 2, 100)):
+                partners = self.following[index]
+                partner = self.rng.choice(partners) if partners else self.rng.randrange(self.users)
+                if partner != index:
+                    pairs.add((min(index, partner), max(index, partner)))
+        
+        # Message timelines are drawn first so each conversation row carries its last activity
+        conversations = []
+        for pair in sorted(pairs):
+            at = started_at = self.moment()
+            timeline = []
+            for _ in range(max(1, self.count(self.means['messages'], 2000))):
+                at = min(self.now, at + timedelta(seconds=self.rng.randint(5, 3 * 3600)))
+                timeline.append(at)
+            conversation_id = self.add(Conversation, created_at=started_at, updated_at=at)
+            for index in pair:
+                self.add(ConversationParticipant, conversation_id=conversation_id, user_id=self.user_id(index), created_at=started_at)
+            conversations.append((conversation_id, pair, timeline))
+        self.flush()
+        
+        reactions = []
+        for conversation_id, pair, timeline in conversations:
+            unread = self.rng.randint(1, 5) if self.rng.random() < 0.3 else 0
+            thread = []
+            total = len(timeline)
+            for position, at in enumerate(timeline):
+                sender = self.rng.choice(pair)
+                read = position < total - unread
+                message_id = self.add(
+                    Message, conversation_id=conversation_id, sender_id=self.user_id(sender),
+                    content=self.rng.choice(MESSAGE_LINES), message_type='text', media_url=None,
+                    reply_to_id=self.rng.choice(thread) if thread and self.rng.random() < 0.1 else None,
+                    read=read, read_at=at + timedelta(minutes=self.rng.randint(1, 120)) if read else None, created_at=at
+                )
+                thread.append(message_id)
+                if self.rng.random() < 0.1:
+                    other = pair[1] if sender == pair[0] else pair[0]
+                    reactions.append((message_id, other, self.rng.choice(EMOJIS), at))
+                if not read and position == total - 1:
+                    recipient = pair[1] if sender == pair[0] else pair[0]
+                    self.unread_messages.append((recipient, sender, conversation_id, message_id, at))
+        self.flush()
+        for message_id, user, emoji, at in reactions:
+            self.add(MessageReaction, message_id=message_id, user_id=self.user_id(user), emoji=emoji,
+                     created_at=at + timedelta(minutes=1))
+    
+    def notify(self, recipient, actors, notification_type, **targets):
+        """Aggregated notification for recipient from [(actor index, at)] in chronological order"""
+        actors = [(actor, at) for actor, at in actors if actor != recipient]
+        if not actors:
+            return
+        latest, updated_at = actors[-1]
+        recent = list(dict.fromkeys(self.user_id(actor) for actor, _ in reversed(actors)))[:3]
+        read = updated_at < self.now - timedelta(days=3)
+        notification_id = self.add(
+            Notification, user_id=self.user_id(recipient), from_user_id=self.user_id(latest),
+            notification_type=notification_type, post_id=targets.get('post_id'), comment_id=targets.get('comment_id'),
+            conversation_id=targets.get('conversation_id'), message_id=targets.get('message_id'),
+            read=read, created_at=actors[0][1], actor_count=len({actor for actor, _ in actors}),
+            recent_actor_ids=json.dumps(recent), updated_at=updated_at,
+            aggregation_key=aggregation_key(notification_type, targets.get('post_id'))
+            if notification_type in AGGREGATED_TYPES and not read else None
+        )
+        if notification_type in AGGREGATED_TYPES:
+            self.notification_actors.extend(
+                (notification_id, self.user_id(actor)) for actor in dict.fromkeys(actor for actor, _ in actors)
+            )
+    
+    def generate_notifications(self):
+        self.notification_actors = []
+        for post_id, author, _ in self.posts:
+            if post_id in self.likes:
+                self.notify(author, self.likes[post_id], 'like', post_id=post_id)
+            if post_id in self.comments:
+                thread = sorted(self.comments[post_id], key=lambda comment: comment[2])
+                self.notify(author, [(commenter, at) for commenter, _, at in thread], 'comment',
+                            post_id=post_id, comment_id=thread[-1][1])
+        for index in range(self.users):
+            if self.followers[index]:
+                self.notify(index, sorted(self.followers[index], key=lambda follow: follow[1]), 'follow')
+        for target, author, post_id, at in self.mentions:
+            self.notify(target, [(author, at)], 'mention', post_id=post_id)
+        for recipient, sender, conversation_id, message_id, at in self.unread_messages:
+            self.notify(recipient, [(sender, at)], 'message', conversation_id=conversation_id, message_id=message_id)
+        # Actor rows reference the notifications, so write them once those are flushed
+        self.flush()
+        for notification_id, user_id in self.notification_actors:
+            self.add(NotificationActor, notification_id=notification_id, user_id=user_id)
+    
+    def finish(self):
+        """Recompute the seeded users' unread counters and move PostgreSQL sequences past the new ids"""
+        users = User.__table__
+        notifications = Notification.__table__
+        unread = select(func.count()).where(
+            notifications.c.user_id == users.c.id, notifications.c.read.is_(False)
+        ).scalar_subquery()
+        self.conn.execute(
+            update(users).where(users.c.id >= self.start['users']).values(unread_notifications_count=unread)
+        )
+        if self.conn.dialect.name == 'postgresql':
+            for name, count in self.counts.items():
+                if count:
+                    self.conn.exec_driver_sql(
+                        f"SELECT setval(pg_get_serial_sequence('{name}', 'id'), (SELECT MAX(id) FROM {name}))"
+                    )
+
+def seed_dataset(**options):
+    """Generate and commit a synthetic dataset in one transaction. Returns {table: rows}."""
+    dataset = SyntheticDataset(**options)
+    with db.engine.begin() as conn:
+        if conn.dialect.name == 'postgresql':
+            # Bulk COPYs of a large dataset can outlast DB_STATEMENT_TIMEOUT_MS
+            conn.exec_driver_sql("SET LOCAL statement_timeout = 0")
+        return dataset.run(conn)
@@ -0,0 +1,297 @@
+"""
+Shared API serializers with declared fields and sparse fieldsets (?fields=id,media)
+
+Each field declares what it reads: loader options for the relationships it needs
+(apply serializer.options() to the query) or a batch loader that computes the value
+for a whole page in one query. Fields a client does not request are neither loaded
+nor computed.
+"""
+from collections import defaultdict
+from flask import request
+from sqlalchemy import func, select
+from sqlalchemy.orm import joinedload
+
+from app.extension import db
+from app.lib.likes import like_count_buffer
+from app.lib.notifications import load_recent_actors
+from app.models.bookmarks import Bookmark
+from app.models.comments import Comment
+from app.models.follows import Follow
+from app.models.likes import Like
+from app.models.messages import Message, MessageReaction
+from app.models.notifications import Notification
+from app.models.posts import Post
+from app.models.users import User
+
+class FieldError(ValueError):
+    """A sparse fieldset named a field the serializer does not declare"""
+
+class Field:
+    """A serialized value read from `attr` (default: the field name) or getter(obj, serializer).
+    
+    options: callable returning the loader options the value needs, e.g.
+    lambda: [joinedload(Post.user)] (called lazily: backrefs exist only once mappers are configured).
+    batch(objs, serializer) -> {obj.id: value}: computes the value for every object
+    at once; objects missing from the result get `default`.
+    """
+    
+    def __init__(self, attr=None, getter=None, options=None, batch=None, default=None):
+        self.attr = attr
+        self.getter = getter
+        self.options = options
+        self.batch = batch
+        self.default = default
+    
+    def load(self, objs, serializer):
+        """Values for objs computed in bulk, or None to read each object with get()"""
+        return self.batch(objs, serializer) if self.batch else None
+    
+    def get(self, name, obj, serializer):
+        if self.getter is not None:
+            return self.getter(obj, serializer)
+        return getattr(obj, self.attr or name)
+
+class Nested(Field):
+    """A related object rendered by another serializer with a fixed set of fields"""
+    
+    def __init__(self, serializer, attr, fields=None, options=None):
+        super().__init__(attr=attr, options=options)
+        self.serializer = serializer
+        self.fields = fields
+    
+    def load(self, objs, serializer):
+        related = {}
+        for obj in objs:
+            target = getattr(obj, self.attr)
+            if target is not None:
+                related[target.id] = target
+        nested = self.serializer(fields=self.fields, viewer=serializer.viewer)
+        dumped = dict(zip(related, nested.dump_many(related.values())))
+        return {
+            obj.id: dumped[getattr(obj, self.attr).id]
+            for obj in objs if getattr(obj, self.attr) is not None
+        }
+
+def isoformat(attr):
+    """Getter rendering a datetime attribute as ISO 8601 (None stays None)"""
+    def getter(obj, serializer):
+        value = getattr(obj, attr)
+        return value.isoformat() if value else None
+    return getter
+
+class Serializer:
+    """Base serializer: subclasses declare `fields` ({name: Field}) and optionally
+    `default_fields` (the shape returned when no fieldset is requested).
+    'id' is always included.
+    """
+    fields = {}
+    default_fields = None
+    
+    def __init__(self, fields=None, viewer=None):
+        names = list(fields if fields is not None else (self.default_fields or self.fields))
+        unknown = [name for name in names if name not in self.fields]
+        if unknown:
+            raise FieldError(f"Unknown field(s): {', '.join(unknown)}")
+        if 'id' in self.fields and 'id' not in names:
+            names.insert(0, 'id')
+        self.only = tuple(dict.fromkeys(names))
+        self.viewer = viewer
+    
+    @classmethod
+    def from_request(cls, viewer=None, fields=None):
+        """Serializer for the request's ?fields=a,b (else `fields`, else default_fields).
+        Raises FieldError for unknown names.
+        """
+        requested = request.args.get('fields')
+        if requested:
+            fields = [name.strip() for name in requested.split(',') if name.strip()]
+        return cls(fields=fields, viewer=viewer)
+    
+    @property
+    def viewer_id(self):
+        viewer = self.viewer
+        if viewer is None or not getattr(viewer, 'is_authenticated', True):
+            return None
+        return viewer.id
+    
+    def options(self):
+        """Loader options needed by the selected fields (pass to query.options())"""
+        return [
+            option for name in self.only if self.fields[name].options
+            for option in self.fields[name].options()
+        ]
+    
+    def dump(self, obj):
+        return self.dump_many([obj])[0]
+    
+    def dump_many(self, objs):
+        objs = list(objs)
+        loaded = {}
+        if objs:
+            for name in self.only:
+                values = self.fields[name].load(objs, self)
+                if values is not None:
+                    loaded[name] = values
+        
+        result = []
+        for obj in objs:
+            row = {}
+            for name in self.only:
+                field = self.fields[name]
+                if name in loaded:
+                    row[name] = loaded[name].get(obj.id, field.default)
+                else:
+                    row[name] = field.get(name, obj, self)
+            result.append(row)
+        return result
+
+def _ids_in(objs):
+    return [obj.id for obj in objs]
+
+# Users
+
+def _users_followed_by_viewer(users, serializer):
+    if serializer.viewer_id is None:
+        return {}
+    followed = db.session.scalars(
+        select(Follow.followed_id).where(
+            Follow.follower_id == serializer.viewer_id,
+            Follow.followed_id.in_(_ids_in(users)),
+            Follow.status == 'accepted'
+        )
+    )
+    return {user_id: True for user_id in followed}
+
+class UserSerializer(Serializer):
+    fields = {
+        'id': Field(),
+        'username': Field(),
+        'fullname': Field(),
+        'profile_picture': Field(),
+        'profile_picture_meta': Field(getter=lambda user, s: user.get_profile_picture_meta()),
+        'is_verified': Field(),
+        'is_following': Field(batch=_users_followed_by_viewer, default=False),
+        'is_own_profile': Field(getter=lambda user, s: s.viewer_id == user.id),
+    }
+    default_fields = ('id', 'username', 'profile_picture')
+
+# Posts
+
+def _comment_counts(posts, serializer):
+    return dict(db.session.execute(
+        select(Comment.post_id, func.count(Comment.id))
+        .where(Comment.post_id.in_(_ids_in(posts)))
+        .group_by(Comment.post_id)
+    ).all())
+
+def _viewer_rows(model):
+    """Batch loader: {post_id: True} for posts the viewer has a `model` row for (likes, bookmarks)"""
+    def batch(posts, serializer):
+        if serializer.viewer_id is None:
+            return {}
+        post_ids = db.session.scalars(
+            select(model.post_id).where(model.user_id == serializer.viewer_id, model.post_id.in_(_ids_in(posts)))
+        )
+        return {post_id: True for post_id in post_ids}
+    return batch
+
+class PostSerializer(Serializer):
+    fields = {
+        'id': Field(),
+        'user': Nested(
+            UserSerializer, 'user',
+            fields=('id', 'username', 'profile_picture', 'profile_picture_meta'),
+            options=lambda: [joinedload(Post.user)]
+        ),
+        'media': Field(getter=lambda post, s: post.get_media_list()),
+        'caption': Field(),
+        'location': Field(),
+        'created_at': Field(getter=isoformat('created_at')),
+        'like_count': Field(getter=lambda post, s: like_count_buffer.current_count(post)),
+        'comment_count': Field(batch=_comment_counts, default=0),
+        'is_liked': Field(batch=_viewer_rows(Like), default=False),
+        'is_bookmarked': Field(batch=_viewer_rows(Bookmark), default=False),
+        'hashtags': Field(getter=lambda post, s: post.extract_hashtags()),
+        'mentions': Field(getter=lambda post, s: post.extract_mentions()),
+    }
+
+# Feed/list shape (detail views add hashtags and mentions)
+POST_LIST_FIELDS = (
+    'id', 'user', 'media', 'caption', 'location', 'created_at',
+    'like_count', 'comment_count', 'is_liked', 'is_bookmarked'
+)
+
+# Messages
+
+def _message_reactions(messages, serializer):
+    reactions = defaultdict(list)
+    rows = db.session.execute(
+        select(MessageReaction, User.username)
+        .join(User, User.id == MessageReaction.user_id)
+        .where(MessageReaction.message_id.in_(_ids_in(messages)))
+        .order_by(MessageReaction.id)
+    )
+    for reaction, username in rows:
+        reactions[reaction.message_id].append({
+            'id': reaction.id,
+            'emoji': reaction.emoji,
+            'user_id': reaction.user_id,
+            'username': username
+        })
+    return {message.id: reactions.get(message.id, []) for message in messages}
+
+def _reply_preview(message, serializer):
+    reply = message.reply_to
+    if reply is None:
+        return None
+    return {
+        'id': reply.id,
+        'content': reply.content[:50] if reply.content else None,
+        'sender_username': reply.sender.username if reply.sender else None
+    }
+
+class MessageSerializer(Serializer):
+    fields = {
+        'id': Field(),
+        'conversation_id': Field(),
+        'sender_id': Field(),
+        'content': Field(),
+        'type': Field(attr='message_type'),
+        'media_url': Field(),
+        'reply_to_id': Field(),
+        'reply_to': Field(getter=_reply_preview, options=lambda: [joinedload(Message.reply_to).joinedload(Message.sender)]),
+        'reactions': Field(batch=_message_reactions, default=()),
+        'read': Field(),
+        'read_at': Field(getter=isoformat('read_at')),
+        'created_at': Field(getter=isoformat('created_at')),
+        'sender': Nested(UserSerializer, 'sender', options=lambda: [joinedload(Message.sender)]),
+    }
+    # Conversation thread shape
+    default_fields = (
+        'id', 'sender_id', 'content', 'type', 'media_url', 'reply_to', 'reactions',
+        'read', 'read_at', 'created_at', 'sender'
+    )
+
+# Notifications
+
+def _recent_actors(notifications, serializer):
+    actors = UserSerializer(viewer=serializer.viewer)
+    return {
+        notification_id: actors.dump_many(users)
+        for notification_id, users in load_recent_actors(notifications).items()
+    }
+
+class NotificationSerializer(Serializer):
+    fields = {
+        'id': Field(),
+        'type': Field(attr='notification_type'),
+        'from_user': Nested(UserSerializer, 'from_user', options=lambda: [joinedload(Notification.from_user)]),
+        'actor_count': Field(),
+        'recent_actors': Field(batch=_recent_actors, default=()),
+        'post_id': Field(),
+        'comment_id': Field(),
+        'conversation_id': Field(),
+        'read': Field(),
+        'created_at': Field(getter=isoformat('created_at')),
+        'updated_at': Field(getter=lambda notif, s: notif.activity_at.isoformat()),
+    }
@@ -0,0 +1,227 @@
+"""
+Story tray building/caching and maintenance (sweeping expired stories,
+their views and their media files)
+"""
+import os
+from collections import Counter
+from datetime import datetime
+from flask import current_app
+from sqlalchemy import delete, select, update
+from sqlalchemy.orm import joinedload
+
+from app.extension import db, cache
+from app.lib.buffers import WriteBehindBuffer, insert_ignore
+from app.lib.cache import get_or_compute
+from app.lib.events import publish, subscribe
+from app.models.follows import Follow
+from app.models.stories import Story
+from app.models.story_views import StoryView
+
+def tray_cache_key(viewer_id):
+    """Cache key of a viewer's story tray"""
+    return f"story_tray_{viewer_id}"
+
+def invalidate_story_tray(*user_ids):
+    """Drop cached trays of the given viewers (call after commit)"""
+    keys = [tray_cache_key(user_id) for user_id in set(user_ids) if user_id]
+    if keys:
+        cache.delete_many(*keys)
+
+def invalidate_story_tray_for_author(author_id):
+    """Drop cached trays of everyone who sees author_id's stories (followers and the author)"""
+    # Own connection: this runs from after-commit event handlers, where the session cannot emit SQL
+    with db.engine.connect() as conn:
+        follower_ids = conn.execute(
+            select(Follow.follower_id).where(Follow.followed_id == author_id, Follow.status == 'accepted')
+        ).scalars().all()
+    invalidate_story_tray(author_id, *follower_ids)
+
+@subscribe('story.created', 'story.deleted')
+def _on_story_changed(name, payload):
+    invalidate_story_tray_for_author(payload['user_id'])
+
+@subscribe('story.viewed')
+def _on_story_viewed(name, payload):
+    # Viewer's seen state and owner's view counts changed
+    invalidate_story_tray(payload['viewer_id'], payload['user_id'])
+
+@subscribe('follow.changed')
+def _on_follow_changed(name, payload):
+    invalidate_story_tray(payload['follower_id'])
+
+class StoryViewBuffer(WriteBehindBuffer):
+    """Buffers (story_id, viewer_id) views and writes them with INSERT ... ON CONFLICT DO NOTHING.
+    Only rows actually inserted bump stories.views_count, in the same transaction.
+    """
+    
+    def __init__(self):
+        super().__init__('story_views', 'STORY_VIEW')
+    
+    def record(self, story_id, viewer_id):
+        """Queue a view (deduped in memory and by the unique constraint on flush)"""
+        return self.add((story_id, viewer_id), datetime.utcnow())
+    
+    def pending_story_ids(self, viewer_id):
+        """Story ids viewed by viewer_id that are not flushed yet"""
+        return {story_id for story_id, pending_viewer_id in self.pending() if pending_viewer_id == viewer_id}
+    
+    def write(self, conn, items):
+        # Skip stories deleted (or swept) since the view was buffered
+        owners = dict(conn.execute(
+            select(Story.id, Story.user_id).where(Story.id.in_({story_id for story_id, _ in items}))
+        ).all())
+        rows = [
+            {'story_id': story_id, 'viewer_id': viewer_id, 'created_at': created_at}
+            for (story_id, viewer_id), created_at in items.items() if story_id in owners
+        ]
+        if not rows:
+            return []
+        
+        inserted = conn.execute(
+            insert_ignore(conn.dialect.name, StoryView).values(rows)
+            .returning(StoryView.story_id, StoryView.viewer_id)
+        ).all()
+        for story_id, count in Counter(story_id for story_id, _ in inserted).items():
+            conn.execute(
+                update(Story).where(Story.id == story_id).values(views_count=Story.views_count + count)
+            )
+        return [(story_id, viewer_id, owners[story_id]) for story_id, viewer_id in inserted]
+    
+    def after_write(self, result):
+        for story_id, viewer_id, owner_id in result:
+            publish('story.viewed', story_id=story_id, viewer_id=viewer_id, user_id=owner_id)
+
+story_view_buffer = StoryViewBuffer()
+
+def build_story_tray(viewer_id):
+    """Build the story tray: one ring per user with active stories, in a fixed number of queries.
+    
+    Rings are ordered: own ring first, then rings with unseen stories, then fully
+    seen rings, each by most recent story. Stories inside a ring play oldest first.
+    View counts (stories.views_count) are only included on the viewer's own stories.
+    """
+    following_ids = db.session.execute(
+        select(Follow.followed_id).where(Follow.follower_id == viewer_id, Follow.status == 'accepted')
+    ).scalars().all()
+    
+    stories = Story.query.filter(
+        Story.user_id.in_([viewer_id, *following_ids]),
+        Story.expires_at > datetime.utcnow()
+    ).options(
+        joinedload(Story.user)
+    ).order_by(Story.user_id, Story.created_at).all()
+    if not stories:
+        return []
+    
+    story_ids = [story.id for story in stories]
+    seen_ids = set(db.session.execute(
+        select(StoryView.story_id).where(StoryView.viewer_id == viewer_id, StoryView.story_id.in_(story_ids))
+    ).scalars().all())
+    seen_ids |= story_view_buffer.pending_story_ids(viewer_id)
+    
+    rings = {}
+    for story in stories:
+        ring = rings.get(story.user_id)
+        if ring is None:
+            ring = rings[story.user_id] = {
+                'user': {
+                    'id': story.user.id,
+                    'username': story.user.username,
+                    'profile_picture': story.user.profile_picture,
+                    'profile_picture_meta': story.user.get_profile_picture_meta()
+                },
+                'stories': [],
+                'has_unseen': False,
+                'latest_at': None
+            }
+        is_viewed = story.id in seen_ids or story.user_id == viewer_id
+        item = {
+            'id': story.id,
+            'media_url': story.media_url,
+            'media_type': story.media_type,
+            'media_meta': story.get_media_meta(),
+            'created_at': story.created_at.isoformat(),
+            'expires_at': story.expires_at.isoformat(),
+            'is_viewed': is_viewed
+        }
+        if story.user_id == viewer_id:
+            item['view_count'] = story.views_count or 0
+        ring['stories'].append(item)
+        ring['has_unseen'] = ring['has_unseen'] or not is_viewed
+        ring['latest_at'] = item['created_at']
+    
+    # Newest first, then (stable) own ring first and unseen before seen
+    tray = sorted(rings.values(), key=lambda ring: ring['latest_at'], reverse=True)
+    tray.sort(key=lambda ring: (ring['user']['id'] != viewer_id, not ring['has_unseen']))
+    return tray
+
+def get_story_tray(viewer_id):
+    """Get a viewer's story tray from cache (STORY_TRAY_CACHE_TIMEOUT) or build it.
+    Stories that expired since the tray was cached are dropped on read.
+    """
+    tray = get_or_compute(
+        tray_cache_key(viewer_id),
+        lambda: build_story_tray(viewer_id),
+        timeout=current_app.config.get('STORY_TRAY_CACHE_TIMEOUT', 60)
+    )
+    
+    now = datetime.utcnow().isoformat()
+    live = []
+    for ring in tray:
+        stories = [story for story in ring['stories'] if story['expires_at'] > now]
+        if stories:
+            live.append({**ring, 'stories': stories})
+    return live
+
+def remove_story_media(media_url):
+    """Delete a story's media file from uploads/stories (missing files are ignored)"""
+    if not media_url:
+        return
+    media_path = os.path.join(current_app.config['UPLOAD_FOLDER'], 'stories', media_url)
+    if os.path.isfile(media_path):
+        try:
+            os.remove(media_path)
+        except OSError:
+            current_app.logger.warning(f"Could not remove story media {media_path}", exc_info=True)
+
+def sweep_expired_stories(batch_size=None, max_batches=None):
+    """Delete expired stories that are not highlights, with their views and media files.
+    
+    Works in bounded batches, each in its own short transaction. Files are removed
+    only after the batch commits, so a rollback never leaves rows pointing at
+    missing media. Returns number of stories removed.
+    """
+    batch_size = batch_size or current_app.config.get('STORY_SWEEP_BATCH_SIZE', 200)
+    
+    removed = 0
+    batches = 0
+    while max_batches is None or batches < max_batches:
+        now = datetime.utcnow()
+        # Re-checked in the DELETEs so a story saved to highlights mid-sweep survives
+        expired = (Story.expires_at <= now) & (Story.is_highlight.isnot(True))
+        ids = db.session.execute(
+            select(Story.id).where(expired).order_by(Story.expires_at).limit(batch_size)
+        ).scalars().all()
+        if not ids:
+            break
+        
+        try:
+            db.session.execute(delete(StoryView).where(
+                StoryView.story_id.in_(select(Story.id).where(Story.id.in_(ids), expired))
+            ))
+            deleted = db.session.execute(
+                delete(Story).where(Story.id.in_(ids), expired).returning(Story.media_url)
+            ).scalars().all()
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            current_app.logger.warning("Story sweep batch failed", exc_info=True)
+            break
+        
+        for media_url in deleted:
+            remove_story_media(media_url)
+        
+        removed += len(deleted)
+        batches += 1
+    
+    return removed
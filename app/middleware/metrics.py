@@ -0,0 +1,109 @@
+"""
+Application metrics: HTTP latency per endpoint, DB queries per endpoint, cache
+counters, upload processing time and Socket.IO clients, rooms and emits
+"""
+import os
+import time
+from flask import g, request
+
+from app.extension import cache, socketio
+from app.lib.cache import cache_stats
+from app.lib.metrics import Counter, Histogram, CallbackMetric, start_sync
+from app.middleware.query_counter import QueryStats, current_query_stats
+
+HTTP_REQUESTS = Counter(
+    'http_requests_total', 'HTTP requests by endpoint, method and status', ('endpoint', 'method', 'status')
+)
+HTTP_LATENCY = Histogram(
+    'http_request_duration_seconds', 'HTTP request latency by endpoint', ('endpoint', 'method')
+)
+DB_QUERIES = Counter('db_queries_total', 'SQL statements executed by requests, by endpoint', ('endpoint',))
+DB_SECONDS = Counter('db_query_seconds_total', 'Time spent in SQL statements by requests, by endpoint', ('endpoint',))
+UPLOAD_SECONDS = Histogram(
+    'upload_processing_seconds', 'Time to validate, decode, resize and store an upload', ('kind',),
+    buckets=(0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+)
+SOCKETIO_EMITS = Counter('socketio_emits_total', 'Socket.IO events emitted by this app, by event', ('event',))
+JOBS_RUN = Counter('jobs_run_total', 'Background jobs run by this process, by job and outcome (done, retry, failed)', ('job', 'outcome'))
+JOB_SECONDS = Histogram(
+    'job_duration_seconds', 'Time to run a background job', ('job',),
+    buckets=(0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+)
+
+def _cache_tiers():
+    """{tier: stats} of the cache backend (TieredCache reports l1 and l2 separately)"""
+    stats = cache_stats(cache)
+    if not stats:
+        return {}
+    if 'l1' in stats:
+        return {tier: stats[tier] for tier in ('l1', 'l2') if stats.get(tier)}
+    return {'local': stats}
+
+def _cache_metric(name):
+    def values():
+        return {(tier,): stats[name] for tier, stats in _cache_tiers().items() if name in stats}
+    return values
+
+for _name in ('hits', 'misses', 'evictions', 'expirations'):
+    CallbackMetric(f'cache_{_name}_total', f'Cache {_name} by tier', ('tier',), type='counter', func=_cache_metric(_name))
+
+CallbackMetric('cache_entries', 'Entries held by the in-process cache', ('tier',), func=_cache_metric('entries'))
+
+def _socketio_rooms():
+    """(connected clients, rooms other than per-client rooms) on this worker"""
+    server = getattr(socketio, 'server', None)
+    rooms = getattr(getattr(server, 'manager', None), 'rooms', None) or {}
+    namespace = rooms.get('/', {})
+    clients = set(namespace.get(None, {}))
+    return len(clients), sum(1 for room in namespace if room is not None and room not in clients)
+
+CallbackMetric('socketio_connected_clients', 'Connected Socket.IO clients', func=lambda: {(): _socketio_rooms()[0]})
+CallbackMetric('socketio_rooms', 'Socket.IO rooms (excluding per-client rooms)', func=lambda: {(): _socketio_rooms()[1]})
+
+def metrics_dir(app):
+    return app.config.get('METRICS_MULTIPROC_DIR') or os.getenv('PROMETHEUS_MULTIPROC_DIR')
+
+def _instrument_emits():
+    """Count socketio.emit() calls (flask_socketio.emit() in handlers goes through it too)"""
+    emit = socketio.emit
+    if getattr(emit, 'counted', False):
+        return
+    
+    def counted_emit(event, *args, **kwargs):
+        SOCKETIO_EMITS.inc(event=event)
+        return emit(event, *args, **kwargs)
+    
+    counted_emit.counted = True
+    socketio.emit = counted_emit
+
+def init_app(app):
+    """Record request/DB metrics and start multiprocess snapshots when METRICS_ENABLED"""
+    if not app.config.get('METRICS_ENABLED'):
+        return
+    
+    @app.before_request
+    def _start_request_metrics():
+        g.metrics_started = time.perf_counter()
+        if current_query_stats() is None:
+            g.query_stats = QueryStats()
+    
+    # Registered after the query counter, so this runs before it pops the stats
+    @app.after_request
+    def _record_request_metrics(response):
+        started = g.pop('metrics_started', None)
+        if started is None:
+            return response
+        endpoint = request.url_rule.endpoint if request.url_rule else 'unmatched'
+        HTTP_LATENCY.observe(time.perf_counter() - started, endpoint=endpoint, method=request.method)
+        HTTP_REQUESTS.inc(endpoint=endpoint, method=request.method, status=response.status_code)
+        stats = current_query_stats()
+        if stats is not None and stats.count:
+            DB_QUERIES.inc(stats.count, endpoint=endpoint)
+            DB_SECONDS.inc(stats.duration, endpoint=endpoint)
+        return response
+    
+    _instrument_emits()
+    
+    directory = metrics_dir(app)
+    if directory:
+        start_sync(app, directory, app.config.get('METRICS_SYNC_INTERVAL', 5))
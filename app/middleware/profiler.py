@@ -0,0 +1,151 @@
+"""
+Opt-in request profiling (PROFILING_ENABLED)
+
+Requests slower than SLOW_REQUEST_THRESHOLD_MS are logged with their slowest SQL
+statements, statements slower than SLOW_QUERY_THRESHOLD_MS are logged on their own,
+and PROFILE_SAMPLE_RATE of all requests run under cProfile. Both are
+written to PROFILE_DIR as <name>.json (request, timings, slowest SQL) plus
+<name>.prof (pstats dump, for `python -m pstats` or snakeviz) when profiled; only
+the newest PROFILE_MAX_FILES captures are kept. GET /admin/profiles lists them.
+"""
+import cProfile
+import itertools
+import json
+import os
+import random
+import time
+from datetime import datetime
+from flask import g, request
+
+from app.middleware.query_counter import QueryStats, current_query_stats
+
+_sequence = itertools.count()
+
+def _route():
+    """URL rule of the current request (/reset-password/<token>), never the raw path, so tokens stay out of logs"""
+    return request.url_rule.rule if request.url_rule else '<unmatched>'
+
+def profile_dir(app):
+    return app.config.get('PROFILE_DIR') or os.path.join(app.instance_path, 'profiles')
+
+def list_captures(directory):
+    """Stored captures, newest first (the .json records)"""
+    try:
+        names = [name for name in os.listdir(directory) if name.endswith('.json')]
+    except FileNotFoundError:
+        return []
+    captures = []
+    for name in sorted(names, reverse=True):
+        try:
+            with open(os.path.join(directory, name)) as f:
+                captures.append(json.load(f))
+        except (OSError, ValueError):
+            continue
+    return captures
+
+def _rotate(directory, keep):
+    """Delete all but the newest `keep` captures (names start with a sortable timestamp)"""
+    stems = sorted({name.rsplit('.', 1)[0] for name in os.listdir(directory) if name.endswith(('.json', '.prof'))})
+    for stem in stems[:max(0, len(stems) - keep)]:
+        for extension in ('.json', '.prof'):
+            try:
+                os.remove(os.path.join(directory, stem + extension))
+            except FileNotFoundError:
+                pass
+
+def _write_capture(app, record, profile):
+    directory = profile_dir(app)
+    os.makedirs(directory, exist_ok=True)
+    name = f"{datetime.utcnow():%Y%m%dT%H%M%S%f}-{os.getpid()}-{next(_sequence)}"
+    record['name'] = name
+    if profile is not None:
+        profile.dump_stats(os.path.join(directory, f'{name}.prof'))
+        record['profile'] = f'{name}.prof'
+    tmp = os.path.join(directory, f'{name}.json.tmp')
+    with open(tmp, 'w') as f:
+        json.dump(record, f)
+    os.replace(tmp, os.path.join(directory, f'{name}.json'))
+    _rotate(directory, app.config.get('PROFILE_MAX_FILES', 200))
+
+def init_app(app):
+    """Log slow requests and capture sampled profiles when PROFILING_ENABLED is set"""
+    if not app.config.get('PROFILING_ENABLED'):
+        return
+    
+    threshold = app.config.get('SLOW_REQUEST_THRESHOLD_MS', 500)
+    query_threshold = app.config.get('SLOW_QUERY_THRESHOLD_MS', 100) / 1000
+    sample_rate = app.config.get('PROFILE_SAMPLE_RATE', 0.0)
+    
+    @app.before_request
+    def _start_profiling():
+        # Keep statement text and timings on the request's query stats (shared with the query counter)
+        stats = current_query_stats()
+        if stats is None:
+            stats = g.query_stats = QueryStats()
+        stats.statements = []
+        g.profiling_started = time.perf_counter()
+        
+        if sample_rate and random.random() < sample_rate:
+            profile = cProfile.Profile()
+            try:
+                profile.enable()
+            except ValueError:
+                # Another request is already being profiled (one profiler per process on 3.12+)
+                return
+            g.profile = profile
+    
+    # Registered after the query counter and metrics, so this runs before they pop the stats
+    @app.after_request
+    def _finish_profiling(response):
+        started = g.pop('profiling_started', None)
+        profile = g.pop('profile', None)
+        if profile is not None:
+            profile.disable()
+        if started is None:
+            return response
+        
+        stats = current_query_stats()
+        for statement, seconds in (stats.statements if stats else None) or ():
+            if seconds >= query_threshold:
+                app.logger.warning(
+                    f"Slow query in {request.method} {_route()}: {seconds * 1000:.0f}ms  {' '.join(statement.split())[:500]}"
+                )
+        
+        duration_ms = (time.perf_counter() - started) * 1000
+        slow = duration_ms >= threshold
+        if not slow and profile is None:
+            return response
+        
+        statements = stats.slowest(app.config.get('PROFILE_SLOW_STATEMENTS', 10)) if stats else []
+        if slow:
+            app.logger.warning(
+                f"Slow request {request.method} {_route()}: {duration_ms:.0f}ms, "
+                f"{stats.count if stats else 0} queries, {stats.duration * 1000 if stats else 0:.0f}ms DB"
+                + ''.join(f"\n  {seconds * 1000:7.1f}ms  {' '.join(statement.split())[:500]}" for statement, seconds in statements)
+            )
+        
+        record = {
+            'created_at': datetime.utcnow().isoformat(),
+            'method': request.method,
+            'path': _route(),
+            'endpoint': request.url_rule.endpoint if request.url_rule else None,
+            'status': response.status_code,
+            'duration_ms': round(duration_ms, 1),
+            'slow': slow,
+            'queries': stats.count if stats else 0,
+            'db_ms': round(stats.duration * 1000, 1) if stats else 0.0,
+            'statements': [{'sql': statement[:2000], 'ms': round(seconds * 1000, 2)} for statement, seconds in statements],
+            'profile': None,
+        }
+        try:
+            _write_capture(app, record, profile)
+        except OSError:
+            app.logger.warning("Could not store request profile", exc_info=True)
+        return response
+    
+    @app.teardown_request
+    def _stop_profiling(exc):
+        # after_request does not run when the view raised
+        profile = g.pop('profile', None)
+        if profile is not None:
+            profile.disable()
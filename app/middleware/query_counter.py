@@ -0,0 +1,103 @@
+"""
+Per-request SQL query counter and N+1 detector
+
+Counts the statements and database time of every request (SQLAlchemy cursor
+events), reports them in a Server-Timing header and the debug log, and flags
+statement shapes repeated QUERY_N_PLUS_ONE_THRESHOLD times or more - the
+signature of a lazy load inside a loop. With QUERY_BUDGET_RAISE (tests), a
+request running more than QUERY_BUDGET queries raises QueryBudgetExceeded.
+"""
+import re
+import time
+from collections import Counter
+from flask import g, has_app_context, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+# Expanded IN lists ("IN (?, ?, ?)") vary with the number of ids but are the same query
+_IN_LIST = re.compile(r'\((?:\s*(?:\?|%s|:\w+|\$\d+)\s*,)+\s*(?:\?|%s|:\w+|\$\d+)\s*\)')
+_WHITESPACE = re.compile(r'\s+')
+
+class QueryBudgetExceeded(RuntimeError):
+    """A request ran more queries than QUERY_BUDGET allows"""
+
+class QueryStats:
+    """Queries run by one request: count, total DB time and statement shapes.
+    Set `statements` to a list to also keep each (statement, duration).
+    """
+    
+    def __init__(self):
+        self.count = 0
+        self.duration = 0.0
+        self.shapes = Counter()
+        self.statements = None
+    
+    def record(self, statement, duration):
+        self.count += 1
+        self.duration += duration
+        self.shapes[statement_shape(statement)] += 1
+        if self.statements is not None:
+            self.statements.append((statement, duration))
+    
+    def slowest(self, limit):
+        """[(statement, duration)] of the slowest kept statements"""
+        return sorted(self.statements or (), key=lambda item: item[1], reverse=True)[:limit]
+    
+    def repeated(self, threshold):
+        """[(shape, times)] of statements run at least `threshold` times, most repeated first"""
+        return [(shape, times) for shape, times in self.shapes.most_common() if times >= threshold]
+
+def statement_shape(statement):
+    """Statement text with whitespace and expanded IN lists normalised"""
+    return _IN_LIST.sub('(?)', _WHITESPACE.sub(' ', statement).strip())
+
+def current_query_stats():
+    """QueryStats of the request being handled (None outside requests or when disabled)"""
+    return g.get('query_stats') if has_app_context() else None
+
+@event.listens_for(Engine, 'before_cursor_execute')
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault('query_start', []).append(time.perf_counter())
+
+@event.listens_for(Engine, 'after_cursor_execute')
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    started = conn.info['query_start'].pop()
+    stats = current_query_stats()
+    if stats is not None:
+        stats.record(statement, time.perf_counter() - started)
+
+def init_app(app):
+    """Count queries per request when QUERY_COUNTER_ENABLED is set"""
+    if not app.config.get('QUERY_COUNTER_ENABLED'):
+        return
+    
+    @app.before_request
+    def _start_query_stats():
+        g.query_stats = QueryStats()
+        g.request_started = time.perf_counter()
+    
+    @app.after_request
+    def _report_query_stats(response):
+        stats = g.pop('query_stats', None)
+        if stats is None:
+            return response
+        total_ms = (time.perf_counter() - g.pop('request_started')) * 1000
+        db_ms = stats.duration * 1000
+        
+        response.headers.add(
+            'Server-Timing', f'db;dur={db_ms:.1f};desc="{stats.count} queries", app;dur={total_ms:.1f}'
+        )
+        app.logger.debug(
+            f"{request.method} {request.path}: {stats.count} queries, {db_ms:.1f}ms DB, {total_ms:.1f}ms total"
+        )
+        
+        for shape, times in stats.repeated(app.config.get('QUERY_N_PLUS_ONE_THRESHOLD', 5)):
+            app.logger.warning(f"Possible N+1 in {request.method} {request.path}: {times}x {shape[:300]}")
+        
+        budget = app.config.get('QUERY_BUDGET')
+        if budget and stats.count > budget:
+            message = f"{request.method} {request.path} ran {stats.count} queries (budget {budget})"
+            if app.config.get('QUERY_BUDGET_RAISE'):
+                raise QueryBudgetExceeded(message)
+            app.logger.warning(message)
+        return response
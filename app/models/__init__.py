@@ -1,4 +1,5 @@
 from app.models.users import User
+from app.models.user_settings import UserSettings
 from app.models.follows import Follow
 from app.models.posts import Post
 from app.models.comments import Comment
@@ -6,13 +7,16 @@ from app.models.likes import Like
 from app.models.bookmarks import Bookmark
 from app.models.stories import Story
 from app.models.story_views import StoryView
-from app.models.notifications import Notification
+from app.models.notifications import Notification, NotificationActor
+from app.models.notification_archive import NotificationArchive
 from app.models.conversations import Conversation, ConversationParticipant
 from app.models.messages import Message, MessageReaction
+from app.models.blocked_users import BlockedUser
+from app.models.jobs import Job
 
 __all__ = [
-    'User', 'Follow', 'Post', 'Comment', 'Like', 'Bookmark', 
-    'Story', 'StoryView', 'Notification',
+    'User', 'UserSettings', 'Follow', 'Post', 'Comment', 'Like', 'Bookmark', 
+    'Story', 'StoryView', 'Notification', 'NotificationActor', 'NotificationArchive',
     'Conversation', 'ConversationParticipant',
-    'Message', 'MessageReaction'
+    'Message', 'MessageReaction', 'BlockedUser', 'Job'
 ]
@@ -0,0 +1,26 @@
+from app.extension import db
+from datetime import datetime
+
+class Job(db.Model):
+    """Deferred task run by a worker (app/lib/jobs.py)"""
+    __tablename__ = "jobs"
+    
+    id = db.Column(db.Integer, primary_key=True)
+    name = db.Column(db.String(100), nullable=False)  # Registered task name, e.g. 'email.send'
+    payload = db.Column(db.Text, nullable=False, default='{}')  # JSON keyword arguments
+    status = db.Column(db.String(10), nullable=False, default='queued')  # queued, running, done, failed
+    idempotency_key = db.Column(db.String(255), nullable=True, unique=True)
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    max_attempts = db.Column(db.Integer, nullable=False, default=5)
+    run_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)  # Not before (retry backoff)
+    locked_by = db.Column(db.String(100), nullable=True)  # Worker running it
+    locked_until = db.Column(db.DateTime, nullable=True)  # Lease; an expired running job is claimed again
+    last_error = db.Column(db.Text, nullable=True)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    finished_at = db.Column(db.DateTime, nullable=True, index=True)
+    
+    # Claim query: due jobs by status and time
+    __table_args__ = (db.Index('ix_jobs_status_run_at', 'status', 'run_at'),)
+    
+    def __repr__(self):
+        return f'<Job {self.id} {self.name} {self.status}>'
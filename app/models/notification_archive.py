@@ -0,0 +1,19 @@
+from app.extension import db
+from datetime import datetime
+
+class NotificationArchive(db.Model):
+    """Compact copy of read notifications past the retention window (no FKs, no joins)"""
+    __tablename__ = "notification_archive"
+    
+    id = db.Column(db.Integer, primary_key=True)  # Original notification id
+    user_id = db.Column(db.Integer, nullable=False, index=True)
+    from_user_id = db.Column(db.Integer, nullable=True)
+    notification_type = db.Column(db.String(20), nullable=False)
+    post_id = db.Column(db.Integer, nullable=True)
+    actor_count = db.Column(db.Integer, default=1, nullable=False)
+    created_at = db.Column(db.DateTime, nullable=True)
+    updated_at = db.Column(db.DateTime, nullable=True)
+    archived_at = db.Column(db.DateTime, default=datetime.utcnow, index=True)
+    
+    def __repr__(self):
+        return f'<NotificationArchive {self.id} type={self.notification_type} for user {self.user_id}>'
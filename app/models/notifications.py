@@ -1,12 +1,15 @@
 from app.extension import db
 from datetime import datetime
+from sqlalchemy import func
+from sqlalchemy.ext.hybrid import hybrid_property
+import json
 
 class Notification(db.Model):
     __tablename__ = "notifications"
     
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False, index=True)
-    from_user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=True, index=True)
+    from_user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=True, index=True)  # Most recent actor
     notification_type = db.Column(db.String(20), nullable=False, index=True)  # 'like', 'comment', 'follow', 'message', 'mention'
     post_id = db.Column(db.Integer, db.ForeignKey('posts.id'), nullable=True, index=True)
     comment_id = db.Column(db.Integer, db.ForeignKey('comments.id'), nullable=True, index=True)
@@ -15,6 +18,12 @@ class Notification(db.Model):
     read = db.Column(db.Boolean, default=False, index=True)
     created_at = db.Column(db.DateTime, default=datetime.utcnow, index=True)
     
+    # Aggregation: one row per (recipient, type, target) within a time window
+    actor_count = db.Column(db.Integer, default=1, server_default='1', nullable=False)
+    recent_actor_ids = db.Column(db.Text, nullable=True)  # JSON list of user ids, newest first
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, index=True)  # Last time an actor was added
+    aggregation_key = db.Column(db.String(40), nullable=True)  # '<type>:<post_id>' while new actors fold into this row
+    
     # Relationships
     user = db.relationship('User', foreign_keys=[user_id], backref='notifications')
     from_user = db.relationship('User', foreign_keys=[from_user_id])
@@ -22,7 +31,62 @@ class Notification(db.Model):
     comment = db.relationship('Comment', backref='notifications')
     conversation = db.relationship('Conversation', backref='notifications')
     message = db.relationship('Message', backref='notifications')
+    actors = db.relationship('NotificationActor', backref='notification', lazy='dynamic',
+                             cascade='all, delete-orphan', passive_deletes=True)
+    
+    # ix_notifications_user_activity backs the per-user newest-first listing and its cursor pagination
+    __table_args__ = (
+        # Keyset pagination on (activity_at, id), see app.lib.notifications.get_notifications_page
+        db.Index('ix_notifications_user_activity', user_id, func.coalesce(updated_at, created_at), id),
+        # One open aggregate per recipient and target, so concurrent events cannot create two
+        db.Index('ix_notifications_open_aggregate', user_id, aggregation_key, unique=True,
+                 sqlite_where=read == False, postgresql_where=read == False),
+    )
+    
+    @hybrid_property
+    def activity_at(self):
+        """Last activity: updated_at, or created_at for rows written without one"""
+        return self.updated_at or self.created_at
+    
+    @activity_at.expression
+    def activity_at(cls):
+        return func.coalesce(cls.updated_at, cls.created_at)
+    
+    def get_recent_actor_ids(self):
+        """Get ids of the most recent actors, newest first"""
+        if self.recent_actor_ids:
+            try:
+                return json.loads(self.recent_actor_ids)
+            except (json.JSONDecodeError, TypeError):
+                pass
+        return [self.from_user_id] if self.from_user_id else []
+    
+    def add_actor(self, from_user_id, max_recent=3, comment_id=None, counted=False):
+        """Fold another actor into this aggregate notification (does not commit).
+        actor_count only grows for actors not counted before: pass counted=True when
+        the actor is already recorded in notification_actors (see app.lib.notifications).
+        """
+        recent = self.get_recent_actor_ids()
+        if from_user_id in recent:
+            recent.remove(from_user_id)
+        elif not counted:
+            self.actor_count = (self.actor_count or 1) + 1
+        recent.insert(0, from_user_id)
+        self.recent_actor_ids = json.dumps(recent[:max_recent])
+        self.from_user_id = from_user_id
+        if comment_id:
+            self.comment_id = comment_id
+        self.updated_at = datetime.utcnow()
     
     def __repr__(self):
         return f'<Notification {self.id} type={self.notification_type} for user {self.user_id}>'
 
+class NotificationActor(db.Model):
+    """Distinct actors folded into an aggregate notification, so repeats are never recounted"""
+    __tablename__ = "notification_actors"
+    
+    notification_id = db.Column(db.Integer, db.ForeignKey('notifications.id', ondelete='CASCADE'), primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id', ondelete='CASCADE'), primary_key=True)
+    
+    def __repr__(self):
+        return f'<NotificationActor user {self.user_id} on notification {self.notification_id}>'
@@ -10,6 +10,7 @@ class Post(db.Model):
     user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False, index=True)
     # Support for carousel: store as JSON array of media objects
     # Each media object: {"url": "...", "type": "image|video", "alt_text": "..."}
+    # Images also carry "width", "height" and an inline "placeholder" (LQIP data URI)
     media_urls = db.Column(db.Text, nullable=True)  # JSON string (nullable for backward compatibility)
     # Legacy column for old posts (mapped to database column 'image_url')
     # Use server_default to avoid NOT NULL constraint issues
@@ -17,6 +18,7 @@ class Post(db.Model):
     caption = db.Column(db.Text, nullable=True)
     location = db.Column(db.String(255), nullable=True)
     created_at = db.Column(db.DateTime, default=datetime.utcnow, index=True)
+    likes_count = db.Column(db.Integer, default=0, server_default='0', nullable=False)  # Denormalized, updated by the like counter buffer
     
     # Relationships
     comments = db.relationship('Comment', backref='post', lazy='dynamic', cascade='all, delete-orphan')
@@ -40,6 +42,11 @@ class Post(db.Model):
         
         return []
     
+    def get_cover_media(self):
+        """Get first media object (with dimensions/placeholder when available)"""
+        media_list = self.get_media_list()
+        return media_list[0] if media_list else {}
+    
     # Backward compatibility: get first media URL using hybrid_property
     @hybrid_property
     def image_url(self):
@@ -77,8 +84,8 @@ class Post(db.Model):
         return self.likes.filter_by(user_id=user.id).first() is not None
     
     def like_count(self):
-        """Get total number of likes"""
-        return self.likes.count()
+        """Get total number of likes (cached counter; buffered likes land within a flush interval)"""
+        return self.likes_count or 0
     
     def comment_count(self):
         """Get total number of comments"""
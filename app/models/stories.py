@@ -1,5 +1,6 @@
 from app.extension import db
 from datetime import datetime, timedelta
+import json
 
 class Story(db.Model):
     __tablename__ = "stories"
@@ -8,23 +9,42 @@ class Story(db.Model):
     user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False, index=True)
     media_url = db.Column(db.String(255), nullable=False)
     media_type = db.Column(db.String(10), default='image', nullable=False)  # 'image' or 'video'
+    media_meta = db.Column(db.Text, nullable=True)  # JSON: {"width", "height", "placeholder"} for images
     text_overlay = db.Column(db.Text, nullable=True)  # JSON string for text/stickers/filters
     created_at = db.Column(db.DateTime, default=datetime.utcnow, index=True)
     expires_at = db.Column(db.DateTime, nullable=False, index=True)
     is_highlight = db.Column(db.Boolean, default=False, index=True)  # Saved to highlights
     highlight_title = db.Column(db.String(100), nullable=True)  # Title for highlight
+    views_count = db.Column(db.Integer, default=0, server_default='0', nullable=False)  # Denormalized, bumped by the view buffer flush
     
     # Relationships
     user = db.relationship('User', backref='stories', lazy='select')
     views = db.relationship('StoryView', backref='story', lazy='dynamic', cascade='all, delete-orphan')
     
+    # Story tray: active stories of followed users (user_id IN (...) AND expires_at > now)
+    __table_args__ = (db.Index('ix_stories_user_expires', 'user_id', 'expires_at'),)
+    
+    def get_media_meta(self):
+        """Get media dimensions and placeholder (empty for videos and old stories)"""
+        if not self.media_meta:
+            return {}
+        try:
+            return json.loads(self.media_meta)
+        except (json.JSONDecodeError, TypeError):
+            return {}
+    
+    def set_media_meta(self, media_obj):
+        """Store dimensions and placeholder from a saved media object"""
+        meta = {key: media_obj[key] for key in ('width', 'height', 'placeholder') if key in media_obj}
+        self.media_meta = json.dumps(meta) if meta else None
+    
     def is_expired(self):
         """Check if story has expired"""
         return datetime.utcnow() > self.expires_at
     
     def view_count(self):
-        """Get total number of views"""
-        return self.views.count()
+        """Get total number of views (cached counter; buffered views land within a flush interval)"""
+        return self.views_count or 0
     
     def is_viewed_by(self, user):
         """Check if story is viewed by user"""
@@ -1,6 +1,7 @@
 from app.extension import db
 from flask_login import UserMixin
 from datetime import datetime
+import json
 
 class User(UserMixin, db.Model):
     
@@ -12,6 +13,7 @@ class User(UserMixin, db.Model):
     password = db.Column(db.String(128), nullable=False)
     bio = db.Column(db.Text, nullable=True)
     profile_picture = db.Column(db.String(255), nullable=True, default='default_profile.png')
+    profile_picture_meta = db.Column(db.Text, nullable=True)  # JSON: {"width", "height", "placeholder"}
     created_at = db.Column(db.DateTime, default=datetime.utcnow, index=True)
     
     # Authentication & Verification
@@ -24,6 +26,9 @@ class User(UserMixin, db.Model):
     password_reset_expires = db.Column(db.DateTime, nullable=True)
     last_login = db.Column(db.DateTime, nullable=True)
     
+    # Denormalized counters (kept in sync by app.lib.notifications)
+    unread_notifications_count = db.Column(db.Integer, default=0, server_default='0', nullable=False)
+    
     # Relationships
     # Posts created by this user
     posts = db.relationship('Post', backref='user', lazy='dynamic', cascade='all, delete-orphan')
@@ -51,6 +56,21 @@ class User(UserMixin, db.Model):
     likes = db.relationship('Like', backref='user', lazy='dynamic', cascade='all, delete-orphan')
     bookmarks = db.relationship('Bookmark', backref='user', lazy='dynamic', cascade='all, delete-orphan')
     
+    def get_profile_picture_meta(self):
+        """Get profile picture dimensions and placeholder (empty for default/old pictures)"""
+        if not self.profile_picture_meta:
+            return {}
+        try:
+            return json.loads(self.profile_picture_meta)
+        except (json.JSONDecodeError, TypeError):
+            return {}
+    
+    def set_profile_picture(self, media_obj):
+        """Set profile picture from a saved media object (does not commit)"""
+        self.profile_picture = media_obj['url']
+        meta = {key: media_obj[key] for key in ('width', 'height', 'placeholder') if key in media_obj}
+        self.profile_picture_meta = json.dumps(meta) if meta else None
+    
     def is_following(self, user):
         """Check if this user is following another user (accepted status)"""
         follow = self.following.filter_by(followed_id=user.id).first()
@@ -0,0 +1,48 @@
+from flask import Blueprint, Response, current_app, jsonify, request, abort, send_from_directory
+import hmac
+import io
+import os
+import pstats
+
+from app.middleware.profiler import list_captures, profile_dir
+
+admin_bp = Blueprint("admin", __name__, url_prefix="/admin")
+
+@admin_bp.before_request
+def require_admin_token():
+    """Captures hold SQL and timings: require "Authorization: Bearer <ADMIN_TOKEN>", 404 when none is set"""
+    token = current_app.config.get('ADMIN_TOKEN')
+    if not token:
+        abort(404)
+    supplied = request.headers.get('Authorization', '').removeprefix('Bearer ')
+    if not hmac.compare_digest(supplied, token):
+        abort(401)
+
+@admin_bp.route("/profiles", methods=["GET"])
+def list_profiles():
+    """Stored slow-request and sampled profile captures, newest first (?slow=1 for slow requests only)"""
+    captures = list_captures(profile_dir(current_app))
+    if request.args.get('slow') in ('1', 'true'):
+        captures = [capture for capture in captures if capture.get('slow')]
+    return jsonify({'profiles': captures})
+
+@admin_bp.route("/profiles/<name>", methods=["GET"])
+def get_profile(name):
+    """cProfile summary of a capture (?sort=tottime, ?limit=60), or the raw .prof with ?download=1"""
+    directory = profile_dir(current_app)
+    filename = f'{os.path.basename(name)}.prof'
+    path = os.path.join(directory, filename)
+    if not os.path.isfile(path):
+        abort(404)
+    
+    if request.args.get('download') in ('1', 'true'):
+        return send_from_directory(directory, filename, as_attachment=True, mimetype='application/octet-stream')
+    
+    sort = request.args.get('sort', 'cumulative')
+    if sort not in ('cumulative', 'tottime', 'calls', 'ncalls'):
+        return jsonify({'error': 'sort must be cumulative, tottime, calls or ncalls'}), 400
+    limit = request.args.get('limit', 60, type=int)
+    
+    output = io.StringIO()
+    pstats.Stats(path, stream=output).strip_dirs().sort_stats(sort).print_stats(limit)
+    return Response(output.getvalue(), content_type='text/plain; charset=utf-8')
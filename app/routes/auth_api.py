@@ -93,11 +93,11 @@ def register():
         settings = UserSettings(user_id=user.id)
         db.session.add(settings)
         
-        db.session.commit()
-        
-        # Send verification email
+        # Queue the verification email (sent once the account is committed)
         send_verification_email(user)
         
+        db.session.commit()
+        
         # Generate JWT token
         token = generate_token(user.id)
         
@@ -193,6 +193,7 @@ def forgot_password():
     # Don't reveal if email exists for security
     if user:
         send_password_reset_email(user)
+        db.session.commit()
     
     return jsonify({
         'message': 'If an account exists with that email, a password reset link has been sent.'
@@ -271,9 +272,9 @@ def resend_verification():
     
     if not user.email_verification_token:
         user.email_verification_token = generate_verification_token()
-        db.session.commit()
     
     send_verification_email(user)
+    db.session.commit()
     
     return jsonify({'message': 'Verification email sent'}), 200
 
@@ -95,11 +95,11 @@ def signup():
             settings = UserSettings(user_id=user.id)
             db.session.add(settings)
             
-            db.session.commit()
-            
-            # Send verification email
+            # Queue the verification email (sent once the account is committed)
             send_verification_email(user)
             
+            db.session.commit()
+            
             flash('Account created successfully! Please check your email to verify your account.', 'success')
             return redirect(url_for('auth.login'))
         except Exception as e:
@@ -128,6 +128,7 @@ def forgot_password():
         # Don't reveal if email exists (security)
         if user:
             send_password_reset_email(user)
+            db.session.commit()
         
         flash('If an account exists with that email, a password reset link has been sent.', 'info')
         return redirect(url_for('auth.login'))
@@ -201,8 +202,8 @@ def resend_verification():
     
     if not current_user.email_verification_token:
         current_user.email_verification_token = generate_verification_token()
-        db.session.commit()
     
     send_verification_email(current_user)
+    db.session.commit()
     flash('Verification email sent. Please check your inbox.', 'info')
     return redirect(url_for('main.feed'))
@@ -1,6 +1,9 @@
 from flask import Blueprint, render_template, redirect, url_for, request
 from flask_login import login_required, current_user
+from types import SimpleNamespace
 from app.extension import cache
+from app.lib.cache import get_or_compute
+from app.lib.events import subscribe
 
 from app.models.posts import Post
 from app.models.users import User
@@ -47,26 +50,21 @@ def feed():
     
     return render_template("feed.html", posts=posts)
 
-@main_bp.route("/explore")
-@login_required
-def explore():
-    """Explore page showing trending posts, hashtags, and discovery"""
+def explore_cache_key(page, hashtag, category):
+    """Cache key of an explore page's data"""
+    return f"explore_{page}_{hashtag}_{category}"
+
+@subscribe('post.created', 'post.deleted')
+def _invalidate_explore(name, payload):
+    """New or deleted posts change the first unfiltered explore pages"""
+    cache.delete_many(*(explore_cache_key(1, '', category) for category in ('all', 'recent', 'trending')))
+
+def _explore_data(page, hashtag, category):
+    """Compute an explore page: post ids, pagination numbers and trending hashtags (cacheable)"""
     from datetime import datetime, timedelta
     import re
     
-    page = request.args.get('page', 1, type=int)
-    hashtag = request.args.get('hashtag', '').strip().lstrip('#')
-    category = request.args.get('category', 'all')  # 'all', 'trending', 'recent'
-    
-    # Generate cache key
-    cache_key = f"explore_{page}_{hashtag}_{category}"
-    
-    # Check cache (60 second timeout for explore page)
-    cached_result = cache.get(cache_key)
-    if cached_result:
-        return cached_result
-    
-    posts_query = Post.query.options(joinedload(Post.user))
+    posts_query = Post.query
     
     # Filter by hashtag if provided
     if hashtag:
@@ -107,17 +105,49 @@ def explore():
     
     trending_hashtags = sorted(hashtag_counts.items(), key=lambda x: x[1], reverse=True)[:10]
     
-    # Render template
-    response = render_template("explore.html", 
+    return {
+        'post_ids': [post.id for post in posts.items],
+        'pages': posts.pages,
+        'total': posts.total,
+        'trending_hashtags': trending_hashtags
+    }
+
+@main_bp.route("/explore")
+@login_required
+def explore():
+    """Explore page showing trending posts, hashtags, and discovery"""
+    page = request.args.get('page', 1, type=int)
+    hashtag = request.args.get('hashtag', '').strip().lstrip('#')
+    category = request.args.get('category', 'all')  # 'all', 'trending', 'recent'
+    
+    # Cache the page data (not the HTML, which contains the viewer's navbar) for 60 seconds,
+    # shared across workers; a cold key is computed once (single-flight)
+    cache_key = explore_cache_key(page, hashtag, category)
+    data = get_or_compute(cache_key, lambda: _explore_data(page, hashtag, category), timeout=60)
+    
+    # Load the page's posts by primary key, in cached order
+    posts_by_id = {}
+    if data['post_ids']:
+        posts_by_id = {
+            post.id: post
+            for post in Post.query.options(joinedload(Post.user)).filter(Post.id.in_(data['post_ids']))
+        }
+    posts = SimpleNamespace(
+        items=[posts_by_id[post_id] for post_id in data['post_ids'] if post_id in posts_by_id],
+        page=page,
+        pages=data['pages'],
+        total=data['total'],
+        has_prev=page > 1,
+        has_next=page < data['pages'],
+        prev_num=page - 1,
+        next_num=page + 1
+    )
+    
+    return render_template("explore.html", 
                              posts=posts, 
                              hashtag=hashtag,
                              category=category,
-                             trending_hashtags=trending_hashtags)
-    
-    # Cache for 60 seconds
-    cache.set(cache_key, response, timeout=60)
-    
-    return response
+                             trending_hashtags=data['trending_hashtags'])
 
 @main_bp.route("/search")
 @login_required
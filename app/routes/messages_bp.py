@@ -1,6 +1,6 @@
 from flask import Blueprint, render_template, jsonify, request
 from flask_login import login_required, current_user
-from sqlalchemy.orm import joinedload
+from sqlalchemy import select, func, case
 from datetime import datetime
 import os
 
@@ -8,9 +8,14 @@ from app.extension import db
 from app.models.conversations import Conversation, ConversationParticipant
 from app.models.messages import Message, MessageReaction
 from app.models.users import User
-from app.models.notifications import Notification
+from app.lib.http_cache import conditional_get
+from app.lib.notifications import notify_later
+from app.lib.serializers import MessageSerializer, UserSerializer, FieldError
 from app.utils import allowed_file
 
+# Shape of a just-sent message (Socket.IO 'message.new' adds the sender)
+NEW_MESSAGE_FIELDS = ('id', 'conversation_id', 'sender_id', 'content', 'type', 'media_url', 'reply_to_id', 'created_at')
+
 messages_bp = Blueprint("messages", __name__, url_prefix="/messages")
 
 @messages_bp.route("/")
@@ -22,8 +27,6 @@ def list_conversations():
         ConversationParticipant
     ).filter(
         ConversationParticipant.user_id == current_user.id
-    ).options(
-        joinedload(Conversation.participants).joinedload(ConversationParticipant.user)
     ).order_by(Conversation.updated_at.desc()).all()
     
     # Format conversations with last message and unread count
@@ -67,65 +70,50 @@ def view_conversation(conversation_id):
     # Get other participant
     other_user = conv.get_other_participant(current_user.id)
     
+    # Mark messages as read (before loading them: the commit would expire loaded rows)
+    conv.mark_as_read(current_user.id)
+    
     # Get messages
+    serializer = MessageSerializer(viewer=current_user)
     messages = Message.query.filter_by(conversation_id=conversation_id)\
-        .options(joinedload(Message.sender))\
-        .options(joinedload(Message.reply_to))\
+        .options(*serializer.options())\
         .order_by(Message.created_at.asc()).all()
-    
-    # Mark messages as read
-    conv.mark_as_read(current_user.id)
-    
-    # Format messages
-    messages_data = []
-    for msg in messages:
-        reactions_data = []
-        for reaction in msg.reactions:
-            reactions_data.append({
-                'id': reaction.id,
-                'emoji': reaction.emoji,
-                'user_id': reaction.user_id,
-                'username': reaction.user.username
-            })
-        
-        messages_data.append({
-            'id': msg.id,
-            'sender_id': msg.sender_id,
-            'content': msg.content,
-            'type': msg.message_type,
-            'media_url': msg.media_url,
-            'reply_to': {
-                'id': msg.reply_to.id,
-                'content': msg.reply_to.content[:50] if msg.reply_to else None,
-                'sender_username': msg.reply_to.sender.username if msg.reply_to else None
-            } if msg.reply_to else None,
-            'reactions': reactions_data,
-            'read': msg.read,
-            'read_at': msg.read_at.isoformat() if msg.read_at else None,
-            'created_at': msg.created_at.isoformat(),
-            'sender': {
-                'id': msg.sender.id,
-                'username': msg.sender.username,
-                'profile_picture': msg.sender.profile_picture
-            }
-        })
+    messages_data = serializer.dump_many(messages)
     
     return render_template("messages/thread.html", 
                          conversation=conv, 
                          other_user=other_user,
                          messages=messages_data)
 
+def _conversations_version():
+    """Conversation count/last update plus message count, newest id and unread count"""
+    conversation_ids = select(ConversationParticipant.conversation_id).where(
+        ConversationParticipant.user_id == current_user.id
+    )
+    last_update = select(func.max(Conversation.updated_at)).where(
+        Conversation.id.in_(conversation_ids)
+    ).scalar_subquery()
+    unread = case((Message.read.is_(False) & (Message.sender_id != current_user.id), 1), else_=0)
+    row = db.session.execute(
+        select(
+            select(func.count()).select_from(conversation_ids.subquery()).scalar_subquery(),
+            last_update,
+            func.count(Message.id),
+            func.max(Message.id),
+            func.sum(unread)
+        ).where(Message.conversation_id.in_(conversation_ids))
+    ).first()
+    return tuple(row)
 
 @messages_bp.route("/api/conversations", methods=["GET"])
 @login_required
+@conditional_get(_conversations_version)
 def api_list_conversations():
     """API endpoint to list conversations"""
     conversations = db.session.query(Conversation).join(
         ConversationParticipant
     ).filter(
         ConversationParticipant.user_id == current_user.id
-    ).options(
-        joinedload(Conversation.participants).joinedload(ConversationParticipant.user)
     ).order_by(Conversation.updated_at.desc()).all()
     
     conversations_data = []
@@ -158,56 +146,27 @@ def api_list_conversations():
 @messages_bp.route("/api/conversations/<int:conversation_id>/messages", methods=["GET"])
 @login_required
 def api_get_messages(conversation_id):
-    """API endpoint to get messages in a conversation"""
+    """API endpoint to get messages in a conversation (?fields= for a sparse fieldset)"""
     # Verify user is a participant
     conv = Conversation.query.join(ConversationParticipant).filter(
         Conversation.id == conversation_id,
         ConversationParticipant.user_id == current_user.id
     ).first_or_404()
     
-    # Get messages
-    messages = Message.query.filter_by(conversation_id=conversation_id)\
-        .options(joinedload(Message.sender))\
-        .options(joinedload(Message.reply_to))\
-        .order_by(Message.created_at.asc()).all()
+    try:
+        serializer = MessageSerializer.from_request(current_user)
+    except FieldError as e:
+        return jsonify({'error': str(e)}), 400
     
-    # Mark as read
+    # Mark as read (before loading: the commit would expire loaded rows)
     conv.mark_as_read(current_user.id)
     
-    messages_data = []
-    for msg in messages:
-        reactions_data = []
-        for reaction in msg.reactions:
-            reactions_data.append({
-                'id': reaction.id,
-                'emoji': reaction.emoji,
-                'user_id': reaction.user_id,
-                'username': reaction.user.username
-            })
-        
-        messages_data.append({
-            'id': msg.id,
-            'sender_id': msg.sender_id,
-            'content': msg.content,
-            'type': msg.message_type,
-            'media_url': msg.media_url,
-            'reply_to': {
-                'id': msg.reply_to.id,
-                'content': msg.reply_to.content[:50] if msg.reply_to else None,
-                'sender_username': msg.reply_to.sender.username if msg.reply_to else None
-            } if msg.reply_to else None,
-            'reactions': reactions_data,
-            'read': msg.read,
-            'read_at': msg.read_at.isoformat() if msg.read_at else None,
-            'created_at': msg.created_at.isoformat(),
-            'sender': {
-                'id': msg.sender.id,
-                'username': msg.sender.username,
-                'profile_picture': msg.sender.profile_picture
-            }
-        })
+    # Get messages
+    messages = Message.query.filter_by(conversation_id=conversation_id)\
+        .options(*serializer.options())\
+        .order_by(Message.created_at.asc()).all()
     
-    return jsonify(messages_data)
+    return jsonify(serializer.dump_many(messages))
 
 
 @messages_bp.route("/api/conversations/<int:conversation_id>/messages", methods=["POST"])
@@ -302,52 +261,26 @@ def api_send_message(conversation_id):
     conv.updated_at = datetime.utcnow()
     
     db.session.add(message)
+    db.session.flush()  # Get message ID
     
     # Create notification for recipient
     other_user = conv.get_other_participant(current_user.id)
     if other_user:
-        notification = Notification(
-            user_id=other_user.id,
-            from_user_id=current_user.id,
-            notification_type='message',
-            conversation_id=conv.id,
-            message_id=message.id
-        )
-        db.session.add(notification)
+        notify_later(other_user.id, current_user.id, 'message', conversation_id=conv.id, message_id=message.id,
+                     key=f'notify.message:{message.id}')
     
     db.session.commit()
     
     # Emit WebSocket event (will be handled by socketio handlers)
     from app.extension import socketio
+    message_data = MessageSerializer(fields=NEW_MESSAGE_FIELDS, viewer=current_user).dump(message)
     socketio.emit('message.new', {
-        'message': {
-            'id': message.id,
-            'conversation_id': conv.id,
-            'sender_id': current_user.id,
-            'content': content,
-            'type': message_type,
-            'media_url': media_url,
-            'reply_to_id': reply_to_id,
-            'created_at': message.created_at.isoformat(),
-            'sender': {
-                'username': current_user.username,
-                'profile_picture': current_user.profile_picture
-            }
-        }
+        'message': dict(message_data, sender=UserSerializer().dump(current_user))
     }, room=f"conversation_{conv.id}")
     
     return jsonify({
         'success': True,
-        'message': {
-            'id': message.id,
-            'conversation_id': conv.id,
-            'sender_id': current_user.id,
-            'content': content,
-            'type': message_type,
-            'media_url': media_url,
-            'reply_to_id': reply_to_id,
-            'created_at': message.created_at.isoformat()
-        }
+        'message': message_data
     }), 201
 
 
@@ -0,0 +1,26 @@
+from flask import Blueprint, Response, current_app, request, abort
+import hmac
+
+from app.lib.metrics import collect, render, add_ratio, write_snapshot
+from app.middleware.metrics import metrics_dir
+
+metrics_bp = Blueprint("metrics", __name__)
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+@metrics_bp.route("/metrics")
+def metrics():
+    """Prometheus text exposition of this app's metrics (all workers when a multiprocess dir is set)"""
+    token = current_app.config.get('METRICS_TOKEN')
+    if token:
+        supplied = request.headers.get('Authorization', '').removeprefix('Bearer ')
+        if not hmac.compare_digest(supplied, token):
+            abort(401)
+    
+    directory = metrics_dir(current_app)
+    if directory:
+        write_snapshot(directory)
+    collected = collect(directory)
+    add_ratio(collected, 'cache_hit_ratio', 'Cache hits / lookups by tier', 'cache_hits_total',
+              ('cache_hits_total', 'cache_misses_total'))
+    return Response(render(collected), content_type=CONTENT_TYPE)
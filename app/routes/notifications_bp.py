@@ -1,64 +1,82 @@
-from flask import Blueprint, render_template, jsonify
+from flask import Blueprint, render_template, jsonify, request, abort
 from flask_login import login_required, current_user
-from sqlalchemy.orm import joinedload
+from sqlalchemy import select, func, case
 
 from app.extension import db
 from app.models.notifications import Notification
+from app.lib.http_cache import conditional_get
+from app.lib.serializers import NotificationSerializer, FieldError
+from app.lib.notifications import (
+    load_recent_actors, adjust_unread_count, reset_unread_count, get_notifications_page
+)
 
 notifications_bp = Blueprint("notifications", __name__, url_prefix="/notifications")
 
 @notifications_bp.route("/")
 @login_required
 def view():
-    """View all notifications"""
-    notifications = Notification.query.filter_by(user_id=current_user.id)\
-                                     .options(joinedload(Notification.from_user))\
-                                     .options(joinedload(Notification.post))\
-                                     .options(joinedload(Notification.comment))\
-                                     .options(joinedload(Notification.conversation))\
-                                     .order_by(Notification.created_at.desc())\
-                                     .limit(50).all()
+    """View notifications, newest first (?cursor= for older pages)"""
+    try:
+        notifications, next_cursor = get_notifications_page(
+            current_user.id, cursor=request.args.get('cursor'), limit=50
+        )
+    except ValueError:
+        abort(404)
+    
+    recent_actors = load_recent_actors(notifications)
     
-    return render_template("notifications/view.html", notifications=notifications)
+    return render_template("notifications/view.html",
+                           notifications=notifications,
+                           recent_actors=recent_actors,
+                           next_cursor=next_cursor)
 
+def _notifications_version():
+    """Count, newest update and unread count of the current user's notifications"""
+    row = db.session.execute(
+        select(
+            func.count(Notification.id),
+            func.max(Notification.activity_at),
+            func.sum(case((Notification.read.is_(False), 1), else_=0))
+        ).where(Notification.user_id == current_user.id)
+    ).first()
+    return tuple(row)
 
 @notifications_bp.route("/api", methods=["GET"])
 @login_required
+@conditional_get(_notifications_version)
 def api_list():
-    """API endpoint to get notifications"""
-    notifications = Notification.query.filter_by(user_id=current_user.id)\
-                                     .options(joinedload(Notification.from_user))\
-                                     .options(joinedload(Notification.post))\
-                                     .options(joinedload(Notification.comment))\
-                                     .options(joinedload(Notification.conversation))\
-                                     .order_by(Notification.created_at.desc())\
-                                     .limit(50).all()
+    """API endpoint to get notifications (cursor pagination: ?cursor=&limit=, sparse fieldset: ?fields=)"""
+    limit = request.args.get('limit', 50, type=int)
+    limit = max(1, min(limit, 100))  # Max 100 per page
     
-    notifications_data = []
-    for notif in notifications:
-        notifications_data.append({
-            'id': notif.id,
-            'type': notif.notification_type,
-            'from_user': {
-                'id': notif.from_user.id if notif.from_user else None,
-                'username': notif.from_user.username if notif.from_user else None,
-                'profile_picture': notif.from_user.profile_picture if notif.from_user else None
-            } if notif.from_user else None,
-            'post_id': notif.post_id,
-            'comment_id': notif.comment_id,
-            'conversation_id': notif.conversation_id,
-            'read': notif.read,
-            'created_at': notif.created_at.isoformat()
-        })
+    try:
+        serializer = NotificationSerializer.from_request(current_user)
+    except FieldError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    try:
+        notifications, next_cursor = get_notifications_page(
+            current_user.id, cursor=request.args.get('cursor'), limit=limit,
+            options=serializer.options()
+        )
+    except ValueError:
+        return jsonify({'error': 'Invalid cursor'}), 400
     
-    return jsonify(notifications_data)
+    return jsonify({
+        'notifications': serializer.dump_many(notifications),
+        'pagination': {
+            'limit': limit,
+            'next_cursor': next_cursor,
+            'has_more': next_cursor is not None
+        }
+    })
 
 @notifications_bp.route("/count", methods=["GET"])
 @login_required
 def count():
-    """Get count of unread notifications"""
-    count = Notification.query.filter_by(user_id=current_user.id, read=False).count()
-    return jsonify({'count': count})
+    """Get count of unread notifications (cached counter; live updates are pushed
+    as 'notification.count' to the user's Socket.IO room)"""
+    return jsonify({'count': current_user.unread_notifications_count or 0})
 
 @notifications_bp.route("/mark-read/<int:notification_id>", methods=["POST"])
 @login_required
@@ -70,7 +88,9 @@ def mark_read(notification_id):
         return jsonify({'error': 'Unauthorized'}), 403
     
     try:
-        notification.read = True
+        if not notification.read:
+            notification.read = True
+            adjust_unread_count(current_user.id, -1)
         db.session.commit()
         return jsonify({'success': True})
     except Exception:
@@ -90,6 +110,7 @@ def mark_all_read():
     try:
         updated = Notification.query.filter_by(user_id=current_user.id, read=False)\
                                    .update({Notification.read: True})
+        reset_unread_count(current_user.id)
         db.session.commit()
         
         if updated > 0:
@@ -5,6 +5,7 @@ import os
 import time
 
 from app.extension import db
+from sqlalchemy import select, func, exists
 from sqlalchemy.orm import joinedload
 from app.forms.postForm import PostForm
 from app.forms.editPostForm import EditPostForm
@@ -13,7 +14,11 @@ from app.models.posts import Post
 from app.models.comments import Comment
 from app.models.likes import Like
 from app.models.bookmarks import Bookmark
-from app.models.notifications import Notification
+from app.models.users import User
+from app.lib.notifications import notify_later
+from app.lib.http_cache import conditional_get
+from app.lib.likes import like_post, unlike_post, like_count_buffer
+from app.lib.serializers import PostSerializer, POST_LIST_FIELDS, FieldError
 from app.utils import save_post_image, save_post_media, extract_hashtags, extract_mentions
 
 posts_bp = Blueprint("posts", __name__, url_prefix="/posts")
@@ -150,27 +155,14 @@ def add_comment(post_id):
             db.session.add(comment)
             db.session.flush()  # Get comment ID
             
-            # Create notification for post owner (if not commenting on own post)
-            if post.user_id != current_user.id:
-                notification = Notification(
-                    user_id=post.user_id,
-                    from_user_id=current_user.id,
-                    notification_type='comment',
-                    post_id=post_id,
-                    comment_id=comment.id
-                )
-                db.session.add(notification)
+            # Notify post owner (aggregated per post; skipped when commenting on own post)
+            notify_later(post.user_id, current_user.id, 'comment', post_id=post_id, comment_id=comment.id,
+                         key=f'notify.comment:{comment.id}:{post.user_id}')
             
             # If replying to a comment, notify the parent comment owner
-            if parent_id and parent_comment.user_id != current_user.id:
-                notification = Notification(
-                    user_id=parent_comment.user_id,
-                    from_user_id=current_user.id,
-                    notification_type='comment',
-                    post_id=post_id,
-                    comment_id=comment.id
-                )
-                db.session.add(notification)
+            if parent_id and parent_comment.user_id != post.user_id:
+                notify_later(parent_comment.user_id, current_user.id, 'comment', post_id=post_id, comment_id=comment.id,
+                             key=f'notify.comment:{comment.id}:{parent_comment.user_id}')
             
             db.session.commit()
             flash('Comment added!', 'success')
@@ -180,57 +172,46 @@ def add_comment(post_id):
     
     return redirect(url_for('posts.detail', post_id=post_id))
 
-@posts_bp.route("/<int:post_id>/like", methods=["POST"])
-@login_required
-def toggle_like(post_id):
-    """Toggle like on a post"""
-    post = Post.query.get_or_404(post_id)
-    like = Like.query.filter_by(user_id=current_user.id, post_id=post_id).first()
-    
+def _set_like(post, liked):
+    """Like or unlike a post idempotently and build the JSON response"""
     try:
-        if like:
-            # Unlike
-            db.session.delete(like)
-            db.session.commit()
-            liked = False
+        if liked:
+            if like_post(current_user.id, post.id):
+                # Notify post owner; repeat likes fold into the post's aggregate notification
+                notify_later(post.user_id, current_user.id, 'like', post_id=post.id)
         else:
-            # Like
-            like = Like(user_id=current_user.id, post_id=post_id)
-            db.session.add(like)
-            
-            # Create notification for post owner (if not liking own post)
-            if post.user_id != current_user.id:
-                # Check if notification already exists to avoid duplicates
-                existing_notif = Notification.query.filter_by(
-                    user_id=post.user_id,
-                    from_user_id=current_user.id,
-                    notification_type='like',
-                    post_id=post_id,
-                    read=False
-                ).first()
-                
-                if not existing_notif:
-                    notification = Notification(
-                        user_id=post.user_id,
-                        from_user_id=current_user.id,
-                        notification_type='like',
-                        post_id=post_id
-                    )
-                    db.session.add(notification)
-            
-            db.session.commit()
-            liked = True
-        
-        like_count = post.like_count()
+            unlike_post(current_user.id, post.id)
+        db.session.commit()
         
         return jsonify({
             'liked': liked,
-            'like_count': like_count
+            'like_count': like_count_buffer.current_count(post)
         })
     except Exception:
         db.session.rollback()
         return jsonify({'error': 'Error processing like'}), 500
 
+@posts_bp.route("/<int:post_id>/like", methods=["PUT"])
+@login_required
+def like(post_id):
+    """Like a post (idempotent)"""
+    post = Post.query.get_or_404(post_id)
+    return _set_like(post, True)
+
+@posts_bp.route("/<int:post_id>/like", methods=["DELETE"])
+@login_required
+def unlike(post_id):
+    """Unlike a post (idempotent)"""
+    post = Post.query.get_or_404(post_id)
+    return _set_like(post, False)
+
+@posts_bp.route("/<int:post_id>/like", methods=["POST"])
+@login_required
+def toggle_like(post_id):
+    """Toggle like on a post (prefer PUT/DELETE, which are safe to retry)"""
+    post = Post.query.get_or_404(post_id)
+    return _set_like(post, not post.is_liked_by(current_user))
+
 @posts_bp.route("/<int:post_id>/edit", methods=["GET", "POST"])
 @login_required
 def edit(post_id):
@@ -412,18 +393,23 @@ def report(post_id):
 @posts_bp.route("/api/feed")
 @login_required
 def api_feed():
-    """API endpoint for feed pagination (infinite scroll)"""
+    """API endpoint for feed pagination (infinite scroll; ?fields= for a sparse fieldset)"""
     page = request.args.get('page', 1, type=int)
     per_page = request.args.get('per_page', 12, type=int)
     sort_by = request.args.get('sort', 'latest')  # 'latest' or 'algorithm'
     
+    try:
+        serializer = PostSerializer.from_request(current_user, fields=POST_LIST_FIELDS)
+    except FieldError as e:
+        return jsonify({'error': str(e)}), 400
+    
     # Get posts from users you follow + your own posts
     following_ids = [f.followed_id for f in current_user.following.all()]
     following_ids.append(current_user.id)
     
     if following_ids:
         posts_query = Post.query.filter(Post.user_id.in_(following_ids))\
-                                .options(joinedload(Post.user))
+                                .options(*serializer.options())
         
         if sort_by == 'latest':
             posts_query = posts_query.order_by(Post.created_at.desc())
@@ -440,36 +426,17 @@ def api_feed():
         
         # If no posts from following, show explore (all posts)
         if posts.total == 0:
-            posts = Post.query.options(joinedload(Post.user))\
+            posts = Post.query.options(*serializer.options())\
                               .order_by(Post.created_at.desc())\
                               .paginate(page=page, per_page=per_page, error_out=False)
     else:
         # User is not following anyone, show all posts
-        posts = Post.query.options(joinedload(Post.user))\
+        posts = Post.query.options(*serializer.options())\
                           .order_by(Post.created_at.desc())\
                           .paginate(page=page, per_page=per_page, error_out=False)
     
-    posts_data = []
-    for post in posts.items:
-        posts_data.append({
-            'id': post.id,
-            'user': {
-                'id': post.user.id,
-                'username': post.user.username,
-                'profile_picture': post.user.profile_picture
-            },
-            'media': post.get_media_list(),
-            'caption': post.caption,
-            'location': post.location,
-            'created_at': post.created_at.isoformat(),
-            'like_count': post.like_count(),
-            'comment_count': post.comment_count(),
-            'is_liked': post.is_liked_by(current_user),
-            'is_bookmarked': post.is_bookmarked_by(current_user)
-        })
-    
     return jsonify({
-        'posts': posts_data,
+        'posts': serializer.dump_many(posts.items),
         'has_next': posts.has_next,
         'has_prev': posts.has_prev,
         'page': page,
@@ -477,28 +444,32 @@ def api_feed():
         'total': posts.total
     })
 
+def _post_version(post_id):
+    """Everything api_post_detail renders for the current user, in one row (None if missing)"""
+    comment_count = select(func.count(Comment.id)).where(Comment.post_id == Post.id).scalar_subquery()
+    is_liked = exists().where(Like.post_id == Post.id, Like.user_id == current_user.id)
+    is_bookmarked = exists().where(Bookmark.post_id == Post.id, Bookmark.user_id == current_user.id)
+    row = db.session.execute(
+        select(
+            Post.caption, Post.location, Post.media_urls, Post._image_url_db, Post.likes_count, comment_count,
+            is_liked, is_bookmarked, User.username, User.profile_picture, User.profile_picture_meta
+        ).join(User, User.id == Post.user_id).where(Post.id == post_id)
+    ).first()
+    if row is None:
+        return None
+    # like_count also counts likes still in the write-behind buffer
+    return tuple(row) + (like_count_buffer.pending_value(post_id, 0),)
+
 @posts_bp.route("/api/<int:post_id>")
 @login_required
+@conditional_get(_post_version)
 def api_post_detail(post_id):
-    """API endpoint to get single post details"""
-    post = Post.query.options(joinedload(Post.user)).get_or_404(post_id)
+    """API endpoint to get single post details (?fields= for a sparse fieldset)"""
+    try:
+        serializer = PostSerializer.from_request(current_user)
+    except FieldError as e:
+        return jsonify({'error': str(e)}), 400
     
-    return jsonify({
-        'id': post.id,
-        'user': {
-            'id': post.user.id,
-            'username': post.user.username,
-            'profile_picture': post.user.profile_picture
-        },
-        'media': post.get_media_list(),
-        'caption': post.caption,
-        'location': post.location,
-        'created_at': post.created_at.isoformat(),
-        'like_count': post.like_count(),
-        'comment_count': post.comment_count(),
-        'is_liked': post.is_liked_by(current_user),
-        'is_bookmarked': post.is_bookmarked_by(current_user),
-        'hashtags': post.extract_hashtags(),
-        'mentions': post.extract_mentions()
-    })
+    post = Post.query.options(*serializer.options()).get_or_404(post_id)
+    return jsonify(serializer.dump(post))
 
@@ -6,7 +6,7 @@ from app.extension import db
 from app.models.users import User
 from app.models.posts import Post
 from app.models.follows import Follow
-from app.models.notifications import Notification
+from app.lib.notifications import notify_later
 from app.utils import save_profile_image
 
 profiles_bp = Blueprint("profiles", __name__, url_prefix="/profile")
@@ -58,13 +58,8 @@ def follow(username):
             current_user.follow(user)
             is_following = True
             
-            # Create notification for followed user
-            notification = Notification(
-                user_id=user.id,
-                from_user_id=current_user.id,
-                notification_type='follow'
-            )
-            db.session.add(notification)
+            # Create (or aggregate into) follow notification for followed user
+            notify_later(user.id, current_user.id, 'follow')
             db.session.commit()
         
         followers_count = user.followers.count()
@@ -102,8 +97,8 @@ def edit():
             if 'profile_picture' in request.files:
                 file = request.files['profile_picture']
                 if file and file.filename:
-                    filename, error = save_profile_image(file, current_user.id)
-                    if filename:
+                    media_obj, error = save_profile_image(file, current_user.id)
+                    if media_obj:
                         # Delete old profile picture if exists
                         if current_user.profile_picture and current_user.profile_picture != 'default_profile.png':
                             old_path = os.path.join(
@@ -117,7 +112,7 @@ def edit():
                                 except OSError:
                                     pass
                         
-                        current_user.profile_picture = filename
+                        current_user.set_profile_picture(media_obj)
                     elif error:
                         flash(error, 'error')
                         return render_template("profiles/edit.html")
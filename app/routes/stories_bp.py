@@ -12,6 +12,7 @@ from app.models.story_views import StoryView
 from app.models.users import User
 from app.models.follows import Follow
 from app.utils import save_story_media
+from app.lib.stories import remove_story_media, get_story_tray, story_view_buffer
 
 stories_bp = Blueprint("stories", __name__, url_prefix="/stories")
 
@@ -30,9 +31,9 @@ def create():
         
         try:
             timestamp = int(time.time() * 1000)
-            filename, media_type, error = save_story_media(file, current_user.id, timestamp)
+            media_obj, error = save_story_media(file, current_user.id, timestamp)
             
-            if not filename:
+            if not media_obj:
                 return jsonify({'error': error or 'Error uploading media'}), 400
             
             # Get text overlay if provided (JSON string)
@@ -41,11 +42,12 @@ def create():
             # Create story with 24-hour expiration
             story = Story(
                 user_id=current_user.id,
-                media_url=filename,
-                media_type=media_type,
+                media_url=media_obj['url'],
+                media_type=media_obj['type'],
                 text_overlay=text_overlay,
                 expires_at=Story.create_expires_at()
             )
+            story.set_media_meta(media_obj)
             db.session.add(story)
             db.session.commit()
             
@@ -103,11 +105,8 @@ def view(story_id):
             flash('You must follow this user to view their story.', 'error')
             return redirect(url_for('stories.view_all'))
     
-    # Mark as viewed if not already viewed
-    if not story.is_viewed_by(current_user):
-        view = StoryView(story_id=story.id, viewer_id=current_user.id)
-        db.session.add(view)
-        db.session.commit()
+    # Mark as viewed (buffered; duplicates are dropped on flush)
+    story_view_buffer.record(story.id, current_user.id)
     
     return render_template("stories/view.html", story=story)
 
@@ -120,11 +119,8 @@ def mark_viewed(story_id):
     if story.is_expired():
         return jsonify({'error': 'Story has expired'}), 400
     
-    # Check if already viewed
-    if not story.is_viewed_by(current_user):
-        view = StoryView(story_id=story.id, viewer_id=current_user.id)
-        db.session.add(view)
-        db.session.commit()
+    # Buffered; duplicates are dropped on flush and view_count catches up within a flush interval
+    story_view_buffer.record(story.id, current_user.id)
     
     return jsonify({'success': True, 'view_count': story.view_count()})
 
@@ -174,21 +170,12 @@ def delete(story_id):
         return redirect(url_for('stories.view_all'))
     
     try:
-        # Delete media file
-        if story.media_url:
-            media_path = os.path.join(
-                current_app.config['UPLOAD_FOLDER'],
-                'stories',
-                story.media_url
-            )
-            if os.path.exists(media_path) and os.path.isfile(media_path):
-                try:
-                    os.remove(media_path)
-                except OSError:
-                    pass
-        
+        media_url = story.media_url
         db.session.delete(story)
         db.session.commit()
+        
+        # Delete media file once the row is gone
+        remove_story_media(media_url)
         flash('Story deleted successfully.', 'success')
     except Exception:
         db.session.rollback()
@@ -231,47 +218,16 @@ def viewers(story_id):
     
     return render_template("stories/viewers.html", story=story, views=views)
 
+@stories_bp.route("/api/tray")
+@login_required
+def api_tray():
+    """API endpoint for the story tray: one ring per followed user, unseen first"""
+    return jsonify({'tray': get_story_tray(current_user.id)})
+
 @stories_bp.route("/api/feed")
 @login_required
 def api_feed():
-    """API endpoint to get stories feed (for infinite scroll)"""
-    # Get users you follow
-    following_ids = [f.followed_id for f in current_user.following.all()]
-    following_ids.append(current_user.id)
-    
-    # Get active stories
-    stories_query = Story.query.filter(
-        Story.user_id.in_(following_ids),
-        Story.expires_at > datetime.utcnow()
-    ).options(
-        joinedload(Story.user)
-    ).order_by(Story.created_at.desc())
-    
-    stories = stories_query.limit(20).all()
-    
-    # Group by user
-    stories_by_user = {}
-    for story in stories:
-        if story.user_id not in stories_by_user:
-            stories_by_user[story.user_id] = {
-                'user': {
-                    'id': story.user.id,
-                    'username': story.user.username,
-                    'profile_picture': story.user.profile_picture
-                },
-                'stories': []
-            }
-        stories_by_user[story.user_id]['stories'].append({
-            'id': story.id,
-            'media_url': story.media_url,
-            'media_type': story.media_type,
-            'created_at': story.created_at.isoformat(),
-            'is_viewed': story.is_viewed_by(current_user),
-            'view_count': story.view_count()
-        })
-    
+    """API endpoint to get stories feed grouped by user (same rings as the tray)"""
     return jsonify({
-        'stories_by_user': list(stories_by_user.values())
+        'stories_by_user': get_story_tray(current_user.id)
     })
-
-
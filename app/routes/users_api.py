@@ -4,22 +4,56 @@ RESTful API endpoints for user management
 from flask import Blueprint, request, jsonify, current_app
 from flask_login import current_user
 from werkzeug.security import generate_password_hash
-from sqlalchemy import or_, and_
+from sqlalchemy import or_, and_, select, func
 
 from app.extension import db
 from app.models.users import User
 from app.models.follows import Follow
 from app.models.user_settings import UserSettings
 from app.models.blocked_users import BlockedUser
-from app.models.notifications import Notification
+from app.lib.notifications import notify_later
 from app.lib.auth import api_login_required
+from app.lib.http_cache import conditional_get
+from app.lib.serializers import UserSerializer, FieldError
 from app.utils import save_profile_image
 import os
 
 users_api = Blueprint("users_api", __name__, url_prefix="/api/users")
 
+# Shape of follower/following list entries
+USER_LIST_FIELDS = ('id', 'username', 'fullname', 'profile_picture', 'is_verified', 'is_following', 'is_own_profile')
+
+def _active_users(user_ids):
+    """Active users for ids in one query, in the order of user_ids"""
+    users = {user.id: user for user in User.query.filter(User.id.in_(user_ids), User.is_active.is_(True))}
+    return [users[user_id] for user_id in user_ids if user_id in users]
+
+def _user_version(user_id):
+    """Profile fields, follow counts and viewer relationship of a user in one query"""
+    viewer_id = getattr(request, 'current_user_id', current_user.id if current_user.is_authenticated else None)
+    
+    def count(model, *criteria):
+        return select(func.count(model.id)).where(*criteria).scalar_subquery()
+    
+    row = db.session.execute(
+        select(
+            User.username, User.fullname, User.bio, User.profile_picture, User.is_verified,
+            User.is_private, User.is_active, User.email, User.email_verified,
+            count(Follow, Follow.followed_id == User.id, Follow.status == 'accepted'),
+            count(Follow, Follow.follower_id == User.id, Follow.status == 'accepted'),
+            select(Follow.status).where(
+                Follow.follower_id == viewer_id, Follow.followed_id == User.id
+            ).limit(1).scalar_subquery(),
+            # Blocks made by the viewer change the counts; blocks either way hide the profile
+            count(BlockedUser, BlockedUser.blocker_id == viewer_id),
+            count(BlockedUser, BlockedUser.blocker_id == User.id, BlockedUser.blocked_id == viewer_id)
+        ).where(User.id == user_id)
+    ).first()
+    return tuple(row) if row else None
+
 @users_api.route("/<int:user_id>", methods=["GET"])
 @api_login_required
+@conditional_get(_user_version)
 def get_user(user_id):
     """GET /api/users/:id - Get user profile"""
     viewer_id = getattr(request, 'current_user_id', current_user.id if current_user.is_authenticated else None)
@@ -148,12 +182,7 @@ def follow_user(user_id):
         if success:
             # Create notification if accepted (public account)
             if not user.is_private:
-                notification = Notification(
-                    user_id=user.id,
-                    from_user_id=viewer.id,
-                    notification_type='follow'
-                )
-                db.session.add(notification)
+                notify_later(user.id, viewer.id, 'follow')
             
             db.session.commit()
             
@@ -217,6 +246,11 @@ def get_followers(user_id):
     if not can_view:
         return jsonify({'error': 'Cannot view followers of private account'}), 403
     
+    try:
+        serializer = UserSerializer.from_request(viewer, fields=USER_LIST_FIELDS)
+    except FieldError as e:
+        return jsonify({'error': str(e)}), 400
+    
     # Pagination
     page = request.args.get('page', 1, type=int)
     per_page = request.args.get('per_page', 20, type=int)
@@ -234,19 +268,7 @@ def get_followers(user_id):
         page=page, per_page=per_page, error_out=False
     )
     
-    followers = []
-    for follow in pagination.items:
-        follower = User.query.get(follow.follower_id)
-        if follower and follower.is_active:
-            followers.append({
-                'id': follower.id,
-                'username': follower.username,
-                'fullname': follower.fullname,
-                'profile_picture': follower.profile_picture,
-                'is_verified': follower.is_verified,
-                'is_following': viewer.is_following(follower) if viewer else False,
-                'is_own_profile': viewer.id == follower.id if viewer else False
-            })
+    followers = serializer.dump_many(_active_users([follow.follower_id for follow in pagination.items]))
     
     return jsonify({
         'followers': followers,
@@ -275,6 +297,11 @@ def get_following(user_id):
     if not can_view:
         return jsonify({'error': 'Cannot view following of private account'}), 403
     
+    try:
+        serializer = UserSerializer.from_request(viewer, fields=USER_LIST_FIELDS)
+    except FieldError as e:
+        return jsonify({'error': str(e)}), 400
+    
     # Pagination
     page = request.args.get('page', 1, type=int)
     per_page = request.args.get('per_page', 20, type=int)
@@ -292,19 +319,7 @@ def get_following(user_id):
         page=page, per_page=per_page, error_out=False
     )
     
-    following = []
-    for follow in pagination.items:
-        followed = User.query.get(follow.followed_id)
-        if followed and followed.is_active:
-            following.append({
-                'id': followed.id,
-                'username': followed.username,
-                'fullname': followed.fullname,
-                'profile_picture': followed.profile_picture,
-                'is_verified': followed.is_verified,
-                'is_following': viewer.is_following(followed) if viewer else False,
-                'is_own_profile': viewer.id == followed.id if viewer else False
-            })
+    following = serializer.dump_many(_active_users([follow.followed_id for follow in pagination.items]))
     
     return jsonify({
         'following': following,
@@ -365,18 +380,13 @@ def get_follow_requests(user_id):
     # Get pending follow requests
     pending = viewer.followers.filter_by(status='pending').all()
     
-    requests = []
-    for follow in pending:
-        requester = User.query.get(follow.follower_id)
-        if requester and requester.is_active:
-            requests.append({
-                'id': requester.id,
-                'username': requester.username,
-                'fullname': requester.fullname,
-                'profile_picture': requester.profile_picture,
-                'is_verified': requester.is_verified,
-                'requested_at': follow.created_at.isoformat() if follow.created_at else None
-            })
+    requested_at = {follow.follower_id: follow.created_at for follow in pending}
+    requesters = _active_users(list(requested_at))
+    serializer = UserSerializer(fields=('id', 'username', 'fullname', 'profile_picture', 'is_verified'))
+    requests = [
+        dict(data, requested_at=requested_at[user.id].isoformat() if requested_at[user.id] else None)
+        for user, data in zip(requesters, serializer.dump_many(requesters))
+    ]
     
     return jsonify({'follow_requests': requests}), 200
 
@@ -397,12 +407,7 @@ def accept_follow_request(user_id, requester_id):
         
         if success:
             # Create notification
-            notification = Notification(
-                user_id=requester.id,
-                from_user_id=viewer.id,
-                notification_type='follow'
-            )
-            db.session.add(notification)
+            notify_later(requester.id, viewer.id, 'follow')
             db.session.commit()
             
             return jsonify({'message': 'Follow request accepted'}), 200
@@ -551,12 +556,12 @@ def upload_avatar(user_id):
         return jsonify({'error': 'No file provided'}), 400
     
     try:
-        filename, error = save_profile_image(file, viewer.id)
+        media_obj, error = save_profile_image(file, viewer.id)
         
         if error:
             return jsonify({'error': error}), 400
         
-        if filename:
+        if media_obj:
             # Delete old profile picture
             if viewer.profile_picture and viewer.profile_picture != 'default_profile.png':
                 old_path = os.path.join(
@@ -570,12 +575,13 @@ def upload_avatar(user_id):
                     except OSError:
                         pass
             
-            viewer.profile_picture = filename
+            viewer.set_profile_picture(media_obj)
             db.session.commit()
             
             return jsonify({
                 'message': 'Profile picture updated',
-                'profile_picture': filename
+                'profile_picture': viewer.profile_picture,
+                'profile_picture_meta': viewer.get_profile_picture_meta()
             }), 200
         else:
             return jsonify({'error': 'Error uploading image'}), 500
@@ -13,7 +13,7 @@ online_users = set()
 typing_users = {}  # {conversation_id: {user_id: timestamp}}
 
 @socketio.on('connect')
-def handle_connect(auth):
+def handle_connect(auth=None):
     """Handle client connection"""
     # Flask-Login may not work directly with SocketIO, so we need to check session
     from flask import session
@@ -60,7 +60,7 @@ def handle_connect(auth):
         'user_id': user.id,
         'username': user.username,
         'online': True
-    }, broadcast=True, include_self=False)
+    }, include_self=False)
     
     return True
 
@@ -111,7 +111,7 @@ def handle_disconnect():
         'user_id': user.id,
         'username': user.username,
         'online': False
-    }, broadcast=True, include_self=False)
+    }, include_self=False)
 
 
 @socketio.on('typing.start')
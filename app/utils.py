@@ -1,8 +1,29 @@
 import os
+import math
+import base64
+from io import BytesIO
 from werkzeug.utils import secure_filename
-from PIL import Image
 from flask import current_app
 
+from app.middleware.metrics import UPLOAD_SECONDS
+
+# Pillow is imported inside the image helpers: only upload requests need it, not worker startup
+
+# Longest edge (px) of the inline low-quality image placeholder (LQIP)
+PLACEHOLDER_SIZE = 16
+
+# Default decompression bound (pixels) when MAX_IMAGE_PIXELS is not configured
+DEFAULT_MAX_IMAGE_PIXELS = 64 * 1000 * 1000
+
+# EXIF orientations that swap width and height (90/270 degree rotations)
+TRANSPOSED_ORIENTATIONS = {5, 6, 7, 8}
+
+def upload_folder(kind):
+    """Absolute path of an upload subfolder (posts, profiles, stories, messages), created on first use"""
+    folder = os.path.join(current_app.config['UPLOAD_FOLDER'], kind)
+    os.makedirs(folder, exist_ok=True)
+    return folder
+
 def allowed_file(filename, file_type='any'):
     """Check if file extension is allowed
     file_type: 'any', 'image', 'video'
@@ -17,6 +38,31 @@ def allowed_file(filename, file_type='any'):
     else:
         return ext in current_app.config.get('ALLOWED_EXTENSIONS', set())
 
+def open_image(file):
+    """Open an uploaded image lazily (header only) and enforce the pixel bound.
+    Raises ValueError if the image is too large to decode safely.
+    """
+    from PIL import Image
+    
+    file.seek(0)
+    img = Image.open(file)
+    max_pixels = current_app.config.get('MAX_IMAGE_PIXELS', DEFAULT_MAX_IMAGE_PIXELS)
+    if img.width * img.height > max_pixels:
+        raise ValueError(f"Image too large. Maximum: {max_pixels // 1000000} megapixels")
+    return img
+
+def check_image_header(file):
+    """Check an uploaded image without decoding it; return error message or None"""
+    try:
+        open_image(file)
+        return None
+    except ValueError as e:
+        return str(e)
+    except Exception:
+        return "Invalid image file"
+    finally:
+        file.seek(0)  # Reset file pointer
+
 def validate_image_file(file):
     """Validate image file before processing"""
     if not file or not file.filename:
@@ -34,14 +80,11 @@ def validate_image_file(file):
     if size > max_size:
         return False, f"File too large. Maximum size: {max_size // (1024*1024)}MB"
     
-    # Verify it's actually an image
-    try:
-        img = Image.open(file)
-        img.verify()  # Verify it's a valid image
-        file.seek(0)  # Reset file pointer
-        return True, None
-    except Exception as e:
-        return False, "Invalid image file"
+    # Verify it's actually an image (header only; pixels are decoded once in transform_image)
+    error = check_image_header(file)
+    if error:
+        return False, error
+    return True, None
 
 def validate_media_file(file):
     """Validate media file (image or video) before processing"""
@@ -68,18 +111,95 @@ def validate_media_file(file):
     
     # Verify it's actually a valid media file
     if media_type == 'image':
-        try:
-            img = Image.open(file)
-            img.verify()
-            file.seek(0)
-            return True, None, 'image'
-        except Exception:
-            return False, "Invalid image file", None
+        error = check_image_header(file)
+        if error:
+            return False, error, None
+        return True, None, 'image'
     else:  # video
         # For videos, we just check extension and size (could add more validation later)
         file.seek(0)
         return True, None, 'video'
 
+def flatten_to_rgb(img):
+    """Convert to RGB, compositing transparency (PNG/GIF) onto a white background"""
+    if img.mode in ('RGBA', 'LA', 'P'):
+        from PIL import Image
+        
+        if img.mode == 'P':
+            img = img.convert('RGBA')
+        rgb_img = Image.new('RGB', img.size, (255, 255, 255))
+        rgb_img.paste(img, mask=img.split()[-1])
+        return rgb_img
+    elif img.mode != 'RGB':
+        return img.convert('RGB')
+    return img
+
+def transform_image(file, max_width=None, square=None):
+    """Decode an uploaded image once and return it as an RGB image ready to save.
+    
+    max_width: scale down (keeping aspect ratio) to at most this width
+    square: center-crop and scale to a square of this size (profile pictures)
+    
+    JPEGs are downscaled in the DCT domain via draft() so only a fraction of the
+    source pixels are ever decoded; other formats use reduce() through reducing_gap.
+    EXIF orientation is applied before resizing.
+    """
+    from PIL import Image, ImageOps
+    
+    img = open_image(file)
+    
+    # Oriented (displayed) size, used to pick the decode scale
+    width, height = img.size
+    if img.getexif().get(0x0112) in TRANSPOSED_ORIENTATIONS:
+        width, height = height, width
+    
+    if square:
+        scale = square / min(width, height)
+    elif max_width and width > max_width:
+        scale = max_width / width
+    else:
+        scale = 1
+    
+    if scale < 1:
+        # Request at least the target size in stored (unrotated) orientation
+        img.draft('RGB', (math.ceil(img.width * scale), math.ceil(img.height * scale)))
+    
+    img.load()
+    img = ImageOps.exif_transpose(img)
+    img = flatten_to_rgb(img)
+    
+    if square:
+        # Integer box-reduce first so LANCZOS only runs on ~2x the target size
+        factor = min(img.size) // (square * 2)
+        if factor >= 2:
+            img = img.reduce(factor)
+        img = ImageOps.fit(img, (square, square), Image.Resampling.LANCZOS)
+    elif max_width and img.width > max_width:
+        new_height = int(img.height * max_width / img.width)
+        img = img.resize((max_width, new_height), Image.Resampling.LANCZOS, reducing_gap=3.0)
+    
+    return img
+
+def build_image_placeholder(img):
+    """Build a tiny base64 JPEG data URI to paint while the full image loads"""
+    from PIL import Image
+    
+    thumb = img.copy()
+    thumb.thumbnail((PLACEHOLDER_SIZE, PLACEHOLDER_SIZE), Image.Resampling.BILINEAR)
+    buffer = BytesIO()
+    thumb.save(buffer, 'JPEG', quality=40)
+    encoded = base64.b64encode(buffer.getvalue()).decode('ascii')
+    return f"data:image/jpeg;base64,{encoded}"
+
+def describe_image(img):
+    """Get dimensions and placeholder of a processed image for the media manifest"""
+    return {
+        "width": img.width,
+        "height": img.height,
+        "placeholder": build_image_placeholder(img)
+    }
+
+@UPLOAD_SECONDS.timed(kind='post')
 def save_post_image(file, user_id, timestamp):
     """Save post image and return filename"""
     valid, error = validate_image_file(file)
@@ -88,32 +208,13 @@ def save_post_image(file, user_id, timestamp):
     
     try:
         # Create secure filename
-        ext = file.filename.rsplit('.', 1)[1].lower()
         filename = f"post_{user_id}_{timestamp}_{secure_filename(file.filename)}"
         
         # Full path
-        upload_folder = os.path.join(current_app.config['UPLOAD_FOLDER'], 'posts')
-        filepath = os.path.join(upload_folder, filename)
+        filepath = os.path.join(upload_folder('posts'), filename)
         
-        # Open and process image
-        img = Image.open(file)
-        
-        # Convert to RGB if necessary (for formats like PNG with transparency)
-        if img.mode in ('RGBA', 'LA', 'P'):
-            rgb_img = Image.new('RGB', img.size, (255, 255, 255))
-            if img.mode == 'P':
-                img = img.convert('RGBA')
-            rgb_img.paste(img, mask=img.split()[-1] if img.mode in ('RGBA', 'LA') else None)
-            img = rgb_img
-        elif img.mode != 'RGB':
-            img = img.convert('RGB')
-        
-        # Resize if too large (max 1080px width)
-        max_width = 1080
-        if img.width > max_width:
-            ratio = max_width / img.width
-            new_height = int(img.height * ratio)
-            img = img.resize((max_width, new_height), Image.Resampling.LANCZOS)
+        # Decode, orient and resize (max 1080px width)
+        img = transform_image(file, max_width=1080)
         
         # Save image
         img.save(filepath, 'JPEG', optimize=True, quality=85)
@@ -121,6 +222,7 @@ def save_post_image(file, user_id, timestamp):
     except Exception as e:
         return None, f"Error processing image: {str(e)}"
 
+@UPLOAD_SECONDS.timed(kind='post')
 def save_post_media(file, user_id, timestamp, alt_text=""):
     """Save post media (image or video) and return media object"""
     valid, error, media_type = validate_media_file(file)
@@ -128,133 +230,81 @@ def save_post_media(file, user_id, timestamp, alt_text=""):
         return None, error
     
     try:
-        ext = file.filename.rsplit('.', 1)[1].lower()
         filename = f"post_{user_id}_{timestamp}_{secure_filename(file.filename)}"
         
-        upload_folder = os.path.join(current_app.config['UPLOAD_FOLDER'], 'posts')
-        filepath = os.path.join(upload_folder, filename)
+        filepath = os.path.join(upload_folder('posts'), filename)
         
         if media_type == 'image':
-            # Process image
-            img = Image.open(file)
-            
-            # Convert to RGB if necessary
-            if img.mode in ('RGBA', 'LA', 'P'):
-                rgb_img = Image.new('RGB', img.size, (255, 255, 255))
-                if img.mode == 'P':
-                    img = img.convert('RGBA')
-                rgb_img.paste(img, mask=img.split()[-1] if img.mode in ('RGBA', 'LA') else None)
-                img = rgb_img
-            elif img.mode != 'RGB':
-                img = img.convert('RGB')
-            
-            # Resize if too large (max 1080px width)
-            max_width = 1080
-            if img.width > max_width:
-                ratio = max_width / img.width
-                new_height = int(img.height * ratio)
-                img = img.resize((max_width, new_height), Image.Resampling.LANCZOS)
-            
+            # Decode, orient and resize (max 1080px width)
+            img = transform_image(file, max_width=1080)
             img.save(filepath, 'JPEG', optimize=True, quality=85)
+            media_meta = describe_image(img)
         else:  # video
             # For videos, save as-is (could add compression later)
             file.save(filepath)
+            media_meta = {}
         
         return {
             "url": filename,
             "type": media_type,
-            "alt_text": alt_text
+            "alt_text": alt_text,
+            **media_meta
         }, None
     except Exception as e:
         return None, f"Error processing media: {str(e)}"
 
+@UPLOAD_SECONDS.timed(kind='profile')
 def save_profile_image(file, user_id):
-    """Save profile image and return filename"""
+    """Save profile image and return media object (url, dimensions, placeholder)"""
     valid, error = validate_image_file(file)
     if not valid:
         return None, error
     
     try:
         # Create secure filename
-        ext = file.filename.rsplit('.', 1)[1].lower()
         filename = f"profile_{user_id}_{secure_filename(file.filename)}"
         
         # Full path
-        upload_folder = os.path.join(current_app.config['UPLOAD_FOLDER'], 'profiles')
-        filepath = os.path.join(upload_folder, filename)
-        
-        # Open and process image
-        img = Image.open(file)
+        filepath = os.path.join(upload_folder('profiles'), filename)
         
-        # Convert to RGB if necessary
-        if img.mode in ('RGBA', 'LA', 'P'):
-            rgb_img = Image.new('RGB', img.size, (255, 255, 255))
-            if img.mode == 'P':
-                img = img.convert('RGBA')
-            rgb_img.paste(img, mask=img.split()[-1] if img.mode in ('RGBA', 'LA') else None)
-            img = rgb_img
-        elif img.mode != 'RGB':
-            img = img.convert('RGB')
-        
-        # Resize to square 150x150 with cropping
-        img.thumbnail((150, 150), Image.Resampling.LANCZOS)
-        
-        # Create square image (crop center)
-        width, height = img.size
-        size = min(width, height)
-        left = (width - size) // 2
-        top = (height - size) // 2
-        img = img.crop((left, top, left + size, top + size))
-        img = img.resize((150, 150), Image.Resampling.LANCZOS)
+        # Decode, orient and center-crop to a 150x150 square
+        img = transform_image(file, square=150)
         
         # Save image
         img.save(filepath, 'JPEG', optimize=True, quality=85)
-        return filename, None
+        return {"url": filename, **describe_image(img)}, None
     except Exception as e:
         return None, f"Error processing image: {str(e)}"
 
+@UPLOAD_SECONDS.timed(kind='story')
 def save_story_media(file, user_id, timestamp):
-    """Save story media (image or video) and return filename and type"""
+    """Save story media (image or video) and return media object"""
     valid, error, media_type = validate_media_file(file)
     if not valid:
-        return None, None, error
+        return None, error
     
     try:
-        ext = file.filename.rsplit('.', 1)[1].lower()
         filename = f"story_{user_id}_{timestamp}_{secure_filename(file.filename)}"
         
-        upload_folder = os.path.join(current_app.config['UPLOAD_FOLDER'], 'stories')
-        filepath = os.path.join(upload_folder, filename)
+        filepath = os.path.join(upload_folder('stories'), filename)
         
         if media_type == 'image':
-            # Process image for story (1080x1920 or maintain aspect ratio)
-            img = Image.open(file)
-            
-            # Convert to RGB if necessary
-            if img.mode in ('RGBA', 'LA', 'P'):
-                rgb_img = Image.new('RGB', img.size, (255, 255, 255))
-                if img.mode == 'P':
-                    img = img.convert('RGBA')
-                rgb_img.paste(img, mask=img.split()[-1] if img.mode in ('RGBA', 'LA') else None)
-                img = rgb_img
-            elif img.mode != 'RGB':
-                img = img.convert('RGB')
-            
-            # Resize for story (max 1080px width, maintain aspect ratio)
-            max_width = 1080
-            if img.width > max_width:
-                ratio = max_width / img.width
-                new_height = int(img.height * ratio)
-                img = img.resize((max_width, new_height), Image.Resampling.LANCZOS)
-            
+            # Process image for story (max 1080px width, maintain aspect ratio)
+            img = transform_image(file, max_width=1080)
             img.save(filepath, 'JPEG', optimize=True, quality=90)
+            media_meta = describe_image(img)
         else:  # video
             # For videos, save as-is
             file.save(filepath)
+            media_meta = {}
         
-        return filename, media_type, None
+        return {
+            "url": filename,
+            "type": media_type,
+            **media_meta
+        }, None
     except Exception as e:
-        return None, None, f"Error processing story media: {str(e)}"
+        return None, f"Error processing story media: {str(e)}"
 
 def extract_hashtags(text):
     """Extract hashtags from text"""
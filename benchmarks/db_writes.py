@@ -0,0 +1,229 @@
+#!/usr/bin/env python3
+"""Measure write throughput under concurrency for each database engine profile
+
+Each profile (DB_ENGINE_PROFILE: "default" = SQLAlchemy's defaults, "tuned" =
+app/lib/database.py) runs in its own process against its own freshly seeded
+SQLite database. N threads, each logged in as a different seeded user, hammer
+the write paths through the Flask test client:
+
+- like:    PUT/DELETE /posts/<id>/like (like row + posts.likes_count)
+- view:    POST /stories/<id>/view (story_views row)
+- message: POST /messages/api/conversations/<id>/messages (message + conversation)
+- read:    GET /posts/api/feed (--read-ratio of the operations, to mix in readers)
+
+Write-behind buffers keep their configured defaults, so story views and like
+counters are also written by background batch flushes competing for the same lock.
+Reports operations/s, latency percentiles per operation and the failed requests
+("database is locked" and pool timeouts surface as 500s).
+
+With --database postgresql://..., both profiles run against that database instead
+(seeded once, on the first run; use a scratch database).
+
+Usage:
+    python benchmarks/db_writes.py
+    python benchmarks/db_writes.py --threads 32 --operations 4000
+    python benchmarks/db_writes.py --database postgresql://localhost/bench --profiles default,tuned
+"""
+
+import argparse
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, ROOT)
+
+OPERATIONS = ('like', 'view', 'message', 'read')
+
+
+def percentiles(samples):
+    """{'p50', 'p95', 'p99', 'max'} of samples in milliseconds"""
+    if not samples:
+        return {}
+    ordered = sorted(samples)
+    pick = lambda fraction: ordered[min(len(ordered) - 1, int(round(fraction * (len(ordered) - 1))))]
+    return {'p50': pick(0.50), 'p95': pick(0.95), 'p99': pick(0.99), 'max': ordered[-1]}
+
+
+def load_targets(app, prefix, count):
+    """Actors (seeded user ids with one of their conversations) and the post and live story ids to write to"""
+    from datetime import datetime
+    from sqlalchemy import func, select
+    from app.extension import db
+    from app.models.conversations import ConversationParticipant
+    from app.models.posts import Post
+    from app.models.stories import Story
+    from app.models.users import User
+
+    with app.app_context():
+        actors = db.session.execute(
+            select(User.id, func.min(ConversationParticipant.conversation_id))
+            .join(ConversationParticipant, ConversationParticipant.user_id == User.id)
+            .where(User.username.like(f'{prefix}%'))
+            .group_by(User.id).order_by(User.id).limit(count)
+        ).all()
+        posts = db.session.execute(select(Post.id).order_by(Post.id).limit(2000)).scalars().all()
+        stories = db.session.execute(
+            select(Story.id).where(Story.expires_at > datetime.utcnow()).order_by(Story.id).limit(2000)
+        ).scalars().all()
+    return [tuple(actor) for actor in actors], posts, stories
+
+
+def worker(args):
+    """Run the workload with one profile in this process; prints the results as JSON"""
+    os.environ['DB_URI'] = args.database
+    os.environ['DB_ENGINE_PROFILE'] = args.worker
+    os.environ.pop('FLASK_DEBUG', None)
+    from app import create_app
+    from app.extension import db
+    from app.lib.seed import seed_dataset
+
+    app = create_app()
+    app.logger.setLevel('CRITICAL')
+    if args.seed_data:
+        with app.app_context():
+            seed_dataset(users=args.users, seed=args.seed, prefix=args.prefix, stories=1.0)
+
+    actors, posts, stories = load_targets(app, args.prefix, args.threads)
+    if len(actors) < args.threads:
+        raise SystemExit(f"Only {len(actors)} seeded users with conversations for {args.threads} threads")
+
+    rng = random.Random(args.seed)
+    weights = [(1 - args.read_ratio) / 3] * 3 + [args.read_ratio]
+    plan = rng.choices(OPERATIONS, weights=weights, k=args.operations)
+    plan = [(operation, rng.choice(posts), rng.choice(stories) if stories else None) for operation in plan]
+    position = iter(range(len(plan)))
+    lock = threading.Lock()
+    latencies = {operation: [] for operation in OPERATIONS}
+    errors = {}
+
+    def run_actor(actor):
+        user_id, conversation_id = actor
+        client = app.test_client()
+        with client.session_transaction() as session:
+            session['_user_id'] = str(user_id)
+            session['_fresh'] = True
+        liked = set()
+        while True:
+            with lock:
+                index = next(position, None)
+            if index is None:
+                return
+            operation, post_id, story_id = plan[index]
+            if operation == 'view' and story_id is None:
+                operation = 'read'
+            start = time.perf_counter()
+            try:
+                if operation == 'like':
+                    response = client.open(f'/posts/{post_id}/like', method='DELETE' if post_id in liked else 'PUT')
+                    liked.symmetric_difference_update({post_id})
+                elif operation == 'view':
+                    response = client.post(f'/stories/{story_id}/view')
+                elif operation == 'message':
+                    response = client.post(f'/messages/api/conversations/{conversation_id}/messages',
+                                           json={'content': f'load {index}'})
+                else:
+                    response = client.get('/posts/api/feed')
+                status = response.status_code
+            except Exception as e:
+                status = type(e).__name__
+            elapsed = (time.perf_counter() - start) * 1000
+            with lock:
+                if status == 200 or status == 201:
+                    latencies[operation].append(elapsed)
+                else:
+                    key = f'{operation} {status}'
+                    errors[key] = errors.get(key, 0) + 1
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.threads) as pool:
+        list(pool.map(run_actor, actors[:args.threads]))
+    elapsed = time.perf_counter() - start
+
+    with app.app_context():
+        engine_options = {key: value for key, value in app.config['SQLALCHEMY_ENGINE_OPTIONS'].items() if key != 'connect_args'}
+        journal_mode = db.session.execute(db.text('PRAGMA journal_mode')).scalar() if db.engine.dialect.name == 'sqlite' else None
+    succeeded = sum(len(samples) for samples in latencies.values())
+    writes = sum(len(latencies[operation]) for operation in ('like', 'view', 'message'))
+    print(json.dumps({
+        'profile': args.worker,
+        'journal_mode': journal_mode,
+        'engine_options': engine_options,
+        'seconds': round(elapsed, 2),
+        'ops_per_s': round(succeeded / elapsed, 1),
+        'writes_per_s': round(writes / elapsed, 1),
+        'failed': sum(errors.values()),
+        'errors': errors,
+        'latency_ms': {operation: {key: round(value, 1) for key, value in percentiles(samples).items()}
+                       for operation, samples in latencies.items()},
+    }))
+
+
+def run_profile(profile, database, seed_data, args):
+    command = [
+        sys.executable, os.path.abspath(__file__), '--worker', profile, '--database', database,
+        '--users', str(args.users), '--seed', str(args.seed), '--prefix', args.prefix,
+        '--threads', str(args.threads), '--operations', str(args.operations), '--read-ratio', str(args.read_ratio),
+    ]
+    if seed_data:
+        command.append('--seed-data')
+    result = subprocess.run(command, cwd=ROOT, capture_output=True, text=True)
+    if result.returncode != 0:
+        raise SystemExit(f"Profile {profile} failed:\n{result.stderr}")
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def report(results):
+    header = f"{'profile':<10}{'journal':>9}{'ops/s':>9}{'writes/s':>10}{'failed':>8}   p50/p95 ms: like, view, message, read"
+    print(f"\n{header}")
+    print('-' * len(header))
+    for result in results:
+        latency = result['latency_ms']
+        cells = ', '.join(f"{latency[operation].get('p50', 0):.0f}/{latency[operation].get('p95', 0):.0f}" for operation in OPERATIONS)
+        print(f"{result['profile']:<10}{result['journal_mode'] or '-':>9}{result['ops_per_s']:>9.1f}"
+              f"{result['writes_per_s']:>10.1f}{result['failed']:>8}   {cells}")
+        for key, count in sorted(result['errors'].items()):
+            print(f"{'':<10}  {count} x {key}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--profiles', default='default,tuned', help='Comma-separated DB_ENGINE_PROFILE values to compare')
+    parser.add_argument('--database', help='Run against this database instead of a temporary SQLite file per profile')
+    parser.add_argument('--users', type=int, default=300, help='Synthetic users to seed')
+    parser.add_argument('--seed', type=int, default=42, help='Dataset and workload seed')
+    parser.add_argument('--prefix', default='synth', help='Username prefix of the seeded users')
+    parser.add_argument('--threads', type=int, default=16, help='Concurrent clients')
+    parser.add_argument('--operations', type=int, default=2000, help='Requests per profile')
+    parser.add_argument('--read-ratio', type=float, default=0.25, help='Fraction of the requests that are feed reads')
+    parser.add_argument('--json', help='Also write results to this JSON file')
+    parser.add_argument('--worker', help=argparse.SUPPRESS)
+    parser.add_argument('--seed-data', action='store_true', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        worker(args)
+        return
+
+    results = []
+    with tempfile.TemporaryDirectory() as tmp:
+        for number, profile in enumerate(args.profiles.split(',')):
+            database = args.database or f"sqlite:///{os.path.join(tmp, f'{profile}.db')}"
+            print(f"Profile {profile}: {args.threads} threads, {args.operations} requests...")
+            results.append(run_profile(profile, database, not args.database or number == 0, args))
+
+    report(results)
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(results, f, indent=2)
+        print(f"\n✓ Results written to {args.json}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,234 @@
+#!/usr/bin/env python3
+"""Benchmark the hot read endpoints and fail on regressions against a JSON baseline
+
+Seeds a throwaway SQLite database with the synthetic dataset (`flask data seed`,
+same generator), logs in as a heavy user and calls each endpoint through the Flask
+test client. Per endpoint it records the queries of the first (cold-cache) request
+and of a warm one, warm latency percentiles and the peak Python memory allocated by
+one request (tracemalloc).
+
+With a baseline file, the run fails (exit 1) when an endpoint runs more queries
+than the baseline, or its p50/p95 latency or peak memory grows by more than
+--tolerance. Query counts are deterministic for a given dataset; latencies are
+machine-specific, so record the baseline on the machine that compares against it.
+
+Usage:
+    python benchmarks/endpoints.py                        # compare with benchmarks/baselines/endpoints.json
+    python benchmarks/endpoints.py --save-baseline        # record a new baseline
+    python benchmarks/endpoints.py --users 10000 --repeat 100 --tolerance 0.3
+    python benchmarks/endpoints.py --database sqlite:////path/to/seeded.db
+"""
+
+import argparse
+import gc
+import json
+import os
+import platform
+import re
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, ROOT)
+
+DEFAULT_BASELINE = os.path.join(ROOT, 'benchmarks', 'baselines', 'endpoints.json')
+SERVER_TIMING_QUERIES = re.compile(r'desc="(\d+) queries"')
+
+
+def endpoints(viewer_id, popular_id):
+    """name -> URL of the endpoints under test"""
+    return {
+        'feed': '/feed',
+        'api_feed': '/posts/api/feed',
+        'explore': '/explore',
+        'search': '/search?q=synth1',
+        'followers': f'/api/users/{popular_id}/followers',
+        'conversations': '/messages/api/conversations',
+        'notifications': '/notifications/api',
+        'stories_feed': '/stories/api/feed',
+    }
+
+
+def seed(app, users, seed_value, prefix):
+    from app.lib.seed import seed_dataset
+
+    with app.app_context():
+        counts = seed_dataset(users=users, seed=seed_value, prefix=prefix)
+    print(f"  {sum(counts.values()):,} rows")
+
+
+def pick_subjects(app, prefix):
+    """(viewer id, most followed public user id): the seeded user following the most accounts views"""
+    from sqlalchemy import func, select
+    from app.extension import db
+    from app.models.follows import Follow
+    from app.models.users import User
+
+    seeded = User.username.like(f'{prefix}%')
+    with app.app_context():
+        viewer_id = db.session.execute(
+            select(Follow.follower_id).join(User, User.id == Follow.follower_id)
+            .where(seeded, Follow.status == 'accepted')
+            .group_by(Follow.follower_id).order_by(func.count().desc(), Follow.follower_id).limit(1)
+        ).scalar()
+        popular_id = db.session.execute(
+            select(Follow.followed_id).join(User, User.id == Follow.followed_id)
+            .where(seeded, User.is_private.is_(False), Follow.status == 'accepted')
+            .group_by(Follow.followed_id).order_by(func.count().desc(), Follow.followed_id).limit(1)
+        ).scalar()
+    if viewer_id is None or popular_id is None:
+        raise SystemExit(f"No seeded '{prefix}' users with follows in the database")
+    return viewer_id, popular_id
+
+
+def request_queries(response):
+    match = SERVER_TIMING_QUERIES.search(response.headers.get('Server-Timing', ''))
+    return int(match.group(1)) if match else None
+
+
+def percentile(samples, fraction):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(round(fraction * (len(ordered) - 1))))]
+
+
+def measure(client, url, repeat, warmup):
+    """Cold/warm query counts, warm latency percentiles (ms) and peak request memory (KiB)"""
+    cold = client.get(url)
+    if cold.status_code != 200:
+        raise SystemExit(f"{url} returned {cold.status_code}")
+    for _ in range(warmup):
+        client.get(url)
+
+    # Collections triggered by earlier endpoints' garbage would land in random samples (as in timeit)
+    samples = []
+    warm_queries = []
+    gc.collect()
+    gc.disable()
+    try:
+        for _ in range(repeat):
+            start = time.perf_counter()
+            response = client.get(url)
+            samples.append((time.perf_counter() - start) * 1000)
+            warm_queries.append(request_queries(response))
+    finally:
+        gc.enable()
+
+    tracemalloc.start()
+    client.get(url)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return {
+        'queries': request_queries(cold),
+        'warm_queries': int(statistics.median(warm_queries)) if None not in warm_queries else None,
+        'p50_ms': round(percentile(samples, 0.50), 3),
+        'p95_ms': round(percentile(samples, 0.95), 3),
+        'p99_ms': round(percentile(samples, 0.99), 3),
+        'peak_kib': round(peak / 1024, 1),
+        'bytes': len(cold.data),
+    }
+
+
+def compare(results, baseline, tolerance, min_delta_ms):
+    """[(endpoint, message)] for every metric worse than the baseline allows"""
+    regressions = []
+    for name, before in baseline['endpoints'].items():
+        after = results.get(name)
+        if after is None:
+            continue
+        for key in ('queries', 'warm_queries'):
+            if before.get(key) is not None and after[key] is not None and after[key] > before[key]:
+                regressions.append((name, f"{key} {before[key]} -> {after[key]}"))
+        for key in ('p50_ms', 'p95_ms'):
+            limit = max(before[key] * (1 + tolerance), before[key] + min_delta_ms)
+            if after[key] > limit:
+                regressions.append((name, f"{key} {before[key]:.2f} -> {after[key]:.2f} (limit {limit:.2f})"))
+        limit = before['peak_kib'] * (1 + tolerance)
+        if after['peak_kib'] > limit:
+            regressions.append((name, f"peak_kib {before['peak_kib']:.0f} -> {after['peak_kib']:.0f} (limit {limit:.0f})"))
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--users', type=int, default=2000, help='Synthetic users to seed')
+    parser.add_argument('--seed', type=int, default=42, help='Dataset seed')
+    parser.add_argument('--prefix', default='synth', help='Username prefix of the seeded users')
+    parser.add_argument('--database', help='Use this already-seeded database URI instead of seeding a temporary one')
+    parser.add_argument('--repeat', type=int, default=50, help='Timed requests per endpoint')
+    parser.add_argument('--warmup', type=int, default=3, help='Untimed requests per endpoint after the cold one')
+    parser.add_argument('--baseline', default=DEFAULT_BASELINE, help='Baseline JSON file')
+    parser.add_argument('--save-baseline', action='store_true', help='Write the results as the new baseline')
+    parser.add_argument('--tolerance', type=float, default=0.5, help='Allowed relative growth of latency and memory')
+    parser.add_argument('--min-delta-ms', type=float, default=1.0, help='Latency growth always tolerated (noise floor)')
+    parser.add_argument('--json', help='Also write results to this JSON file')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        os.environ['DB_URI'] = args.database or f"sqlite:///{os.path.join(tmp, 'bench.db')}"
+        os.environ['QUERY_COUNTER_ENABLED'] = 'true'
+        os.environ.pop('FLASK_DEBUG', None)
+        from app import create_app
+
+        app = create_app()
+        app.logger.setLevel('ERROR')
+
+        if not args.database:
+            print(f"Seeding {args.users} users (seed {args.seed})...")
+            seed(app, args.users, args.seed, args.prefix)
+        viewer_id, popular_id = pick_subjects(app, args.prefix)
+
+        client = app.test_client()
+        with client.session_transaction() as session:
+            session['_user_id'] = str(viewer_id)
+            session['_fresh'] = True
+
+        results = {}
+        header = f"{'endpoint':<16}{'queries':>9}{'warm q':>8}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}{'peak KiB':>10}"
+        print(f"\n{header}")
+        print('-' * len(header))
+        for name, url in endpoints(viewer_id, popular_id).items():
+            stats = measure(client, url, args.repeat, args.warmup)
+            results[name] = stats
+            print(f"{name:<16}{stats['queries']!s:>9}{stats['warm_queries']!s:>8}{stats['p50_ms']:>9.2f}"
+                  f"{stats['p95_ms']:>9.2f}{stats['p99_ms']:>9.2f}{stats['peak_kib']:>10.0f}")
+
+    report = {
+        'dataset': {'users': args.users, 'seed': args.seed, 'database': bool(args.database)},
+        'python': platform.python_version(),
+        'endpoints': results,
+    }
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(report, f, indent=2)
+
+    if args.save_baseline:
+        os.makedirs(os.path.dirname(os.path.abspath(args.baseline)), exist_ok=True)
+        with open(args.baseline, 'w') as f:
+            json.dump(report, f, indent=2)
+            f.write('\n')
+        print(f"\n✓ Baseline written to {args.baseline}")
+        return
+
+    if not os.path.exists(args.baseline):
+        print(f"\nNo baseline at {args.baseline}; run with --save-baseline to record one")
+        return
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    if baseline.get('dataset') != report['dataset']:
+        print(f"\n⚠ Baseline dataset {baseline.get('dataset')} differs from this run's {report['dataset']}")
+
+    regressions = compare(results, baseline, args.tolerance, args.min_delta_ms)
+    if regressions:
+        print(f"\n✗ {len(regressions)} regression(s) against {args.baseline}:")
+        for name, message in regressions:
+            print(f"  {name}: {message}")
+        sys.exit(1)
+    print(f"\n✓ No regressions against {args.baseline} (tolerance {args.tolerance:.0%})")
+
+
+if __name__ == '__main__':
+    main()
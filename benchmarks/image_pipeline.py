@@ -0,0 +1,205 @@
+#!/usr/bin/env python3
+"""Benchmark upload image processing: legacy multi-decode path vs transform_image
+
+Each (variant, image) pair runs in its own subprocess so peak RSS is measured
+in isolation. Without --corpus a synthetic corpus is generated (48MP and 12MP
+phone-style JPEGs, an EXIF-rotated JPEG, a large RGBA PNG and a small JPEG).
+
+Usage:
+    python benchmarks/image_pipeline.py
+    python benchmarks/image_pipeline.py --corpus ~/Pictures/samples --repeat 3
+"""
+
+import argparse
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, ROOT)
+
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.gif', '.webp')
+
+
+def legacy_process(path):
+    """Pre-pipeline behaviour: verify(), reopen, full decode, flatten, resize"""
+    from PIL import Image
+
+    with open(path, 'rb') as file:
+        img = Image.open(file)
+        img.verify()
+        file.seek(0)
+
+        img = Image.open(file)
+        if img.mode in ('RGBA', 'LA', 'P'):
+            rgb_img = Image.new('RGB', img.size, (255, 255, 255))
+            if img.mode == 'P':
+                img = img.convert('RGBA')
+            rgb_img.paste(img, mask=img.split()[-1] if img.mode in ('RGBA', 'LA') else None)
+            img = rgb_img
+        elif img.mode != 'RGB':
+            img = img.convert('RGB')
+
+        max_width = 1080
+        if img.width > max_width:
+            ratio = max_width / img.width
+            img = img.resize((max_width, int(img.height * ratio)), Image.Resampling.LANCZOS)
+
+        img.save(os.devnull, 'JPEG', optimize=True, quality=85)
+
+
+def pipeline_process(path):
+    """Current behaviour: header check, then a single draft/reduce decode"""
+    from app.utils import check_image_header, transform_image
+
+    with open(path, 'rb') as file:
+        error = check_image_header(file)
+        if error:
+            raise ValueError(error)
+        img = transform_image(file, max_width=1080)
+        img.save(os.devnull, 'JPEG', optimize=True, quality=85)
+
+
+VARIANTS = {
+    'legacy': legacy_process,
+    'pipeline': pipeline_process,
+}
+
+
+def peak_rss_bytes():
+    """Peak resident set size of this process.
+
+    VmHWM is preferred because ru_maxrss survives exec on Linux, so a child
+    would report the parent's peak (e.g. from corpus generation).
+    """
+    try:
+        with open('/proc/self/status') as status:
+            for line in status:
+                if line.startswith('VmHWM:'):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    # ru_maxrss is KiB on Linux, bytes on macOS
+    unit = 1 if sys.platform == 'darwin' else 1024
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * unit
+
+
+def run_worker(variant, path, repeat):
+    """Process one image in this process and print CPU time and peak RSS as JSON"""
+    from flask import Flask
+    from app.configs import Config
+
+    app = Flask(__name__)
+    app.config['MAX_IMAGE_PIXELS'] = Config.MAX_IMAGE_PIXELS
+
+    with app.app_context():
+        baseline_rss = peak_rss_bytes()
+        cpu_start = time.process_time()
+        wall_start = time.perf_counter()
+        for _ in range(repeat):
+            VARIANTS[variant](path)
+        cpu = (time.process_time() - cpu_start) / repeat
+        wall = (time.perf_counter() - wall_start) / repeat
+        peak_rss = peak_rss_bytes()
+
+    print(json.dumps({
+        'cpu_ms': cpu * 1000,
+        'wall_ms': wall * 1000,
+        'peak_rss_mb': peak_rss / (1024 * 1024),
+        'rss_growth_mb': (peak_rss - baseline_rss) / (1024 * 1024),
+    }))
+
+
+def generate_corpus(directory):
+    """Write a synthetic corpus of camera-sized images and return their paths"""
+    from PIL import Image
+
+    def noisy(size, mode='RGB'):
+        # Noise keeps JPEG decode cost realistic (flat colours decode unrealistically fast)
+        bands = [Image.effect_noise(size, 48).point(lambda v, o=offset: (v + o) % 256)
+                 for offset in (0, 60, 120, 180)[:len(mode)]]
+        return Image.merge(mode, bands)
+
+    specs = [
+        ('phone_48mp.jpg', (8000, 6000), 'RGB', 'JPEG', None),
+        ('phone_12mp.jpg', (4032, 3024), 'RGB', 'JPEG', None),
+        ('phone_12mp_rotated.jpg', (4032, 3024), 'RGB', 'JPEG', 6),
+        ('screenshot_rgba.png', (2560, 1600), 'RGBA', 'PNG', None),
+        ('small.jpg', (800, 600), 'RGB', 'JPEG', None),
+    ]
+    paths = []
+    for name, size, mode, fmt, orientation in specs:
+        path = os.path.join(directory, name)
+        img = noisy(size, mode)
+        if orientation:
+            exif = Image.Exif()
+            exif[0x0112] = orientation
+            img.save(path, fmt, quality=92, exif=exif)
+        else:
+            img.save(path, fmt, **({'quality': 92} if fmt == 'JPEG' else {}))
+        paths.append(path)
+        print(f"  generated {name} ({size[0]}x{size[1]}, {os.path.getsize(path) // 1024} KB)")
+    return paths
+
+
+def measure(variant, path, repeat):
+    output = subprocess.run(
+        [sys.executable, __file__, '--worker', variant, path, '--repeat', str(repeat)],
+        check=True, capture_output=True, text=True
+    ).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--corpus', help='Directory of sample images (default: generate synthetic corpus)')
+    parser.add_argument('--repeat', type=int, default=1, help='Runs per image (CPU time is averaged)')
+    parser.add_argument('--json', help='Also write results to this JSON file')
+    parser.add_argument('--worker', nargs=2, metavar=('VARIANT', 'PATH'), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        run_worker(args.worker[0], args.worker[1], args.repeat)
+        return
+
+    with tempfile.TemporaryDirectory() as tmp:
+        if args.corpus:
+            paths = sorted(
+                os.path.join(args.corpus, name) for name in os.listdir(args.corpus)
+                if name.lower().endswith(IMAGE_EXTENSIONS)
+            )
+        else:
+            print("Generating synthetic corpus...")
+            paths = generate_corpus(tmp)
+
+        results = {}
+        print(f"\n{'image':<28}{'variant':<10}{'cpu ms':>10}{'peak RSS MB':>14}{'RSS growth MB':>16}")
+        print('-' * 78)
+        for path in paths:
+            name = os.path.basename(path)
+            results[name] = {}
+            for variant in VARIANTS:
+                stats = measure(variant, path, args.repeat)
+                results[name][variant] = stats
+                print(f"{name:<28}{variant:<10}{stats['cpu_ms']:>10.1f}"
+                      f"{stats['peak_rss_mb']:>14.1f}{stats['rss_growth_mb']:>16.1f}")
+
+        print('-' * 78)
+        for name, by_variant in results.items():
+            legacy, pipeline = by_variant['legacy'], by_variant['pipeline']
+            cpu_gain = legacy['cpu_ms'] / pipeline['cpu_ms'] if pipeline['cpu_ms'] else float('inf')
+            print(f"{name:<28}CPU {cpu_gain:.1f}x faster, "
+                  f"RSS growth {legacy['rss_growth_mb']:.0f} MB -> {pipeline['rss_growth_mb']:.0f} MB")
+
+        if args.json:
+            with open(args.json, 'w') as f:
+                json.dump(results, f, indent=2)
+            print(f"\n✓ Results written to {args.json}")
+
+
+if __name__ == '__main__':
+    main()
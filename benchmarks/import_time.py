@@ -0,0 +1,171 @@
+#!/usr/bin/env python3
+"""Track the startup cost of a web worker and fail on regressions against a JSON baseline
+
+Each run is a fresh interpreter that does what a gunicorn worker does on boot:
+`from app import create_app` followed by `create_app()`, against a database path
+that does not exist, with SCHEMA_AUTO_CREATE=false and outside the Flask CLI.
+The benchmark reports the median import and create_app times over --runs
+interpreters (after one warmup), and one `python -X importtime` run broken down
+by top-level package (self time, summed).
+
+The run fails (exit 1) when:
+- a module in FORBIDDEN gets imported on boot (Alembic only backs `flask db`,
+  Pillow only upload requests),
+- booting touched the filesystem (created the database file or its directory),
+- the median import or create_app time grows by more than --tolerance.
+Timings are machine-specific, so record the baseline on the machine that compares against it.
+
+Usage:
+    python benchmarks/import_time.py                      # compare with benchmarks/baselines/import_time.json
+    python benchmarks/import_time.py --save-baseline      # record a new baseline
+    python benchmarks/import_time.py --runs 20 --top 25
+"""
+
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+
+DEFAULT_BASELINE = os.path.join(ROOT, 'benchmarks', 'baselines', 'import_time.json')
+FORBIDDEN = ('alembic', 'flask_migrate', 'PIL')
+
+CHILD = """
+import json, os, sys, time
+start = time.perf_counter()
+from app import create_app
+imported = time.perf_counter()
+app = create_app()
+created = time.perf_counter()
+print(json.dumps({
+    'import_ms': (imported - start) * 1000,
+    'create_app_ms': (created - imported) * 1000,
+    'modules': sorted({name.split('.')[0] for name in sys.modules}),
+    'touched': os.path.exists(os.path.dirname(app.config['SQLALCHEMY_DATABASE_URI'][len('sqlite:///'):])),
+}))
+"""
+
+
+def child_env(tmp):
+    env = dict(os.environ)
+    for key in ('FLASK_DEBUG', 'FLASK_RUN_FROM_CLI', 'PYTHONPROFILEIMPORTTIME'):
+        env.pop(key, None)
+    env['DB_URI'] = f"sqlite:///{os.path.join(tmp, 'missing', 'app.db')}"
+    env['SCHEMA_AUTO_CREATE'] = 'false'
+    return env
+
+
+def boot(tmp, importtime=False):
+    """Boot the app in a fresh interpreter; (measurements, stderr)"""
+    command = [sys.executable] + (['-X', 'importtime'] if importtime else []) + ['-c', CHILD]
+    result = subprocess.run(command, cwd=ROOT, env=child_env(tmp), capture_output=True, text=True)
+    if result.returncode != 0:
+        raise SystemExit(f"Boot failed:\n{result.stderr}")
+    return json.loads(result.stdout.strip().splitlines()[-1]), result.stderr
+
+
+def package_breakdown(stderr):
+    """{top-level package: self µs} from `-X importtime` output"""
+    totals = {}
+    for line in stderr.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        self_us, _, name = line[len('import time:'):].split('|', 2)
+        package = name.strip().split('.')[0]
+        totals[package] = totals.get(package, 0) + int(self_us)
+    return totals
+
+
+def compare(results, baseline, tolerance, min_delta_ms):
+    """[message] for every timing worse than the baseline allows"""
+    regressions = []
+    for key in ('import_ms', 'create_app_ms'):
+        before = baseline.get(key)
+        if before is None:
+            continue
+        limit = max(before * (1 + tolerance), before + min_delta_ms)
+        if results[key] > limit:
+            regressions.append(f"{key} {before:.1f} -> {results[key]:.1f} (limit {limit:.1f})")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--runs', type=int, default=10, help='Timed interpreter boots')
+    parser.add_argument('--top', type=int, default=15, help='Packages to list in the -X importtime breakdown')
+    parser.add_argument('--baseline', default=DEFAULT_BASELINE, help='Baseline JSON file')
+    parser.add_argument('--save-baseline', action='store_true', help='Write the results as the new baseline')
+    parser.add_argument('--tolerance', type=float, default=0.3, help='Allowed relative growth of the startup times')
+    parser.add_argument('--min-delta-ms', type=float, default=20.0, help='Growth always tolerated (noise floor)')
+    parser.add_argument('--json', help='Also write results to this JSON file')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        boot(tmp)
+        print(f"Booting the app {args.runs} times...")
+        runs = [boot(tmp)[0] for _ in range(args.runs)]
+        profiled, stderr = boot(tmp, importtime=True)
+
+    results = {
+        'import_ms': round(statistics.median(run['import_ms'] for run in runs), 1),
+        'create_app_ms': round(statistics.median(run['create_app_ms'] for run in runs), 1),
+    }
+    packages = sorted(package_breakdown(stderr).items(), key=lambda item: item[1], reverse=True)
+    forbidden = sorted(set(FORBIDDEN) & set(profiled['modules']))
+    touched = any(run['touched'] for run in runs)
+
+    print(f"\nimport app      {results['import_ms']:>8.1f} ms (median)")
+    print(f"create_app()    {results['create_app_ms']:>8.1f} ms (median)")
+    print(f"\n{'package':<24}{'self ms':>9}")
+    print('-' * 33)
+    for package, self_us in packages[:args.top]:
+        print(f"{package:<24}{self_us / 1000:>9.1f}")
+
+    report = {
+        'python': platform.python_version(),
+        **results,
+        'packages_ms': {package: round(self_us / 1000, 1) for package, self_us in packages[:args.top]},
+    }
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(report, f, indent=2)
+
+    problems = [f"imported on boot: {name}" for name in forbidden]
+    if touched:
+        problems.append("booting created the database directory")
+    if problems:
+        print(f"\n✗ {len(problems)} startup side effect(s):")
+        for message in problems:
+            print(f"  {message}")
+        sys.exit(1)
+
+    if args.save_baseline:
+        os.makedirs(os.path.dirname(os.path.abspath(args.baseline)), exist_ok=True)
+        with open(args.baseline, 'w') as f:
+            json.dump(report, f, indent=2)
+            f.write('\n')
+        print(f"\n✓ Baseline written to {args.baseline}")
+        return
+
+    if not os.path.exists(args.baseline):
+        print(f"\nNo baseline at {args.baseline}; run with --save-baseline to record one")
+        return
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+
+    regressions = compare(results, baseline, args.tolerance, args.min_delta_ms)
+    if regressions:
+        print(f"\n✗ {len(regressions)} regression(s) against {args.baseline}:")
+        for message in regressions:
+            print(f"  {message}")
+        sys.exit(1)
+    print(f"\n✓ No regressions against {args.baseline} (tolerance {args.tolerance:.0%})")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,125 @@
+#!/usr/bin/env python3
+"""Check the background job queue in eager mode against a scratch SQLite database
+
+Runs with JOBS_MODE=eager (jobs run as soon as the enqueuing transaction commits)
+and MAIL_BACKEND=memory, and asserts:
+
+- idempotency: enqueue(..., key=...) returns False for a key that is already
+  queued, in the same transaction or after the first job ran, and the email is
+  delivered once,
+- retries: a failing job is queued again JOBS_BACKOFF_SECONDS * 2^(attempt - 1)
+  later, capped at JOBS_BACKOFF_MAX_SECONDS, and stays 'failed' after its
+  max_attempts.
+
+Exits 1 when any check fails.
+
+Usage:
+    python benchmarks/jobs.py
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+from datetime import datetime, timedelta
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, ROOT)
+
+BACKOFF_SECONDS = 10
+BACKOFF_MAX_SECONDS = 15
+
+
+class Checks:
+    def __init__(self):
+        self.failures = 0
+
+    def expect(self, condition, message, detail=''):
+        print(f"{'✓' if condition else '✗'} {message}" + (f"  ({detail})" if detail and not condition else ''))
+        if not condition:
+            self.failures += 1
+
+
+def run(tmp):
+    for key in ('FLASK_DEBUG', 'FLASK_RUN_FROM_CLI'):
+        os.environ.pop(key, None)
+    os.environ.update(
+        DB_URI=f"sqlite:///{os.path.join(tmp, 'jobs.db')}",
+        SCHEMA_AUTO_CREATE='true',
+        JOBS_MODE='eager',
+        MAIL_BACKEND='memory',
+    )
+
+    from app import create_app
+    from app.extension import db
+    from app.lib.email import outbox
+    from app.lib.jobs import FAILED, QUEUED, Worker, backoff_seconds, enqueue, task
+    from app.models.jobs import Job
+
+    app = create_app()
+    app.config.update(JOBS_BACKOFF_SECONDS=BACKOFF_SECONDS, JOBS_BACKOFF_MAX_SECONDS=BACKOFF_MAX_SECONDS)
+    app.logger.disabled = True
+    checks = Checks()
+
+    @task('check.always_fails', max_attempts=3)
+    def always_fails():
+        raise RuntimeError('boom')
+
+    # Idempotency keys
+    email = {'to': 'alice@example.com', 'subject': 'Welcome', 'body': 'Hello'}
+    with app.app_context():
+        first = enqueue('email.send', key='welcome:alice', **email)
+        again = enqueue('email.send', key='welcome:alice', **email)
+        db.session.commit()
+        checks.expect(first and not again, "enqueue() skips a key queued in the same transaction", (first, again))
+        later = enqueue('email.send', key='welcome:alice', **email)
+        db.session.commit()
+        checks.expect(not later, "enqueue() skips a key whose job already ran", later)
+        jobs = Job.query.filter_by(idempotency_key='welcome:alice').all()
+        checks.expect(len(jobs) == 1 and jobs[0].status == 'done', "one job per key, done after commit",
+                      [(job.id, job.status) for job in jobs])
+    checks.expect([message['To'] for message in outbox] == ['alice@example.com'],
+                  "the email was delivered once through MAIL_BACKEND", [message['To'] for message in outbox])
+
+    # Retry backoff
+    expected = [BACKOFF_SECONDS, min(BACKOFF_SECONDS * 2, BACKOFF_MAX_SECONDS)]
+    checks.expect([backoff_seconds(attempt, app.config) for attempt in (1, 2, 3)] == expected + [BACKOFF_MAX_SECONDS],
+                  "backoff_seconds doubles per attempt up to JOBS_BACKOFF_MAX_SECONDS")
+    with app.app_context():
+        enqueue('check.always_fails')
+        db.session.commit()
+        job_id = Job.query.filter_by(name='check.always_fails').one().id
+    worker = Worker(app)
+    for attempt, delay in enumerate(expected, 1):
+        with app.app_context():
+            job = db.session.get(Job, job_id)
+            wait = (job.run_at - datetime.utcnow()).total_seconds()
+            checks.expect(job.status == QUEUED and job.attempts == attempt and delay - 2 < wait <= delay,
+                          f"attempt {attempt} failed: queued again in {delay}s",
+                          f"{job.status}, {job.attempts} attempts, due in {wait:.1f}s")
+            checks.expect(worker.work_once([job_id]) is None, "the job does not run before it is due")
+            job.run_at = datetime.utcnow() - timedelta(seconds=1)
+            db.session.commit()
+        worker.work_once([job_id])
+    with app.app_context():
+        job = db.session.get(Job, job_id)
+        checks.expect(job.status == FAILED and job.attempts == 3 and job.finished_at is not None
+                      and 'boom' in (job.last_error or ''),
+                      "the job stays failed after max_attempts", f"{job.status}, {job.attempts} attempts")
+    return checks.failures
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        failures = run(tmp)
+    if failures:
+        print(f"\n✗ {failures} job check(s) failed")
+        sys.exit(1)
+    print("\n✓ Job queue works")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,215 @@
+#!/usr/bin/env python3
+"""Check read-replica routing end to end against SQLite copies of the primary
+
+Creates a primary SQLite database with two users, copies it into two replica
+files (DB_REPLICA_URIS) and drives the app through the Flask test client,
+counting the statements each engine runs:
+
+- round-robin: consecutive GETs from a client alternate between the replicas
+  and never touch the primary,
+- caching: data cached through get_or_compute (the explore page) is computed
+  on the primary, never from a replica that may be behind,
+- sticky primary: after a POST, that user's reads use the primary (and see
+  its write, which the static replica copies do not have) until
+  DB_REPLICA_STICKY_SECONDS have passed, then go back to the replicas, for
+  session-cookie clients and for JWT clients that send no cookie,
+- failover: a replica whose file is corrupted is taken out of rotation, later
+  reads use the other replica, and a health check puts it back once repaired.
+
+Exits 1 when any check fails.
+
+Usage:
+    python benchmarks/replicas.py
+    python benchmarks/replicas.py --sticky-seconds 2
+"""
+
+import argparse
+import os
+import shutil
+import sqlite3
+import sys
+import tempfile
+import time
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, ROOT)
+
+READ_PATH = '/messages/api/conversations'
+
+
+def copy_database(source, target):
+    """Consistent copy of a SQLite database (the online backup API, like `sqlite3 .backup`)"""
+    src, dst = sqlite3.connect(source), sqlite3.connect(target)
+    try:
+        src.backup(dst)
+    finally:
+        dst.close()
+        src.close()
+
+
+class Checks:
+    def __init__(self):
+        self.failures = 0
+
+    def expect(self, condition, message, detail=''):
+        print(f"{'✓' if condition else '✗'} {message}" + (f"  ({detail})" if detail and not condition else ''))
+        if not condition:
+            self.failures += 1
+
+
+def run(tmp, sticky_seconds):
+    primary, replicas = os.path.join(tmp, 'primary.db'), [os.path.join(tmp, f'replica{n}.db') for n in (1, 2)]
+    for key in ('FLASK_DEBUG', 'FLASK_RUN_FROM_CLI'):
+        os.environ.pop(key, None)
+    os.environ.update(
+        DB_URI=f'sqlite:///{primary}',
+        DB_REPLICA_URIS=','.join(f'sqlite:///{path}' for path in replicas),
+        DB_REPLICA_STICKY_SECONDS=str(sticky_seconds),
+        SCHEMA_AUTO_CREATE='true',
+        JOBS_MODE='eager',
+    )
+
+    from sqlalchemy import event
+    from werkzeug.security import generate_password_hash
+    from app import create_app
+    from app.extension import db
+    from app.lib.auth import generate_token
+    from app.lib.replicas import replica_set
+    from app.models.users import User
+
+    app = create_app()
+    app.config.update(DB_REPLICA_CHECK_INTERVAL=0)
+    with app.app_context():
+        users = [User(username=name, email=f'{name}@example.com', fullname=name,
+                      password=generate_password_hash('password123'), is_active=True) for name in ('alice', 'bob')]
+        db.session.add_all(users)
+        db.session.commit()
+        alice, bob = (user.id for user in users)
+        engines = dict(db.engines)
+    for path in replicas:
+        copy_database(primary, path)
+
+    hits = {}
+
+    def counter(name):
+        def count(*args, **kwargs):
+            hits[name] = hits.get(name, 0) + 1
+        return count
+
+    for key, engine in engines.items():
+        event.listen(engine, 'before_cursor_execute', counter('primary' if key is None else key))
+
+    def client(user_id):
+        test_client = app.test_client()
+        with test_client.session_transaction() as session:
+            session['_user_id'] = str(user_id)
+            session['_fresh'] = True
+        return test_client
+
+    def api_client(user_id):
+        """Test client that sends a JWT bearer token and no cookies"""
+        test_client = app.test_client(use_cookies=False)
+        with app.app_context():
+            test_client.environ_base['HTTP_AUTHORIZATION'] = f'Bearer {generate_token(user_id)}'
+        return test_client
+
+    def request(test_client, method, path):
+        """(status, set of engines the request ran statements on)"""
+        hits.clear()
+        response = test_client.open(path, method=method)
+        return response.status_code, set(hits)
+
+    checks = Checks()
+    as_alice, as_bob = client(alice), client(bob)
+    keys = list(replica_set.keys)
+    checks.expect(keys == ['replica_1', 'replica_2'], "DB_REPLICA_URIS adds two replica binds", keys)
+
+    # Round-robin
+    used = [request(as_bob, 'GET', READ_PATH) for _ in range(4)]
+    checks.expect(all(status == 200 for status, _ in used), "reads succeed on the replicas", used)
+    checks.expect(all(len(engines_used) == 1 and 'primary' not in engines_used for _, engines_used in used),
+                  "each read runs on exactly one replica, never the primary", used)
+    order = [next(iter(engines_used)) for _, engines_used in used if len(engines_used) == 1]
+    checks.expect(len(order) == 4 and all(a != b for a, b in zip(order, order[1:])) and set(order) == set(keys),
+                  "consecutive reads alternate between the replicas", order)
+
+    # Cached data is computed on the primary, cache hits only need the replica
+    status, engines_used = request(as_bob, 'GET', '/explore')
+    checks.expect(status == 200 and 'primary' in engines_used,
+                  "a cache miss computes the cached explore data on the primary", f"{status} {engines_used}")
+    status, engines_used = request(as_bob, 'GET', '/explore')
+    checks.expect(status == 200 and engines_used and 'primary' not in engines_used,
+                  "a cache hit only reads from a replica", f"{status} {engines_used}")
+
+    # Sticky primary after a write
+    hits.clear()
+    response = as_alice.post(f'/messages/api/start/{bob}')
+    conversation_id = (response.get_json() or {}).get('conversation_id')
+    checks.expect(response.status_code in (200, 201) and conversation_id and set(hits) == {'primary'},
+                  "a POST writes to the primary only", f"{response.status_code} {set(hits)}")
+    status, engines_used = request(as_alice, 'GET', f'/messages/api/conversations/{conversation_id}/messages')
+    checks.expect(status == 200 and engines_used == {'primary'},
+                  "the writer's next read uses the primary and sees its write", f"{status} {engines_used}")
+    status, engines_used = request(as_bob, 'GET', READ_PATH)
+    checks.expect(status == 200 and engines_used and 'primary' not in engines_used,
+                  "other clients keep reading from the replicas", f"{status} {engines_used}")
+    time.sleep(sticky_seconds + 0.2)
+    status, engines_used = request(as_alice, 'GET', READ_PATH)
+    checks.expect(status == 200 and engines_used and 'primary' not in engines_used,
+                  f"the writer is back on the replicas after {sticky_seconds}s", f"{status} {engines_used}")
+
+    # Sticky primary for a JWT client, which has no session cookie
+    as_alice_api = api_client(alice)
+    status, engines_used = request(as_alice_api, 'POST', f'/api/users/{bob}/follow')
+    checks.expect(status in (200, 201) and engines_used == {'primary'},
+                  "a JWT client's POST writes to the primary only", f"{status} {engines_used}")
+    hits.clear()
+    response = as_alice_api.get(f'/api/users/{bob}/followers')
+    followers = [user.get('id') for user in (response.get_json() or {}).get('followers', [])]
+    checks.expect(response.status_code == 200 and set(hits) == {'primary'} and alice in followers,
+                  "the JWT client's next read uses the primary and sees its write",
+                  f"{response.status_code} {set(hits)} {followers}")
+    time.sleep(sticky_seconds + 0.2)
+    status, engines_used = request(as_alice_api, 'GET', f'/api/users/{bob}/followers')
+    checks.expect(status == 200 and engines_used and 'primary' not in engines_used,
+                  f"the JWT client is back on the replicas after {sticky_seconds}s", f"{status} {engines_used}")
+
+    # Failover off a broken replica
+    broken = replicas[0]
+    shutil.move(broken, broken + '.saved')
+    with open(broken, 'wb') as f:
+        f.write(b'not a database' * 1024)
+    engines['replica_1'].dispose()
+    failed = [request(as_bob, 'GET', READ_PATH) for _ in range(2)]
+    used = [request(as_bob, 'GET', READ_PATH) for _ in range(4)]
+    healthy = {entry['key']: entry['healthy'] for entry in replica_set.status()}
+    checks.expect(healthy == {'replica_1': False, 'replica_2': True}, "the broken replica is taken out of rotation", healthy)
+    checks.expect(all(status == 200 and engines_used == {'replica_2'} for status, engines_used in used),
+                  "later reads use the remaining replica", used + failed)
+    os.replace(broken + '.saved', broken)
+    engines['replica_1'].dispose()
+    with app.app_context():
+        statuses = replica_set.check()
+    checks.expect(statuses == {'replica_1': 'ok', 'replica_2': 'ok'} and all(entry['healthy'] for entry in replica_set.status()),
+                  "a health check puts the repaired replica back", statuses)
+    used = [request(as_bob, 'GET', READ_PATH) for _ in range(2)]
+    checks.expect({next(iter(engines_used)) for _, engines_used in used if engines_used} == set(keys),
+                  "reads use both replicas again", used)
+    return checks.failures
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sticky-seconds', type=int, default=1, help='DB_REPLICA_STICKY_SECONDS for the run')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        failures = run(tmp, args.sticky_seconds)
+    if failures:
+        print(f"\n✗ {failures} replica check(s) failed")
+        sys.exit(1)
+    print("\n✓ Replica routing works")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,190 @@
+#!/usr/bin/env python3
+"""Benchmark API response serialization: encoder time and bytes on the wire
+
+Seeds a throwaway SQLite database, captures real payloads from
+GET /posts/api/feed and GET /messages/api/conversations/<id>/messages, then
+times each available encoder (stdlib json, orjson, msgpack) and reports the
+encoded size raw, gzip'd and brotli'd. Encoders and codecs whose packages are
+not installed are skipped.
+
+Usage:
+    python benchmarks/serialization.py
+    python benchmarks/serialization.py --posts 48 --messages 500 --repeat 200
+"""
+
+import argparse
+import gzip
+import json
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, ROOT)
+
+
+def load_encoders(app):
+    """name -> callable(obj) returning the encoded bytes, for installed encoders"""
+    from flask.json.provider import DefaultJSONProvider
+
+    stdlib = DefaultJSONProvider(app)
+    encoders = {'json': lambda obj: stdlib.dumps(obj, separators=(',', ':')).encode()}
+    try:
+        import orjson
+        option = orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_NON_STR_KEYS | orjson.OPT_SORT_KEYS
+        encoders['orjson'] = lambda obj: orjson.dumps(obj, default=stdlib.default, option=option)
+    except ImportError:
+        print("  orjson not installed, skipping")
+    try:
+        import msgpack
+        encoders['msgpack'] = lambda obj: msgpack.packb(obj, default=stdlib.default)
+    except ImportError:
+        print("  msgpack not installed, skipping")
+    return encoders
+
+
+def load_codecs(app):
+    """name -> callable(bytes) returning the compressed body, at the app's configured levels"""
+    codecs = {
+        'raw': lambda data: data,
+        'gzip': lambda data: gzip.compress(data, compresslevel=app.config['COMPRESS_LEVEL'], mtime=0),
+    }
+    try:
+        import brotli
+        codecs['br'] = lambda data: brotli.compress(data, quality=app.config['COMPRESS_BR_QUALITY'])
+    except ImportError:
+        print("  brotli not installed, skipping")
+    return codecs
+
+
+def seed(app, posts, messages):
+    """Create a viewer with a feed of `posts` posts and a conversation of `messages` messages"""
+    from werkzeug.security import generate_password_hash
+    from app.extension import db
+    from app.models.conversations import Conversation, ConversationParticipant
+    from app.models.follows import Follow
+    from app.models.messages import Message
+    from app.models.posts import Post
+    from app.models.users import User
+
+    with app.app_context():
+        users = [
+            User(username=f'bench{i}', email=f'bench{i}@example.com', fullname=f'Bench User {i}',
+                 password=generate_password_hash('password123', method='pbkdf2:sha256:1'),
+                 profile_picture=f'/uploads/profiles/bench{i}.jpg', is_active=True)
+            for i in range(2)
+        ]
+        db.session.add_all(users)
+        db.session.flush()
+        viewer, friend = users
+        db.session.add(Follow(follower_id=viewer.id, followed_id=friend.id, status='accepted'))
+
+        media = json.dumps([{'url': '/uploads/posts/bench.jpg', 'type': 'image', 'alt_text': '',
+                             'width': 1080, 'height': 1350, 'placeholder': 'data:image/jpeg;base64,' + 'A' * 120}])
+        db.session.add_all([
+            Post(user_id=friend.id, caption=f'Sunset at the beach #{i} #travel with @bench0', location='Lisbon',
+                 media_urls=media)
+            for i in range(posts)
+        ])
+
+        conversation = Conversation()
+        db.session.add(conversation)
+        db.session.flush()
+        db.session.add_all([ConversationParticipant(conversation_id=conversation.id, user_id=user.id) for user in users])
+        db.session.add_all([
+            Message(conversation_id=conversation.id, sender_id=users[i % 2].id,
+                    content=f'Message {i}: are we still on for dinner tomorrow at 8?')
+            for i in range(messages)
+        ])
+        db.session.commit()
+        return viewer.id, conversation.id
+
+
+def capture_payloads(app, viewer_id, conversation_id, posts):
+    """Call the endpoints through the test client and return their decoded JSON bodies"""
+    client = app.test_client()
+    with client.session_transaction() as session:
+        session['_user_id'] = str(viewer_id)
+        session['_fresh'] = True
+
+    urls = {
+        'api_feed': f'/posts/api/feed?per_page={posts}',
+        'api_get_messages': f'/messages/api/conversations/{conversation_id}/messages',
+    }
+    payloads = {}
+    for name, url in urls.items():
+        response = client.get(url, headers={'Accept': 'application/json', 'Accept-Encoding': 'identity'})
+        if response.status_code != 200:
+            raise SystemExit(f"{url} returned {response.status_code}")
+        payloads[name] = response.get_json()
+    return payloads
+
+
+def time_encoder(encode, payload, repeat):
+    """Median milliseconds per encode over `repeat` runs"""
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        encode(payload)
+        samples.append(time.perf_counter() - start)
+    return statistics.median(samples) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--posts', type=int, default=48, help='Posts in the feed page')
+    parser.add_argument('--messages', type=int, default=500, help='Messages in the conversation')
+    parser.add_argument('--repeat', type=int, default=100, help='Encodes per measurement (median is reported)')
+    parser.add_argument('--json', help='Also write results to this JSON file')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        os.environ['DB_URI'] = f"sqlite:///{os.path.join(tmp, 'bench.db')}"
+        os.environ.pop('FLASK_DEBUG', None)
+        from app import create_app
+
+        app = create_app()
+        app.config['COMPRESS_ENABLED'] = False
+
+        print("Seeding database...")
+        viewer_id, conversation_id = seed(app, args.posts, args.messages)
+        payloads = capture_payloads(app, viewer_id, conversation_id, args.posts)
+        encoders = load_encoders(app)
+        codecs = load_codecs(app)
+
+        results = {}
+        header = f"{'payload':<18}{'encoder':<10}{'encode ms':>11}" + ''.join(f"{name + ' B':>12}" for name in codecs)
+        print(f"\n{header}")
+        print('-' * len(header))
+        for payload_name, payload in payloads.items():
+            results[payload_name] = {}
+            with app.app_context():
+                for encoder_name, encode in encoders.items():
+                    body = encode(payload)
+                    stats = {'encode_ms': time_encoder(encode, payload, args.repeat)}
+                    stats.update({f'{codec}_bytes': len(compress(body)) for codec, compress in codecs.items()})
+                    results[payload_name][encoder_name] = stats
+                    print(f"{payload_name:<18}{encoder_name:<10}{stats['encode_ms']:>11.3f}"
+                          + ''.join(f"{stats[f'{codec}_bytes']:>12}" for codec in codecs))
+
+        print('-' * len(header))
+        for payload_name, by_encoder in results.items():
+            baseline = by_encoder['json']
+            for encoder_name, stats in by_encoder.items():
+                if encoder_name == 'json':
+                    continue
+                speedup = baseline['encode_ms'] / stats['encode_ms'] if stats['encode_ms'] else float('inf')
+                print(f"{payload_name:<18}{encoder_name} {speedup:.1f}x faster than json, "
+                      f"{stats['raw_bytes'] / baseline['raw_bytes']:.0%} of its raw size")
+            print(f"{payload_name:<18}json gzip: {baseline['raw_bytes']} -> {baseline['gzip_bytes']} bytes")
+
+        if args.json:
+            with open(args.json, 'w') as f:
+                json.dump(results, f, indent=2)
+            print(f"\n✓ Results written to {args.json}")
+
+
+if __name__ == '__main__':
+    main()
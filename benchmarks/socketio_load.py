@@ -0,0 +1,375 @@
+#!/usr/bin/env python3
+"""Load-test Socket.IO messaging and presence: connects, typing, sends and read receipts
+
+Simulates many users: each one connects a Socket.IO client (joining its user and
+conversation rooms and broadcasting presence), then random senders emit
+typing.start, send a message through POST /messages/api/conversations/<id>/messages,
+emit typing.stop, and the recipient answers message.new with a message.read
+receipt. Reports:
+
+- connect latency (handshake + connect handler) and disconnect time
+- send latency (HTTP request) and fan-out latency (send start -> message.new at the recipient)
+- events delivered to clients per second, and server emits per second (in-process)
+- server CPU time and memory
+
+In-process (default): seeds a temporary SQLite database with the synthetic dataset
+and drives the app with Flask-SocketIO's test client, so one process runs server and
+clients. Handlers run synchronously, so fan-out latency there is bounded by the send
+request. CPU and memory are those of this process.
+
+Against a running server (--url): seed its database first (`flask --app wsgi data seed`),
+start it (e.g. `python main.py` or gunicorn), and run this with the same DB_URI so it can
+find the seeded users and their conversations. Pass --server-pid to sample the server's
+CPU and RSS from /proc. Real clients need `pip install "python-socketio[client]"`.
+
+Usage:
+    python benchmarks/socketio_load.py
+    python benchmarks/socketio_load.py --clients 2000 --messages 2000
+    python benchmarks/socketio_load.py --url http://127.0.0.1:5000 --clients 200 --concurrency 16 --server-pid 1234
+"""
+
+import argparse
+import json
+import os
+import random
+import resource
+import sys
+import tempfile
+import threading
+import time
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, ROOT)
+
+
+def percentiles(samples):
+    """{'p50', 'p95', 'p99', 'max'} of samples in milliseconds"""
+    if not samples:
+        return {}
+    ordered = sorted(samples)
+    pick = lambda fraction: ordered[min(len(ordered) - 1, int(round(fraction * (len(ordered) - 1))))]
+    return {'p50': pick(0.50), 'p95': pick(0.95), 'p99': pick(0.99), 'max': ordered[-1]}
+
+
+class InProcessClients:
+    """Users driven through the Flask test client and Flask-SocketIO's test client"""
+
+    def __init__(self, app, socketio):
+        self.app = app
+        self.socketio = socketio
+
+    def connect(self, user):
+        http = self.app.test_client()
+        with http.session_transaction() as session:
+            session['_user_id'] = str(user['id'])
+            session['_fresh'] = True
+        user['http'] = http
+        user['socket'] = self.socketio.test_client(self.app, flask_test_client=http)
+        return user['socket'].is_connected()
+
+    def emit(self, user, event, data):
+        user['socket'].emit(event, data)
+
+    def send(self, user, conversation_id, content):
+        """POST a message; returns its id"""
+        response = user['http'].post(
+            f'/messages/api/conversations/{conversation_id}/messages', json={'content': content}
+        )
+        if response.status_code != 201:
+            raise SystemExit(f"Send returned {response.status_code}: {response.get_data(as_text=True)[:200]}")
+        return response.get_json()['message']['id']
+
+    def received(self, user):
+        """[(event, args, received_at)] since the last call"""
+        now = time.perf_counter()
+        return [(item['name'], item['args'], now) for item in user['socket'].get_received()]
+
+    def disconnect(self, user):
+        user['socket'].disconnect()
+
+    def server_usage(self):
+        """(CPU seconds, peak RSS in MiB) of this process"""
+        usage = resource.getrusage(resource.RUSAGE_SELF)
+        return usage.ru_utime + usage.ru_stime, usage.ru_maxrss / 1024
+
+    def server_emits(self):
+        """socketio.emit() calls so far (counted only with METRICS_ENABLED)"""
+        from app.middleware.metrics import SOCKETIO_EMITS
+        if not self.app.config.get('METRICS_ENABLED'):
+            return None
+        return sum(value for _, value in SOCKETIO_EMITS.snapshot()['values'])
+
+
+class RemoteClients:
+    """Users logged in over HTTP with real Socket.IO clients (one thread each)"""
+
+    def __init__(self, url, password, server_pid=None):
+        import socketio
+
+        self.socketio = socketio
+        self.url = url.rstrip('/')
+        self.password = password
+        self.server_pid = server_pid
+
+    def request(self, user, method, path, body):
+        headers = {'Content-Type': 'application/json'}
+        if user.get('cookie'):
+            headers['Cookie'] = user['cookie']
+        req = urllib.request.Request(
+            self.url + path, data=json.dumps(body).encode(), headers=headers, method=method
+        )
+        with urllib.request.urlopen(req, timeout=30) as response:
+            cookies = [value.split(';', 1)[0] for value in response.headers.get_all('Set-Cookie') or []]
+            return response.status, json.loads(response.read() or b'null'), cookies
+
+    def login(self, user):
+        _, _, cookies = self.request(user, 'POST', '/api/auth/login', {
+            'username': user['username'], 'password': self.password
+        })
+        user['cookie'] = '; '.join(cookies)
+
+    def connect(self, user):
+        inbox = user['inbox'] = []
+        client = user['socket'] = self.socketio.Client(reconnection=False)
+        client.on('*', lambda event, *args: inbox.append((event, args, time.perf_counter())))
+        client.connect(self.url, headers={'Cookie': user['cookie']}, wait_timeout=30)
+        return client.connected
+
+    def emit(self, user, event, data):
+        user['socket'].emit(event, data)
+
+    def send(self, user, conversation_id, content):
+        _, body, _ = self.request(user, 'POST', f'/messages/api/conversations/{conversation_id}/messages', {
+            'content': content
+        })
+        return body['message']['id']
+
+    def received(self, user):
+        inbox = user['inbox']
+        items = inbox[:len(inbox)]
+        del inbox[:len(items)]
+        return items
+
+    def disconnect(self, user):
+        user['socket'].disconnect()
+
+    def server_usage(self):
+        """(CPU seconds, RSS in MiB) of --server-pid from /proc, or (None, None)"""
+        if not self.server_pid:
+            return None, None
+        with open(f'/proc/{self.server_pid}/stat') as f:
+            fields = f.read().rsplit(')', 1)[1].split()
+        cpu = (int(fields[11]) + int(fields[12])) / os.sysconf('SC_CLK_TCK')
+        with open(f'/proc/{self.server_pid}/status') as f:
+            rss = next(int(line.split()[1]) for line in f if line.startswith('VmRSS:'))
+        return cpu, rss / 1024
+
+    def server_emits(self):
+        return None
+
+
+def load_users(app, prefix, count):
+    """Seeded users with their conversations: [{'id', 'username', 'conversations': {id: other user id}}]"""
+    from sqlalchemy import select
+    from sqlalchemy.orm import aliased
+    from app.extension import db
+    from app.models.conversations import ConversationParticipant
+    from app.models.users import User
+
+    with app.app_context():
+        users = db.session.execute(
+            select(User.id, User.username).where(User.username.like(f'{prefix}%')).order_by(User.id).limit(count)
+        ).all()
+        by_id = {user_id: {'id': user_id, 'username': username, 'conversations': {}} for user_id, username in users}
+        other = aliased(ConversationParticipant)
+        pairs = db.session.execute(
+            select(ConversationParticipant.user_id, ConversationParticipant.conversation_id, other.user_id)
+            .join(other, (other.conversation_id == ConversationParticipant.conversation_id)
+                  & (other.user_id != ConversationParticipant.user_id))
+            .where(ConversationParticipant.user_id.in_(by_id), other.user_id.in_(by_id))
+        )
+        for user_id, conversation_id, other_id in pairs:
+            by_id[user_id]['conversations'][conversation_id] = other_id
+    return list(by_id.values())
+
+
+def run(clients, users, messages, concurrency, rng):
+    by_id = {user['id']: user for user in users}
+    deliveries = 0
+    arrivals = {}
+    lock = threading.Lock()
+
+    def drain(user):
+        nonlocal deliveries
+        items = clients.received(user)
+        with lock:
+            deliveries += len(items)
+        for event, args, received_at in items:
+            if event == 'message.new':
+                message = args[0]['message']
+                arrivals[message['id']] = received_at
+                clients.emit(user, 'message.read', {
+                    'message_id': message['id'], 'conversation_id': message['conversation_id']
+                })
+
+    results = {}
+    cpu_before, _ = clients.server_usage()
+    emits_before = clients.server_emits()
+    started = time.perf_counter()
+
+    # Connect: presence broadcasts grow with the number of connected users
+    connect_ms = []
+    failed = 0
+    for position, user in enumerate(users):
+        start = time.perf_counter()
+        ok = clients.connect(user)
+        connect_ms.append((time.perf_counter() - start) * 1000)
+        failed += not ok
+        if position % 100 == 99:
+            for connected in users[:position + 1]:
+                drain(connected)
+    for user in users:
+        drain(user)
+    connect_seconds = time.perf_counter() - started
+    results['connect'] = {'clients': len(users), 'failed': failed, 'seconds': connect_seconds, **percentiles(connect_ms)}
+
+    # Typing + send + read receipts
+    senders = [user for user in users if user['conversations']]
+    if not senders:
+        raise SystemExit("No seeded conversations between the connected users")
+    plan = []
+    for _ in range(messages):
+        sender = rng.choice(senders)
+        conversation_id = rng.choice(sorted(sender['conversations']))
+        plan.append((sender, conversation_id, by_id[sender['conversations'][conversation_id]]))
+
+    send_ms = []
+    sent_at = {}
+
+    def send(step):
+        sender, conversation_id, recipient = step
+        clients.emit(sender, 'typing.start', {'conversation_id': conversation_id})
+        start = time.perf_counter()
+        message_id = clients.send(sender, conversation_id, f'load test {rng.random():.6f}')
+        send_ms.append((time.perf_counter() - start) * 1000)
+        sent_at[message_id] = start
+        clients.emit(sender, 'typing.stop', {'conversation_id': conversation_id})
+        drain(recipient)
+        drain(sender)
+
+    phase_started = time.perf_counter()
+    if concurrency > 1:
+        with ThreadPoolExecutor(concurrency) as pool:
+            list(pool.map(send, plan))
+        deadline = time.perf_counter() + 5
+        while len(arrivals) < len(sent_at) and time.perf_counter() < deadline:
+            time.sleep(0.01)
+            for user in users:
+                drain(user)
+    else:
+        for step in plan:
+            send(step)
+    for user in users:
+        drain(user)
+    send_seconds = time.perf_counter() - phase_started
+
+    fanout_ms = [(arrivals[message_id] - start) * 1000 for message_id, start in sent_at.items() if message_id in arrivals]
+    results['send'] = {
+        'messages': len(plan), 'seconds': send_seconds, 'messages_per_s': len(plan) / send_seconds,
+        **percentiles(send_ms)
+    }
+    results['fanout'] = {'delivered': len(fanout_ms), 'lost': len(sent_at) - len(fanout_ms), **percentiles(fanout_ms)}
+
+    phase_started = time.perf_counter()
+    if concurrency > 1:
+        with ThreadPoolExecutor(concurrency) as pool:
+            list(pool.map(clients.disconnect, users))
+    else:
+        for user in users:
+            clients.disconnect(user)
+    results['disconnect'] = {'seconds': time.perf_counter() - phase_started}
+
+    elapsed = time.perf_counter() - started
+    cpu_after, rss = clients.server_usage()
+    emits_after = clients.server_emits()
+    results['totals'] = {
+        'seconds': elapsed,
+        'deliveries': deliveries,
+        'deliveries_per_s': deliveries / elapsed,
+        'server_emits_per_s': (emits_after - emits_before) / elapsed if emits_before is not None else None,
+        'server_cpu_s': cpu_after - cpu_before if cpu_before is not None else None,
+        'server_rss_mib': rss,
+    }
+    return results
+
+
+def report(results):
+    connect, send, fanout, totals = results['connect'], results['send'], results['fanout'], results['totals']
+    ms = lambda stats: f"p50 {stats.get('p50', 0):.1f}  p95 {stats.get('p95', 0):.1f}  p99 {stats.get('p99', 0):.1f}  max {stats.get('max', 0):.1f} ms"
+    print(f"\nconnect     {connect['clients']} clients ({connect['failed']} failed) in {connect['seconds']:.1f}s: {ms(connect)}")
+    print(f"send        {send['messages']} messages at {send['messages_per_s']:.0f}/s: {ms(send)}")
+    print(f"fan-out     {fanout['delivered']} delivered, {fanout['lost']} lost: {ms(fanout)}")
+    print(f"disconnect  {results['disconnect']['seconds']:.1f}s")
+    print(f"events      {totals['deliveries']} delivered to clients, {totals['deliveries_per_s']:.0f}/s", end='')
+    if totals['server_emits_per_s'] is not None:
+        print(f"; server emits {totals['server_emits_per_s']:.0f}/s", end='')
+    print()
+    if totals['server_cpu_s'] is not None:
+        print(f"server      {totals['server_cpu_s']:.1f}s CPU over {totals['seconds']:.1f}s "
+              f"({totals['server_cpu_s'] / totals['seconds']:.0%} of a core), {totals['server_rss_mib']:.0f} MiB RSS")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--clients', type=int, default=500, help='Concurrent connected users')
+    parser.add_argument('--messages', type=int, default=1000, help='Messages sent during the run')
+    parser.add_argument('--seed', type=int, default=42, help='Dataset and workload seed')
+    parser.add_argument('--prefix', default='synth', help='Username prefix of the seeded users')
+    parser.add_argument('--url', help='Load-test this running server instead of an in-process app')
+    parser.add_argument('--password', default=None, help='Password of the seeded users (default: the seeder\'s)')
+    parser.add_argument('--server-pid', type=int, help='With --url: sample this process\'s CPU and RSS')
+    parser.add_argument('--concurrency', type=int, default=None, help='Parallel senders (default: 1 in-process, 8 with --url)')
+    parser.add_argument('--json', help='Also write results to this JSON file')
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    with tempfile.TemporaryDirectory() as tmp:
+        if not args.url:
+            os.environ['DB_URI'] = f"sqlite:///{os.path.join(tmp, 'bench.db')}"
+        os.environ.pop('FLASK_DEBUG', None)
+        from app import create_app
+        from app.extension import socketio
+        from app.lib.seed import SEED_PASSWORD, seed_dataset
+
+        app = create_app()
+        app.logger.setLevel('ERROR')
+
+        if args.url:
+            clients = RemoteClients(args.url, args.password or SEED_PASSWORD, args.server_pid)
+            users = load_users(app, args.prefix, args.clients)
+            print(f"Logging in {len(users)} users...")
+            for user in users:
+                clients.login(user)
+            concurrency = args.concurrency or 8
+        else:
+            print(f"Seeding {args.clients} users (seed {args.seed})...")
+            with app.app_context():
+                seed_dataset(users=args.clients, seed=args.seed, prefix=args.prefix, messages=2)
+            clients = InProcessClients(app, socketio)
+            users = load_users(app, args.prefix, args.clients)
+            concurrency = 1
+
+        print(f"Running: {len(users)} clients, {args.messages} messages, concurrency {concurrency}")
+        results = run(clients, users, args.messages, concurrency, rng)
+
+    report(results)
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(results, f, indent=2)
+        print(f"\n✓ Results written to {args.json}")
+
+
+if __name__ == '__main__':
+    main()
@@ -12,6 +12,7 @@ from app.models.likes import Like
 from app.models.bookmarks import Bookmark
 from app.models.follows import Follow
 from app.models.notifications import Notification
+from app.models.notification_archive import NotificationArchive
 from app.models.conversations import Conversation
 from app.models.messages import Message
 from app.models.stories import Story
@@ -34,7 +35,7 @@ with app.app_context():
         required_tables = [
             'users', 'posts', 'comments', 'likes', 'bookmarks', 
             'follows', 'notifications', 'conversations', 'messages',
-            'stories', 'story_views', 'blocked_users'
+            'stories', 'story_views', 'blocked_users', 'notification_archive'
         ]
         
         missing = []
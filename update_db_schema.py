@@ -31,7 +31,9 @@ with app.app_context():
             'email_verification_token': 'VARCHAR(100)',
             'password_reset_token': 'VARCHAR(100)',
             'password_reset_expires': 'DATETIME',
-            'last_login': 'DATETIME'
+            'last_login': 'DATETIME',
+            'profile_picture_meta': 'TEXT',
+            'unread_notifications_count': 'INTEGER DEFAULT 0 NOT NULL'
         }
         
         # Check follows table for status column
@@ -93,6 +95,21 @@ with app.app_context():
             except sqlite3.OperationalError as e:
                 print(f"⚠ Could not add location: {e}")
         
+        # Add denormalized like counter if missing
+        if posts_columns and 'likes_count' not in posts_columns:
+            print("Adding likes_count column to posts table...")
+            try:
+                cursor.execute("ALTER TABLE posts ADD COLUMN likes_count INTEGER DEFAULT 0 NOT NULL")
+                cursor.execute("""
+                    UPDATE posts SET likes_count = (
+                        SELECT COUNT(*) FROM likes WHERE likes.post_id = posts.id
+                    )
+                """)
+                conn.commit()
+                print("✓ Added likes_count column to posts table")
+            except sqlite3.OperationalError as e:
+                print(f"⚠ Could not add likes_count: {e}")
+        
         # Check comments table for parent_id column
         cursor.execute("PRAGMA table_info(comments)")
         comments_columns = [row[1] for row in cursor.fetchall()]
@@ -107,6 +124,92 @@ with app.app_context():
             except sqlite3.OperationalError as e:
                 print(f"⚠ Could not add parent_id: {e}")
         
+        # Check stories table for media_meta column (image placeholder/dimensions)
+        cursor.execute("PRAGMA table_info(stories)")
+        stories_columns = [row[1] for row in cursor.fetchall()]
+        
+        if stories_columns and 'media_meta' not in stories_columns:
+            print("Adding media_meta column to stories table...")
+            try:
+                cursor.execute("ALTER TABLE stories ADD COLUMN media_meta TEXT")
+                conn.commit()
+                print("✓ Added media_meta column to stories table")
+            except sqlite3.OperationalError as e:
+                print(f"⚠ Could not add media_meta: {e}")
+        
+        if stories_columns and 'views_count' not in stories_columns:
+            print("Adding views_count column to stories table...")
+            try:
+                cursor.execute("ALTER TABLE stories ADD COLUMN views_count INTEGER DEFAULT 0 NOT NULL")
+                cursor.execute("""
+                    UPDATE stories SET views_count = (
+                        SELECT COUNT(*) FROM story_views WHERE story_views.story_id = stories.id
+                    )
+                """)
+                conn.commit()
+                print("✓ Added views_count column to stories table")
+            except sqlite3.OperationalError as e:
+                print(f"⚠ Could not add views_count: {e}")
+        
+        if stories_columns:
+            # Composite index for the active-stories (story tray) query
+            cursor.execute("CREATE INDEX IF NOT EXISTS ix_stories_user_expires ON stories (user_id, expires_at)")
+            conn.commit()
+        
+        # Check notifications table for aggregation columns
+        cursor.execute("PRAGMA table_info(notifications)")
+        notifications_columns = [row[1] for row in cursor.fetchall()]
+        
+        notifications_columns_to_add = {
+            'actor_count': 'INTEGER DEFAULT 1 NOT NULL',
+            'recent_actor_ids': 'TEXT',
+            'updated_at': 'DATETIME',
+            'aggregation_key': 'VARCHAR(40)'
+        }
+        
+        if notifications_columns:
+            for column_name, column_type in notifications_columns_to_add.items():
+                if column_name not in notifications_columns:
+                    print(f"Adding {column_name} column to notifications table...")
+                    try:
+                        cursor.execute(f"ALTER TABLE notifications ADD COLUMN {column_name} {column_type}")
+                        conn.commit()
+                        print(f"✓ Added {column_name} column to notifications table")
+                    except sqlite3.OperationalError as e:
+                        print(f"⚠ Could not add {column_name}: {e}")
+            
+            # Existing rows: order by their original time
+            cursor.execute("UPDATE notifications SET updated_at = created_at WHERE updated_at IS NULL")
+            # Keyset pagination orders by (coalesce(updated_at, created_at), id); rebuild an
+            # older copy of the index without the id column
+            cursor.execute("PRAGMA index_info(ix_notifications_user_activity)")
+            if len(cursor.fetchall()) not in (0, 3):
+                cursor.execute("DROP INDEX ix_notifications_user_activity")
+            cursor.execute("""
+                CREATE INDEX IF NOT EXISTS ix_notifications_user_activity
+                ON notifications (user_id, coalesce(updated_at, created_at), id)
+            """)
+            cursor.execute("DROP INDEX IF EXISTS ix_notifications_user_updated")
+            conn.commit()
+            
+            # Open the newest unread aggregate per recipient and target, then allow only one
+            cursor.execute("""
+                UPDATE notifications SET aggregation_key = notification_type || ':' || coalesce(post_id, '')
+                WHERE aggregation_key IS NULL AND read = 0 AND notification_type IN ('like', 'comment', 'follow')
+                AND id = (
+                    SELECT newest.id FROM notifications AS newest
+                    WHERE newest.user_id = notifications.user_id AND newest.read = 0
+                    AND newest.notification_type = notifications.notification_type
+                    AND newest.post_id IS notifications.post_id
+                    ORDER BY coalesce(newest.updated_at, newest.created_at) DESC, newest.id DESC LIMIT 1
+                )
+            """)
+            cursor.execute("""
+                CREATE UNIQUE INDEX IF NOT EXISTS ix_notifications_open_aggregate
+                ON notifications (user_id, aggregation_key) WHERE read = 0
+            """)
+            conn.commit()
+        
         for column_name, column_type in columns_to_add.items():
             if column_name not in existing_columns:
                 print(f"Adding column: {column_name}")
@@ -117,6 +220,17 @@ with app.app_context():
                 except sqlite3.OperationalError as e:
                     print(f"⚠ Could not add {column_name}: {e}")
         
+        # Backfill cached unread notification counters
+        if 'unread_notifications_count' not in existing_columns and notifications_columns:
+            cursor.execute("""
+                UPDATE users SET unread_notifications_count = (
+                    SELECT COUNT(*) FROM notifications
+                    WHERE notifications.user_id = users.id AND notifications.read = 0
+                )
+            """)
+            conn.commit()
+            print("✓ Backfilled unread_notifications_count")
+        
         print("\n✓ Database schema updated successfully!")
         
     except Exception as e: